@@ -0,0 +1,47 @@
+"""
+Per-record cost of LogStatsCollector.process_stream (dicts) vs process_batches
+(columnar, NumPy-vectorized when NumPy is installed). Parsing is excluded: both
+inputs are built up front.
+
+    python -m benchmarks.bench_batch_stats [num_records]
+"""
+import sys
+
+from benchmarks.common import synthetic_records, timed, print_table
+from src.batches import batches_from_records
+from src.stats import LogStatsCollector
+import src.stats
+
+
+def consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    records = list(synthetic_records(n))
+    batches = list(batches_from_records(iter(records), field_types={'status': 'int'}))
+
+    rows = []
+    dict_stats = LogStatsCollector()
+    _, dict_time = timed(consume, dict_stats.process_stream(iter(records)))
+    rows.append(["process_stream (dicts)", f"{dict_time:.2f}", f"{dict_time / n * 1e9:.0f}", "1.0x"])
+
+    numpy_module = src.stats.np
+    for label, np_module in [("process_batches (numpy)", numpy_module), ("process_batches (Counter)", None)]:
+        if label.endswith("(numpy)") and numpy_module is None:
+            continue
+        src.stats.np = np_module
+        batch_stats = LogStatsCollector()
+        _, batch_time = timed(consume, batch_stats.process_batches(iter(batches)))
+        assert batch_stats.to_dict() == dict_stats.to_dict()
+        rows.append([label, f"{batch_time:.2f}", f"{batch_time / n * 1e9:.0f}", f"{dict_time / batch_time:.1f}x"])
+    src.stats.np = numpy_module
+
+    print(f"{n} records in {len(batches)} batches\n")
+    print_table(["path", "seconds", "ns/record", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Parse + export time and output size for each --out-format, with and without the
+background writer thread.
+
+    python -m benchmarks.bench_export [num_lines]
+"""
+import os
+import sys
+import tempfile
+
+from benchmarks.common import timed, print_table
+from benchmarks.generator import generate_lines
+from src.exporters import (export_to_csv, export_to_json, export_to_ndjson, export_to_parquet,
+                           export_to_arrow, export_in_background, pyarrow)
+from src.parser import FastNginxLogParser
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    log_parser = FastNginxLogParser()
+    formats = [("csv", export_to_csv, {}), ("json", export_to_json, {}), ("ndjson", export_to_ndjson, {})]
+    if pyarrow is not None:
+        formats += [("parquet", export_to_parquet, {"field_types": log_parser.FIELD_TYPES}),
+                    ("arrow", export_to_arrow, {"field_types": log_parser.FIELD_TYPES})]
+    else:
+        print("pyarrow not installed; skipping parquet/arrow\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.log')
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in generate_lines(n):
+                f.write(line + '\n')
+
+        rows = []
+        for name, export_func, kwargs in formats:
+            out = os.path.join(tmp, 'out.' + name)
+            _, direct = timed(export_func, log_parser.parse_file(path), out, **kwargs)
+            size = os.path.getsize(out)
+            _, threaded = timed(export_in_background, export_func, log_parser.parse_file(path), out, **kwargs)
+            rows.append([name, f"{size / 1e6:.1f}", f"{direct:.2f}", f"{threaded:.2f}"])
+
+    print(f"{n} synthetic lines\n")
+    print_table(["format", "MB", "direct s", "threaded s"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Cost of --where filtering after parsing vs pushed down into the parser, where
+lines that cannot match are rejected with a substring check before the regex runs.
+
+    python -m benchmarks.bench_filter [num_lines]
+"""
+import os
+import sys
+import tempfile
+
+from benchmarks.common import timed, print_table
+from benchmarks.generator import generate_lines
+from src.filters import RecordFilter
+from src.parser import FastNginxLogParser
+
+EXPRESSIONS = [
+    "method == 'DELETE'",
+    "status == 404 and method == 'GET'",
+    "status >= 500",
+]
+
+
+def count(records) -> int:
+    total = 0
+    for _ in records:
+        total += 1
+    return total
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    log_parser = FastNginxLogParser()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.log')
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in generate_lines(n):
+                f.write(line + '\n')
+
+        rows = []
+        for expression in EXPRESSIONS:
+            record_filter = RecordFilter(expression)
+            post, post_elapsed = timed(count, record_filter.apply(log_parser.parse_file(path)))
+            pushed, pushed_elapsed = timed(count, log_parser.parse_file(path, record_filter=record_filter))
+            assert post == pushed
+            rows.append([expression, pushed, f"{post_elapsed:.2f}", f"{pushed_elapsed:.2f}",
+                         f"{post_elapsed / pushed_elapsed:.1f}x"])
+
+    print(f"{n} synthetic lines\n")
+    print_table(["--where", "matches", "post-parse s", "pushdown s", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
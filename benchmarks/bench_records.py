@@ -0,0 +1,64 @@
+"""
+Memory held by n parsed records kept in a list: dicts vs typed records
+(parse_file(typed=True)), plus the parse time of each and the cost of
+running the stats collector over them and exporting them to CSV and NDJSON.
+
+    python -m benchmarks.bench_records [num_lines]
+"""
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.common import timed, print_table
+from benchmarks.generator import generate_file
+from src.exporters import export_to_csv, export_to_ndjson
+from src.parser import FastNginxLogParser
+from src.stats import LogStatsCollector
+
+
+def load(log_parser: FastNginxLogParser, path: str, typed: bool):
+    """Returns (records, bytes still allocated once they are loaded)."""
+    gc.collect()
+    tracemalloc.start()
+    records = list(log_parser.parse_file(path, typed=typed))
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, held
+
+
+def consume(collector: LogStatsCollector, records):
+    for _ in collector.process_stream(iter(records)):
+        pass
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    log_parser = FastNginxLogParser()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.log')
+        generate_file(path, num_lines=n)
+
+        rows, results = [], {}
+        for label, typed in [("dicts", False), ("typed records", True)]:
+            (records, held), parse_time = timed(load, log_parser, path, typed)
+            stats = LogStatsCollector()
+            _, stats_time = timed(consume, stats, records)
+            _, csv_time = timed(export_to_csv, iter(records), os.path.join(tmp, 'out.csv'))
+            _, ndjson_time = timed(export_to_ndjson, iter(records), os.path.join(tmp, 'out.ndjson'))
+            results[label] = (held, stats.to_dict())
+            rows.append([label, f"{held / 1e6:.1f}", f"{held / n:.0f}", f"{parse_time:.2f}", f"{stats_time:.2f}",
+                         f"{csv_time:.2f}", f"{ndjson_time:.2f}"])
+            del records
+
+    assert results["dicts"][1] == results["typed records"][1]
+    saving = results["dicts"][0] / results["typed records"][0]
+    print(f"{n} lines (parse time includes tracemalloc overhead)\n")
+    print_table(["records", "MB held", "bytes/record", "parse s", "stats s", "csv s", "ndjson s"], rows)
+    print(f"\ntyped records use {saving:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compares memory use and accuracy of exact vs approximate LogStatsCollector.
+
+    python -m benchmarks.bench_sketches [num_records]
+"""
+import sys
+import tracemalloc
+
+from benchmarks.common import synthetic_records, timed, print_table
+from src.stats import LogStatsCollector
+
+
+def consume(collector: LogStatsCollector, n: int):
+    for _ in collector.process_stream(synthetic_records(n)):
+        pass
+
+
+def run(collector: LogStatsCollector, n: int):
+    tracemalloc.start()
+    _, elapsed = timed(consume, collector, n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+
+    exact = LogStatsCollector()
+    approx = LogStatsCollector(approximate=True, top_k=1000)
+    exact_peak, exact_time = run(exact, n)
+    approx_peak, approx_time = run(approx, n)
+
+    true_top = exact.ip_addresses.most_common(10)
+    approx_top = dict(approx.ip_addresses.most_common(10))
+    recall = sum(1 for ip, _ in true_top if ip in approx_top) / len(true_top)
+    max_err = max(abs(approx.ip_addresses[ip] - count) for ip, count in true_top)
+
+    true_distinct_ips = len(exact.ip_addresses)
+    true_distinct_urls = len({r["url"] for r in synthetic_records(n)})
+    ip_err = abs(approx.distinct_ips.count() - true_distinct_ips) / true_distinct_ips
+    url_err = abs(approx.distinct_urls.count() - true_distinct_urls) / true_distinct_urls
+
+    print(f"{n} records, {true_distinct_ips} distinct IPs\n")
+    print_table(
+        ["mode", "peak memory", "seconds"],
+        [["exact", f"{exact_peak / 1e6:.1f} MB", f"{exact_time:.2f}"],
+         ["approximate", f"{approx_peak / 1e6:.1f} MB", f"{approx_time:.2f}"]],
+    )
+    print(f"\ntop-10 recall: {recall:.0%}, max count error in top-10: {max_err} "
+          f"(bound N/k = {n // approx.top_k})")
+    print(f"distinct IP error: {ip_err:.2%}, distinct URL error: {url_err:.2%}")
+
+
+if __name__ == "__main__":
+    main()
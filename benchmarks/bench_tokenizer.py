@@ -0,0 +1,47 @@
+"""
+Lines/sec of the regex NginxLogParser vs the FastNginxLogParser tokenizer.
+
+    python -m benchmarks.bench_tokenizer [num_lines]
+"""
+import os
+import sys
+
+from benchmarks.common import timed, print_table
+from src.parser import NginxLogParser, FastNginxLogParser
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tests', 'sample_logs')
+
+
+def corpus_lines():
+    lines = []
+    for name in sorted(os.listdir(SAMPLE_DIR)):
+        with open(os.path.join(SAMPLE_DIR, name), encoding='utf-8') as f:
+            lines.extend(line.strip() for line in f)
+    return lines
+
+
+def parse_all(log_parser, lines):
+    parse_line = log_parser.parse_line
+    for line in lines:
+        parse_line(line)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    base = corpus_lines()
+    lines = (base * (n // len(base) + 1))[:n]
+
+    regex_parser, fast_parser = NginxLogParser(), FastNginxLogParser()
+    assert [regex_parser.parse_line(l) for l in base] == [fast_parser.parse_line(l) for l in base]
+
+    rows = []
+    for name, log_parser in [("NginxLogParser (regex)", regex_parser), ("FastNginxLogParser", fast_parser)]:
+        _, elapsed = timed(parse_all, log_parser, lines)
+        rows.append([name, f"{n / elapsed:,.0f}", f"{elapsed:.2f}"])
+
+    print(f"{n} lines from the sample corpus\n")
+    print_table(["parser", "lines/sec", "seconds"], rows)
+
+
+if __name__ == "__main__":
+    main()
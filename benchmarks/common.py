@@ -0,0 +1,40 @@
+"""Shared helpers for the benchmark scripts."""
+import random
+import time
+from typing import Dict, Iterator, List
+
+METHODS = ["GET", "GET", "GET", "GET", "POST", "PUT", "DELETE", "HEAD"]
+STATUSES = ["200", "200", "200", "200", "301", "304", "404", "500"]
+
+
+def synthetic_records(n: int, heavy_ips: int = 50, heavy_share: float = 0.5,
+                      seed: int = 42) -> Iterator[Dict[str, str]]:
+    """
+    Yields n parsed-looking records. heavy_share of the traffic comes from a small
+    pool of heavy IPs; the rest is bot-style traffic where almost every IP is new.
+    """
+    rng = random.Random(seed)
+    for i in range(n):
+        if rng.random() < heavy_share:
+            ip = f"10.0.0.{int(rng.paretovariate(1.2)) % heavy_ips}"
+        else:
+            ip = f"{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+        yield {
+            "ip": ip,
+            "method": rng.choice(METHODS),
+            "url": f"/item/{rng.randrange(n // 4 + 1)}",
+            "status": rng.choice(STATUSES),
+        }
+
+
+def timed(func, *args, **kwargs):
+    """Returns (result, elapsed_seconds)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def print_table(headers: List[str], rows: List[List]):
+    widths = [max(len(str(x)) for x in col) for col in zip(headers, *rows)]
+    for row in [headers] + rows:
+        print("  ".join(str(x).ljust(w) for x, w in zip(row, widths)))
@@ -0,0 +1,85 @@
+"""
+Compare two benchmark result files written by `python -m benchmarks.run --out`.
+
+    python -m benchmarks.compare old.json new.json [--max-regression 10]
+
+Throughput changes are shown as percentages (positive = faster). With
+--max-regression, the exit status is 1 if any benchmark's throughput dropped
+by more than that many percent, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import print_table
+
+
+def _throughput(result: Dict[str, Any]) -> Optional[float]:
+    return result.get("lines_per_sec") or result.get("ops_per_sec")
+
+
+def _change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One row per benchmark present in both runs: throughput and peak RSS, before and after."""
+    old_results = {r["name"]: r for r in old["results"]}
+    rows = []
+    for result in new["results"]:
+        before = old_results.get(result["name"])
+        if before is None or "seconds" not in result or "seconds" not in before:
+            continue
+        rows.append({
+            "name": result["name"],
+            "old_throughput": _throughput(before),
+            "new_throughput": _throughput(result),
+            "throughput_change": _change(_throughput(before), _throughput(result)),
+            "old_rss_mb": before["peak_rss_mb"],
+            "new_rss_mb": result["peak_rss_mb"],
+            "rss_change": _change(before["peak_rss_mb"], result["peak_rss_mb"]),
+        })
+    return rows
+
+
+def _pct(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:+.1f}%"
+
+
+def print_comparison(rows: List[Dict[str, Any]]):
+    print_table(
+        ["benchmark", "old lines|ops/sec", "new lines|ops/sec", "change", "old RSS MB", "new RSS MB", "RSS change"],
+        [[r["name"], f"{r['old_throughput'] or 0:,.0f}", f"{r['new_throughput'] or 0:,.0f}", _pct(r["throughput_change"]),
+          f"{r['old_rss_mb']:.0f}", f"{r['new_rss_mb']:.0f}", _pct(r["rss_change"])] for r in rows],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--max-regression", type=float,
+                        help="Exit with status 1 if any throughput dropped by more than this many percent")
+    args = parser.parse_args()
+
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    rows = compare_results(old, new)
+    print_comparison(rows)
+
+    if args.max_regression is not None:
+        regressed = [r["name"] for r in rows
+                     if r["throughput_change"] is not None and r["throughput_change"] < -args.max_regression]
+        if regressed:
+            print(f"\nThroughput regressed by more than {args.max_regression}%: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
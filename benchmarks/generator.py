@@ -0,0 +1,175 @@
+"""
+Deterministic synthetic Nginx access-log generator.
+
+The same seed and settings always produce byte-identical output, so benchmark
+runs on different machines or commits read exactly the same input.
+
+    python -m benchmarks.generator access.log --size 1GB --ips 50000 --urls 5000 --malformed 0.01
+    python -m benchmarks.generator access.log.gz --lines 1000000
+
+Client IPs and URLs follow a Zipf-like popularity curve over a fixed pool
+(--ips / --urls distinct values), like real traffic. --malformed is the
+fraction of lines that are damaged (truncated, unbalanced quotes or garbage),
+which exercises the parsers' slow paths.
+"""
+import argparse
+import gzip
+import itertools
+import random
+import re
+import time
+from typing import Iterator, List, Optional, Tuple
+
+# 2023-05-15T08:00:00Z
+DEFAULT_START_TIME = 1684137600
+
+METHODS = ["GET", "POST", "PUT", "DELETE", "HEAD", "PATCH"]
+METHOD_WEIGHTS = [80, 12, 3, 2, 2, 1]
+STATUSES = ["200", "201", "204", "301", "302", "304", "400", "401", "403", "404", "429", "500", "502", "503"]
+STATUS_WEIGHTS = [70, 2, 2, 2, 3, 6, 1, 1, 1, 6, 1, 2, 1, 2]
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_3) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.4 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/113.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 16_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "curl/7.88.1",
+    "python-requests/2.31.0",
+    "Googlebot/2.1 (+http://www.google.com/bot.html)",
+    "-",
+]
+REFERRERS = ["-", "-", "-", "https://www.google.com/", "https://example.com/", "https://example.com/search?q=logs"]
+URL_SECTIONS = ["api/v1/users", "api/v1/orders", "static/js", "static/css", "images", "blog", "products", "search"]
+
+# Lines are generated in batches so random.choices can draw many values per call
+_BATCH = 4096
+
+
+def _zipf_cum_weights(n: int, exponent: float = 1.1) -> List[float]:
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def _make_ips(rng: random.Random, n: int) -> List[str]:
+    # A dict keeps insertion order (a set's order would vary with hash randomization)
+    ips = {}
+    while len(ips) < n:
+        ips[f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"] = None
+    return list(ips)
+
+
+def _make_urls(rng: random.Random, n: int) -> List[str]:
+    urls = []
+    for i in range(n):
+        section = URL_SECTIONS[i % len(URL_SECTIONS)]
+        url = f"/{section}/{i}"
+        if rng.random() < 0.2:
+            url += f"?page={rng.randrange(1, 50)}"
+        urls.append(url)
+    return urls
+
+
+def _malform(rng: random.Random, line: str) -> str:
+    kind = rng.randrange(3)
+    if kind == 0:
+        return line[:rng.randrange(1, len(line))]  # Truncated write
+    if kind == 1:
+        return line.replace('"', '', 1)  # Unbalanced quotes
+    return "".join(rng.choice("abcdef0123456789 -[]/") for _ in range(rng.randrange(5, 80)))
+
+
+def generate_lines(num_lines: Optional[int] = None, ip_cardinality: int = 10000, url_cardinality: int = 2000,
+                   malformed_rate: float = 0.0, seed: int = 42, start_time: int = DEFAULT_START_TIME,
+                   lines_per_second: int = 100) -> Iterator[str]:
+    """Yields num_lines (or endlessly many) combined-format lines without trailing newlines."""
+    rng = random.Random(seed)
+    ips, ip_weights = _make_ips(rng, ip_cardinality), _zipf_cum_weights(ip_cardinality)
+    urls, url_weights = _make_urls(rng, url_cardinality), _zipf_cum_weights(url_cardinality)
+    method_weights = list(itertools.accumulate(METHOD_WEIGHTS))
+    status_weights = list(itertools.accumulate(STATUS_WEIGHTS))
+
+    timestamp_cache = {}
+    produced = 0
+    while num_lines is None or produced < num_lines:
+        batch = _BATCH if num_lines is None else min(_BATCH, num_lines - produced)
+        columns = zip(
+            rng.choices(ips, cum_weights=ip_weights, k=batch),
+            rng.choices(METHODS, cum_weights=method_weights, k=batch),
+            rng.choices(urls, cum_weights=url_weights, k=batch),
+            rng.choices(STATUSES, cum_weights=status_weights, k=batch),
+            rng.choices(REFERRERS, k=batch),
+            rng.choices(USER_AGENTS, k=batch),
+        )
+        for i, (ip, method, url, status, referrer, user_agent) in enumerate(columns, produced):
+            second = start_time + i // lines_per_second
+            stamp = timestamp_cache.get(second)
+            if stamp is None:
+                timestamp_cache.clear()
+                stamp = timestamp_cache[second] = time.strftime('%d/%b/%Y:%H:%M:%S +0000', time.gmtime(second))
+            size = "-" if status == "304" else rng.randrange(200, 60000)
+            line = f'{ip} - - [{stamp}] "{method} {url} HTTP/1.1" {status} {size} "{referrer}" "{user_agent}"'
+            if malformed_rate and rng.random() < malformed_rate:
+                line = _malform(rng, line)
+            yield line
+        produced += batch
+
+
+def generate_file(path: str, num_lines: Optional[int] = None, target_bytes: Optional[int] = None,
+                  **options) -> Tuple[int, int]:
+    """
+    Writes a log of num_lines lines, or of at least target_bytes (uncompressed) bytes.
+    A path ending in .gz is gzip-compressed. Returns (lines, uncompressed_bytes).
+    """
+    if num_lines is None and target_bytes is None:
+        raise ValueError("Either num_lines or target_bytes is required")
+
+    opener = gzip.open if path.endswith('.gz') else open
+    lines = written = 0
+    with opener(path, 'wt', encoding='utf-8', newline='\n') as f:
+        buffer = []
+        for line in generate_lines(num_lines, **options):
+            buffer.append(line)
+            written += len(line) + 1
+            lines += 1
+            if len(buffer) >= _BATCH:
+                f.write("\n".join(buffer) + "\n")
+                buffer = []
+            if target_bytes is not None and written >= target_bytes:
+                break
+        if buffer:
+            f.write("\n".join(buffer) + "\n")
+    return lines, written
+
+
+def parse_size(value: str) -> int:
+    """'500000', '200MB', '1.5GB', '64k' -> bytes (binary multiples)."""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([kmgt]?)i?b?\s*', value.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** " kmgt".index(unit or " "))
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic Nginx access log")
+    parser.add_argument("output", help="File to write (.gz for gzip-compressed output)")
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument("--lines", type=int, help="Number of lines to write")
+    size.add_argument("--size", type=parse_size, help="Approximate uncompressed size, e.g. 200MB or 2GB")
+    parser.add_argument("--ips", type=int, default=10000, help="Number of distinct client IPs")
+    parser.add_argument("--urls", type=int, default=2000, help="Number of distinct URLs")
+    parser.add_argument("--malformed", type=float, default=0.0, help="Fraction of malformed lines (0-1)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed -> identical file")
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+    start = time.perf_counter()
+    lines, written = generate_file(args.output, num_lines=args.lines, target_bytes=args.size,
+                                   ip_cardinality=args.ips, url_cardinality=args.urls,
+                                   malformed_rate=args.malformed, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {lines:,} lines ({written / 1e6:,.1f} MB) to {args.output} in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
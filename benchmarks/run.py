@@ -0,0 +1,297 @@
+"""
+Benchmark harness for the parse / stats / export pipeline and the web endpoints.
+
+Each benchmark runs in a fresh subprocess, so its peak RSS (from getrusage) is
+its own and caches do not leak between benchmarks. Results are printed as a table
+and can be saved as JSON and compared against an earlier run:
+
+    python -m benchmarks.run --size 200MB --out results.json
+    python -m benchmarks.run --log access.log --only parse_fast,stats --baseline results.json
+    python -m benchmarks.compare old.json new.json
+
+Without --log, a deterministic synthetic log is generated (see benchmarks.generator).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.common import print_table
+from benchmarks.compare import compare_results, print_comparison
+from benchmarks.generator import generate_file, parse_size
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Skipped(Exception):
+    """Raised by a benchmark whose optional dependency is missing."""
+
+
+def _count(iterator) -> int:
+    total = 0
+    for _ in iterator:
+        total += 1
+    return total
+
+
+# --- Benchmarks: each returns {"records": ..., "ops": ...} (both optional) ---
+
+def bench_parse_regex(log_path: str, workdir: str) -> Dict[str, Any]:
+    from src.parser import NginxLogParser
+    return {"records": _count(NginxLogParser().parse_file(log_path))}
+
+
+def bench_parse_fast(log_path: str, workdir: str) -> Dict[str, Any]:
+    from src.parser import FastNginxLogParser
+    return {"records": _count(FastNginxLogParser().parse_file(log_path))}
+
+
+def bench_stats(log_path: str, workdir: str) -> Dict[str, Any]:
+    from src.parser import FastNginxLogParser
+    from src.stats import LogStatsCollector
+    stats = LogStatsCollector()
+    _count(stats.process_stream(FastNginxLogParser().parse_file(log_path)))
+    return {"records": stats.total_requests}
+
+
+def bench_stats_profiled(log_path: str, workdir: str) -> Dict[str, Any]:
+    """The stats benchmark with --profile instrumentation on; compare with 'stats' for its overhead."""
+    from src.metrics import metrics
+    metrics.enable()
+    return bench_stats(log_path, workdir)
+
+
+def _bench_export(format_name: str) -> Callable[[str, str], Dict[str, Any]]:
+    def bench(log_path: str, workdir: str) -> Dict[str, Any]:
+        from src import exporters
+        from src.parser import FastNginxLogParser
+
+        log_parser = FastNginxLogParser()
+        kwargs = {}
+        if format_name in ("parquet", "arrow"):
+            if exporters.pyarrow is None:
+                raise Skipped("pyarrow not installed")
+            kwargs["field_types"] = log_parser.FIELD_TYPES
+        out = os.path.join(workdir, f"export.{format_name}")
+        getattr(exporters, f"export_to_{format_name}")(log_parser.parse_file(log_path), out, **kwargs)
+        return {"output_bytes": os.path.getsize(out)}
+    return bench
+
+
+def _flask_client(log_path: str):
+    try:
+        import flask  # noqa: F401
+    except ImportError:
+        raise Skipped("flask not installed")
+    import src.app
+    src.app.LOG_DIR = os.path.dirname(os.path.abspath(log_path))
+    return src.app.app.test_client(), os.path.basename(log_path)
+
+
+def bench_flask_analyze(log_path: str, workdir: str) -> Dict[str, Any]:
+    """Cold /api/analyze: the whole file is parsed by a background job."""
+    client, filename = _flask_client(log_path)
+    response = client.get(f"/api/analyze?filename={filename}")
+    return {"records": response.get_json()["total_requests"], "ops": 1}
+
+
+def bench_flask_logs(log_path: str, workdir: str, pages: int = 500) -> Dict[str, Any]:
+    """/api/logs cursor pagination: walks `pages` consecutive pages of 100 rows."""
+    client, filename = _flask_client(log_path)
+    cursor, rows, requests = None, 0, 0
+    while requests < pages:
+        url = f"/api/logs?filename={filename}&limit=100" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        rows += len(response.get_json())
+        requests += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    return {"records": rows, "ops": requests, "count_input": False}
+
+
+def bench_flask_tail(log_path: str, workdir: str, requests: int = 200) -> Dict[str, Any]:
+    """/api/logs?tail=1: the newest 100 rows, read backwards from the end of the file."""
+    client, filename = _flask_client(log_path)
+    for _ in range(requests):
+        client.get(f"/api/logs?filename={filename}&limit=100&tail=1")
+    return {"ops": requests, "count_input": False}
+
+
+BENCHMARKS: Dict[str, Callable[[str, str], Dict[str, Any]]] = {
+    "parse_regex": bench_parse_regex,
+    "parse_fast": bench_parse_fast,
+    "stats": bench_stats,
+    "stats_profiled": bench_stats_profiled,
+    "export_csv": _bench_export("csv"),
+    "export_json": _bench_export("json"),
+    "export_ndjson": _bench_export("ndjson"),
+    "export_parquet": _bench_export("parquet"),
+    "export_arrow": _bench_export("arrow"),
+    "flask_analyze": bench_flask_analyze,
+    "flask_logs": bench_flask_logs,
+    "flask_tail": bench_flask_tail,
+}
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(name: str, log_path: str, workdir: str) -> Dict[str, Any]:
+    """Runs one benchmark in this process (called inside the subprocess)."""
+    start = time.perf_counter()
+    try:
+        result = BENCHMARKS[name](log_path, workdir)
+    except Skipped as e:
+        return {"name": name, "skipped": str(e)}
+    result["seconds"] = time.perf_counter() - start
+    result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    result["name"] = name
+    return result
+
+
+def run_benchmark(name: str, log_path: str, workdir: str, input_lines: int, input_bytes: int) -> Dict[str, Any]:
+    """Runs one benchmark in a fresh interpreter and derives its throughput figures."""
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--child", name, "--log", log_path, "--workdir", workdir],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        return {"name": name, "error": completed.stderr.strip().splitlines()[-1:] or ["failed"]}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    if "skipped" in result:
+        return result
+
+    seconds = result["seconds"]
+    # Benchmarks that touch only part of the file (pagination) report per-request rates only
+    if result.pop("count_input", True):
+        result["lines_per_sec"] = round(input_lines / seconds)
+        result["mb_per_sec"] = round(input_bytes / 1e6 / seconds, 2)
+    if "ops" in result:
+        result["ops_per_sec"] = round(result["ops"] / seconds, 2)
+    result["seconds"] = round(seconds, 3)
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _count_lines(path: str) -> int:
+    from src.readers import iter_blocks
+    return sum(block.count(b"\n") for block in iter_blocks(path))
+
+
+def print_results(results: List[Dict[str, Any]]):
+    rows = []
+    for r in results:
+        if "skipped" in r or "error" in r:
+            rows.append([r["name"], "-", "-", "-", "-", "-", r.get("skipped") or f"error: {r['error']}"])
+            continue
+        rows.append([
+            r["name"],
+            f"{r['lines_per_sec']:,}" if "lines_per_sec" in r else "-",
+            f"{r['mb_per_sec']:.1f}" if "mb_per_sec" in r else "-",
+            f"{r['ops_per_sec']:,.1f}" if "ops_per_sec" in r else "-",
+            f"{r['peak_rss_mb']:.0f}",
+            f"{r['seconds']:.2f}",
+            "",
+        ])
+    print_table(["benchmark", "lines/sec", "MB/sec", "ops/sec", "peak RSS MB", "seconds", "note"], rows)
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the log parser benchmark suite")
+    parser.add_argument("--log", help="Existing log file to benchmark (default: generate one)")
+    parser.add_argument("--lines", type=int, help="Lines to generate (default 1,000,000 unless --size)")
+    parser.add_argument("--size", type=parse_size, help="Generate a log of about this size instead, e.g. 1GB")
+    parser.add_argument("--ips", type=int, default=10000, help="Distinct client IPs in the generated log")
+    parser.add_argument("--urls", type=int, default=2000, help="Distinct URLs in the generated log")
+    parser.add_argument("--malformed", type=float, default=0.0, help="Fraction of malformed generated lines")
+    parser.add_argument("--seed", type=int, default=42, help="Generator seed")
+    parser.add_argument("--repeat", type=int, default=1, help="Run each benchmark N times and keep the fastest run")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results saved earlier with --out")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.log, args.workdir)))
+        return
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Error: unknown benchmark(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        generator = None
+        if args.log:
+            log_path = os.path.abspath(args.log)
+        else:
+            log_path = os.path.join(workdir, "bench.log")
+            generator = {"lines": args.lines, "size": args.size, "ips": args.ips, "urls": args.urls,
+                         "malformed": args.malformed, "seed": args.seed}
+            num_lines = args.lines if args.lines or args.size else 1_000_000
+            print(f"Generating synthetic log in {workdir} ...")
+            generate_file(log_path, num_lines=num_lines, target_bytes=args.size, ip_cardinality=args.ips,
+                          url_cardinality=args.urls, malformed_rate=args.malformed, seed=args.seed)
+
+        input_lines, input_bytes = _count_lines(log_path), os.path.getsize(log_path)
+        print(f"Input: {input_lines:,} lines, {input_bytes / 1e6:,.1f} MB\n")
+
+        results = []
+        for name in names:
+            # Best of N: the fastest run is the least disturbed by other load on the machine
+            runs = [run_benchmark(name, log_path, workdir, input_lines, input_bytes) for _ in range(args.repeat)]
+            results.append(min(runs, key=lambda r: r.get("seconds", float("inf"))))
+            print(f"  {name}: done", file=sys.stderr)
+
+    print()
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "input": {"path": args.log, "lines": input_lines, "bytes": input_bytes, "generator": generator},
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        print_comparison(compare_results(baseline, report))
+
+
+if __name__ == "__main__":
+    main()
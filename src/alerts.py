@@ -0,0 +1,403 @@
+"""
+Alert rules evaluated in-stream over sliding time windows.
+
+AlertEngine.process_stream() is a pipeline stage: records pass through
+unchanged while every rule is updated and checked, so spikes are reported
+while a log is still being written (e.g. with 'follow'). Rules are read from
+a JSON file:
+
+    {"rules": [
+      {"name": "5xx-rate", "type": "ratio", "where": "status >= 500",
+       "window": 60, "threshold": 0.05, "min_events": 20},
+      {"name": "ip-flood", "type": "count", "group_by": "ip", "window": 10, "threshold": 1000},
+      {"name": "traffic-spike", "type": "change", "window": 60, "threshold": 3, "min_events": 100}
+    ]}
+
+- count: records matching `where` in the last `window` seconds exceed threshold
+- ratio: matching records / all records in the window exceed threshold
+  (once the window holds at least min_events records)
+- change: matching records in the last window are at least threshold times
+  those in the window before it (threshold below 1 catches drops instead)
+
+`where` uses the --where language (src/filters.py) and defaults to every record.
+With group_by, each value of that field (e.g. each IP) is tracked on its own.
+Time comes from the records' 'time' field, not the wall clock.
+
+Windows keep (bucket, count) pairs for just the buckets that saw events, with a
+running total, so a record costs O(1) amortized per rule. Windows of up to
+MAX_BUCKETS seconds count per second; longer ones count in MAX_BUCKETS coarser
+buckets (a 3600 s window in 60 s buckets) and end on a bucket boundary, so a
+tracked key holds at most MAX_BUCKETS pairs per window. At most max_keys keys are
+tracked per rule; the least recently seen key is dropped first, and a key whose
+windows have emptied is dropped as time moves on.
+A rule emits one "firing" alert when a key crosses its threshold and one
+"resolved" alert when a later record finds it back under (or its windows empty).
+"""
+import json
+import sys
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+from src.filters import FilterSyntaxError, RecordFilter
+from src.metrics import metrics
+from src.timeutils import to_epoch
+
+RULE_TYPES = ("count", "ratio", "change")
+
+# Keys (e.g. IPs) tracked per grouped rule
+DEFAULT_MAX_KEYS = 10000
+
+# Buckets per window period; longer windows use buckets of several seconds
+MAX_BUCKETS = 60
+
+
+class AlertConfigError(ValueError):
+    """Raised for a malformed rules file or rule."""
+
+
+class SlidingWindow:
+    """
+    Event counts over the last `periods` periods of `seconds` seconds each:
+    `recent` counts the newest period and `total` all of them. Only buckets that
+    saw events are kept, as parallel lists of bucket numbers and counts.
+    """
+
+    __slots__ = ('resolution', 'period', 'size', 'buckets', 'counts', 'older', 'total', 'recent', 'head', 'start')
+
+    def __init__(self, seconds: int, periods: int = 1):
+        self.resolution = -(-seconds // MAX_BUCKETS)  # Seconds per bucket
+        self.period = -(-seconds // self.resolution)  # Buckets per period
+        self.size = self.period * periods
+        self.buckets: List[int] = []
+        self.counts: List[int] = []
+        self.older = 0  # Leading pairs that are in the window but not in the newest period
+        self.total = 0
+        self.recent = 0
+        self.head: Optional[int] = None  # Newest bucket seen
+        self.start: Optional[int] = None  # Since which bucket the window has been watching without a gap
+
+    def advance(self, now: int):
+        """Moves the window forward so that it ends at second `now`."""
+        now //= self.resolution
+        head = self.head
+        if head is None or now - head >= self.size:
+            self.buckets, self.counts = [], []
+            self.older = self.total = self.recent = 0
+            self.start = now
+        elif now > head:
+            buckets, counts = self.buckets, self.counts
+            cutoff, dropped = now - self.size, 0
+            while dropped < len(buckets) and buckets[dropped] <= cutoff:
+                self.total -= counts[dropped]
+                if dropped >= self.older:
+                    self.recent -= counts[dropped]
+                dropped += 1
+            if dropped:
+                del buckets[:dropped], counts[:dropped]
+                self.older = max(0, self.older - dropped)
+            # Pairs that leave the newest period stay in the window
+            cutoff = now - self.period
+            while self.older < len(buckets) and buckets[self.older] <= cutoff:
+                self.recent -= counts[self.older]
+                self.older += 1
+        else:
+            return
+        self.head = now
+
+    def add(self, when: int, count: int = 1):
+        """Counts an event at second `when`; events older than the window are ignored."""
+        bucket = when // self.resolution
+        if self.head is None or bucket > self.head:
+            self.advance(when)
+        age = self.head - bucket
+        if age >= self.size:
+            return
+        buckets, counts = self.buckets, self.counts
+        if buckets and buckets[-1] == bucket:
+            counts[-1] += count
+        elif not buckets or buckets[-1] < bucket:
+            buckets.append(bucket)
+            counts.append(count)
+        else:
+            # A late event: records are nearly in time order, so its bucket is close to the end
+            index = len(buckets) - 1
+            while index >= 0 and buckets[index] > bucket:
+                index -= 1
+            if index >= 0 and buckets[index] == bucket:
+                counts[index] += count
+            else:
+                buckets.insert(index + 1, bucket)
+                counts.insert(index + 1, count)
+                if age >= self.period:
+                    self.older += 1
+        self.total += count
+        if age < self.period:
+            self.recent += count
+
+    def is_empty(self, now: int) -> bool:
+        """Whether no counted event is left in the window at second `now`."""
+        return not self.buckets or now // self.resolution - self.buckets[-1] >= self.size
+
+
+class AlertRule:
+    """One rule of a rules file; see the module docstring for the fields."""
+
+    def __init__(self, name: str, type: str, window: int, threshold: float, where: Optional[str] = None,
+                 group_by: Optional[str] = None, min_events: int = 1, max_keys: int = DEFAULT_MAX_KEYS):
+        if type not in RULE_TYPES:
+            raise AlertConfigError(f"Rule {name!r}: type must be one of {', '.join(RULE_TYPES)}")
+        try:
+            window, threshold = int(window), float(threshold)
+            min_events, max_keys = int(min_events), int(max_keys)
+        except (TypeError, ValueError) as e:
+            raise AlertConfigError(f"Rule {name!r}: window, threshold, min_events and max_keys "
+                                   f"must be numbers ({e})") from e
+        if window < 1:
+            raise AlertConfigError(f"Rule {name!r}: window must be at least 1 second")
+        self.name = name
+        self.type = type
+        self.window = window
+        self.threshold = threshold
+        self.where = where
+        self.group_by = group_by
+        self.min_events = min_events
+        self.max_keys = max_keys
+        try:
+            self.record_filter = RecordFilter(where) if where else None
+        except FilterSyntaxError as e:
+            raise AlertConfigError(f"Rule {name!r}: {e}") from e
+        # key -> windows, least recently seen first
+        self._keys: "OrderedDict[Any, List[SlidingWindow]]" = OrderedDict()
+        self._firing = set()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AlertRule":
+        try:
+            return cls(**data)
+        except TypeError as e:
+            raise AlertConfigError(f"Invalid rule {data!r}: {e}") from e
+
+    def _new_windows(self) -> List[SlidingWindow]:
+        if self.type == "ratio":
+            return [SlidingWindow(self.window), SlidingWindow(self.window)]  # Matching, all
+        if self.type == "change":
+            return [SlidingWindow(self.window, periods=2)]
+        return [SlidingWindow(self.window)]
+
+    def _value(self, windows: List[SlidingWindow]) -> Optional[float]:
+        """The rule's current value, or None while there are too few events to judge."""
+        if self.type == "count":
+            return windows[0].total
+        if self.type == "ratio":
+            matched, seen = windows
+            return matched.total / seen.total if seen.total >= self.min_events else None
+        window = windows[0]
+        if window.head - window.start + 1 < window.size:
+            return None  # The previous window has not been watched in full yet
+        current, previous = window.recent, window.total - window.recent
+        if max(current, previous) < self.min_events:
+            return None
+        return current / previous if previous else float('inf')
+
+    def _breached(self, value: float) -> bool:
+        if self.type != "change":
+            return value > self.threshold
+        # A change threshold below 1 watches for drops
+        return value <= self.threshold if self.threshold < 1 else value >= self.threshold
+
+    def observe(self, record: Dict[str, Any], now: int) -> Optional[Dict[str, Any]]:
+        """Counts a record seen at second `now`; returns an alert if the rule's state changed."""
+        matched = self.record_filter is None or self.record_filter.matches(record)
+        key = record.get(self.group_by) if self.group_by else None
+        keys = self._keys
+        windows = keys.get(key)
+        if windows is None:
+            if not matched and self.type != "ratio":
+                return None  # Nothing to count or resolve for a key never seen matching
+            windows = keys[key] = self._new_windows()
+            if len(keys) > self.max_keys:
+                evicted, _ = keys.popitem(last=False)
+                self._firing.discard(evicted)
+        else:
+            keys.move_to_end(key)
+
+        if self.type == "ratio":
+            windows[1].add(now)
+            if matched:
+                windows[0].add(now)
+            else:
+                windows[0].advance(now)
+        elif matched:
+            windows[0].add(now)
+        else:
+            windows[0].advance(now)
+
+        value = self._value(windows)
+        if value is None:
+            return None
+        breached = self._breached(value)
+        if breached == (key in self._firing):
+            return None
+        if breached:
+            self._firing.add(key)
+        else:
+            self._firing.discard(key)
+        return self._alert(key, breached, value, now)
+
+    def expire(self, now: int) -> List[Dict[str, Any]]:
+        """
+        Drops the least recently seen keys whose windows hold no events at second `now`;
+        returns "resolved" alerts for the ones that were firing.
+        """
+        alerts = []
+        keys = self._keys
+        while keys:
+            key, windows = next(iter(keys.items()))
+            if not all(window.is_empty(now) for window in windows):
+                break
+            del keys[key]
+            if key in self._firing:
+                self._firing.discard(key)
+                alerts.append(self._alert(key, False, 0.0, now))
+        return alerts
+
+    def _alert(self, key: Any, breached: bool, value: float, now: int) -> Dict[str, Any]:
+        return {
+            "time": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+            "rule": self.name,
+            "state": "firing" if breached else "resolved",
+            "key": key,
+            "value": round(value, 4) if value != float('inf') else None,
+            "threshold": self.threshold,
+            "window": self.window,
+        }
+
+
+def load_rules(path: str) -> List[AlertRule]:
+    """Reads a rules file ({"rules": [...]}, or just the list)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise AlertConfigError(f"{path} is not valid JSON: {e}") from e
+    rules = data.get("rules") if isinstance(data, dict) else data
+    if not isinstance(rules, list) or not all(isinstance(rule, dict) for rule in rules):
+        raise AlertConfigError(f"{path} must hold a list of rule objects under \"rules\"")
+    return [AlertRule.from_dict(rule) for rule in rules]
+
+
+# --- Sinks ---
+
+def format_alert(alert: Dict[str, Any]) -> str:
+    key = f" [{alert['key']}]" if alert["key"] is not None else ""
+    value = "inf" if alert["value"] is None else f"{alert['value']:g}"
+    return (f"ALERT {alert['state'].upper()} {alert['rule']}{key} at {alert['time']}: "
+            f"{value} vs threshold {alert['threshold']:g} over {alert['window']}s")
+
+
+class StreamSink:
+    """Writes alerts as one readable line each (to stdout by default)."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+
+    def emit(self, alert: Dict[str, Any]):
+        print(format_alert(alert), file=self.stream or sys.stdout, flush=True)
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """Appends alerts to a file as newline-delimited JSON, flushed per alert so it can be tailed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, alert: Dict[str, Any]):
+        self._file.write(json.dumps(alert) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class WebhookSink:
+    """
+    Stub for posting alerts to a webhook: builds the JSON body that would be
+    POSTed to url and keeps the most recent ones in self.sent. Override post()
+    to deliver them for real.
+    """
+
+    def __init__(self, url: str, keep: int = 100):
+        self.url = url
+        self.sent = deque(maxlen=keep)
+
+    def post(self, body: bytes):
+        self.sent.append(body)
+
+    def emit(self, alert: Dict[str, Any]):
+        self.post(json.dumps({"text": format_alert(alert), "alert": alert}).encode('utf-8'))
+
+    def close(self):
+        pass
+
+
+def open_sink(target: Optional[str]):
+    """'-' or None: stdout; an http(s):// URL: the webhook stub; anything else: a file path."""
+    if not target or target == "-":
+        return StreamSink()
+    if target.startswith(("http://", "https://")):
+        return WebhookSink(target)
+    return FileSink(target)
+
+
+class AlertEngine:
+    """Evaluates rules on a record stream and sends state changes to the sinks."""
+
+    def __init__(self, rules: List[AlertRule], sinks: Optional[List[Any]] = None):
+        self.rules = rules
+        self.sinks = sinks if sinks is not None else [StreamSink()]
+        self.alerts_emitted = 0
+        self._last_time: Optional[int] = None
+        self._last_raw_time: Any = None
+
+    def observe(self, record: Dict[str, Any]):
+        raw_time = record.get('time')
+        if raw_time is None or raw_time != self._last_raw_time:
+            # Neighbouring lines mostly share a timestamp; only parse it when it changes
+            now = to_epoch(raw_time)
+            if now is None:
+                now = self._last_time  # Untimed records count at the last time seen
+                if now is None:
+                    return
+            elif self._last_time is None or now > self._last_time:
+                for rule in self.rules:
+                    for alert in rule.expire(now):
+                        self.emit(alert)
+            self._last_raw_time = raw_time
+            self._last_time = now
+        now = self._last_time
+        for rule in self.rules:
+            alert = rule.observe(record, now)
+            if alert is not None:
+                self.emit(alert)
+
+    def emit(self, alert: Dict[str, Any]):
+        self.alerts_emitted += 1
+        if metrics.enabled:
+            metrics.inc("alerts", rule=alert["rule"], state=alert["state"])
+        for sink in self.sinks:
+            sink.emit(alert)
+
+    def process_stream(self, data: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yields every record unchanged, evaluating the rules on the way through."""
+        observe = self.observe
+        for item in data:
+            observe(item)
+            yield item
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
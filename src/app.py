@@ -1,78 +1,338 @@
+import json
 import os
-from flask import Flask, render_template, request, jsonify
-from src.parser import NginxLogParser, RegexLogParser
-from src.stats import LogStatsCollector
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
+from src.formats import FormatDetectionError, parser_for_file
+from src.cache import ParseCache
+from src.jobs import JobManager, summarize_stats
+from src.multifile import MultiFileStats, expand_inputs
+from src.pagination import CursorError, decode_cursor, read_backward, read_forward
+from src.readers import detect_compression, is_log_filename
+from src.index import LogIndex, parse_query_time
+from src.metrics import metrics
+from src.records import json_default
+from src.sampling import BlockSampler
 
 app = Flask(__name__)
 
 # Directory where log files are stored
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tests', 'sample_logs')
 
+# Parse results shared across requests; budget configurable via environment.
+# LOG_CACHE_DIR keeps them on disk too, across evictions and restarts.
+parse_cache = ParseCache(
+    max_entries=int(os.environ.get('LOG_CACHE_MAX_ENTRIES', 32)),
+    max_bytes=int(os.environ.get('LOG_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    cache_dir=os.environ.get('LOG_CACHE_DIR') or None,
+    max_disk_bytes=int(os.environ.get('LOG_CACHE_MAX_DISK_BYTES', 1024 * 1024 * 1024)),
+)
+
+# Analyses run here in the background; identical concurrent requests share one job
+job_manager = JobManager(parse_cache, max_workers=int(os.environ.get('LOG_JOB_WORKERS', 2)))
+
+# Largest page /api/logs will return
+MAX_PAGE_SIZE = 1000
+
+# Block indexes used by /api/query, kept in memory: a GET never writes <log>.idx.
+# An index built ahead of time with the 'index' command is loaded and extended.
+# path -> [lock, index], least recently used first; each index is updated under its own lock.
+query_indexes: "OrderedDict[str, list]" = OrderedDict()
+query_index_lock = threading.Lock()
+MAX_QUERY_INDEXES = int(os.environ.get('LOG_QUERY_MAX_INDEXES', 16))
+
+# Most results /api/query will return
+MAX_QUERY_RESULTS = 1000
+
+# Seconds between SSE keep-alive comments while a job has nothing new to report
+SSE_HEARTBEAT_SECONDS = 15
+
+# Pipeline and request metrics for /metrics; LOG_METRICS=0 turns the instrumentation off
+METRICS_ENABLED = os.environ.get('LOG_METRICS', '1') != '0'
+
+@app.before_request
+def start_request_timer():
+    # Enabled on the first request rather than at import, so importing the app (as the CLI does) costs nothing
+    if METRICS_ENABLED and not metrics.enabled:
+        metrics.enable()
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    if metrics.enabled and request.endpoint != 'prometheus_metrics':
+        endpoint = request.endpoint or 'unknown'
+        metrics.inc('http_requests', endpoint=endpoint, status=str(response.status_code))
+        metrics.inc('http_request_seconds', time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
+
+def query_index_for(filepath: str, log_parser) -> LogIndex:
+    """The up-to-date in-memory index of filepath, for /api/query."""
+    with query_index_lock:
+        slot = query_indexes.get(filepath)
+        if slot is None:
+            slot = query_indexes[filepath] = [threading.Lock(), None]
+            while len(query_indexes) > MAX_QUERY_INDEXES:
+                query_indexes.popitem(last=False)
+        else:
+            query_indexes.move_to_end(filepath)
+    with slot[0]:
+        if slot[1] is None:
+            slot[1] = LogIndex.load(filepath) or LogIndex(filepath)
+        slot[1].update(log_parser)
+        return slot[1]
+
+# Query-string values that turn a flag such as ?refine= on; anything else (0, false, no) is off
+TRUE_VALUES = {'1', 'true', 'yes', 'on'}
+
+def flag(name: str) -> bool:
+    """Whether the boolean query parameter `name` is set."""
+    return request.args.get(name, '').strip().lower() in TRUE_VALUES
+
+def in_log_dir(path: str) -> bool:
+    """True if path (after resolving symlinks and '..') is inside LOG_DIR."""
+    root = os.path.realpath(LOG_DIR)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+def log_dir_path(name: str) -> Optional[str]:
+    """The path of a name relative to LOG_DIR, or None if it is absolute, has '..' parts or leaves LOG_DIR."""
+    if os.path.isabs(name) or '..' in name.replace('\\', '/').split('/'):
+        return None
+    path = os.path.join(LOG_DIR, name)
+    return path if in_log_dir(path) else None
+
+@app.errorhandler(FormatDetectionError)
+def unknown_format(e):
+    return jsonify({"error": str(e)}), 415
+
 @app.route('/')
 def index():
     """Render the main dashboard."""
     # Get available log files
     log_files = []
     if os.path.exists(LOG_DIR):
-        log_files = [f for f in os.listdir(LOG_DIR) if f.endswith('.log')]
+        log_files = [f for f in os.listdir(LOG_DIR) if is_log_filename(f)]
     
     return render_template('index.html', log_files=log_files)
 
 @app.route('/api/analyze')
 def analyze_log():
-    """API endpoint to analyze a log file and return JSON stats."""
+    """
+    API endpoint to analyze log files and return JSON stats.
+    Repeat ?filename= or use a glob (e.g. access.log*) to analyze several files at
+    once; the response then also holds each file's stats under "files".
+    ?sample=0.01 estimates the stats of one file from 1% of it (see src/sampling.py);
+    adding &refine=1 streams ever better estimates as Server-Sent Events until exact.
+    """
+    names = request.args.getlist('filename')
+    
+    if not names:
+        return jsonify({"error": "No filename provided"}), 400
+
+    # Names and patterns are relative to LOG_DIR and must not reach outside it. They are
+    # checked before anything is looked up, so a 404 never tells whether an outside path exists.
+    patterns = [log_dir_path(name) for name in names]
+    if None in patterns:
+        return jsonify({"error": "Invalid filename"}), 400
+    try:
+        filepaths = expand_inputs(patterns)
+    except FileNotFoundError:
+        return jsonify({"error": "File not found"}), 404
+    # A symlink inside LOG_DIR may still point outside it
+    if not all(in_log_dir(filepath) for filepath in filepaths):
+        return jsonify({"error": "Invalid filename"}), 400
+
+    parsers = [parser_for_file(filepath) for filepath in filepaths]
+
+    sample = request.args.get('sample')
+    if sample is not None:
+        try:
+            fraction = float(sample)
+        except ValueError:
+            return jsonify({"error": "sample must be a fraction such as 0.01"}), 400
+        if not 0 < fraction <= 1:
+            return jsonify({"error": "sample must be greater than 0 and at most 1"}), 400
+        if len(filepaths) != 1:
+            return jsonify({"error": "sample works on one file at a time"}), 400
+        # Compressed files have no random access and are analyzed in full below
+        if not detect_compression(filepaths[0]):
+            return sampled_analysis(BlockSampler(filepaths[0], parsers[0]), fraction,
+                                    refine=flag('refine'))
+
+    try:
+        # Waits for the (shared, cached) background jobs, which run a few files at a time
+        # on the job pool; see /api/jobs for a non-blocking variant
+        jobs = [job_manager.submit(filepath, file_parser) for filepath, file_parser in zip(filepaths, parsers)]
+        for job in jobs:
+            job.wait_done()
+            if job.status == "error":
+                return jsonify({"error": job.error}), 500
+        if len(jobs) == 1:
+            return jsonify(jobs[0].stats)
+
+        combined = MultiFileStats({os.path.basename(job.filepath): job.collector for job in jobs})
+        result = summarize_stats(combined.total)
+        result["files"] = {name: summarize_stats(stats) for name, stats in combined.per_file.items()}
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def sampled_analysis(sampler: BlockSampler, fraction: float, refine: bool):
+    """One estimate as JSON, or with refine an SSE stream of estimates ending with a 'done' event."""
+    if not refine:
+        return jsonify(sampler.refine(fraction).summary())
+
+    def events():
+        for step in sampler.progressive(start_fraction=fraction):
+            event = "done" if step.exact else "estimate"
+            yield f"event: {event}\ndata: {json.dumps(step.summary())}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs', methods=['POST'])
+def start_job():
+    """API endpoint to start (or join) a background analysis; returns its id immediately."""
     filename = request.args.get('filename')
     
     if not filename:
         return jsonify({"error": "No filename provided"}), 400
         
     filepath = os.path.join(LOG_DIR, filename)
+    if not in_log_dir(filepath):
+        return jsonify({"error": "Invalid filename"}), 400
     if not os.path.exists(filepath):
         return jsonify({"error": "File not found"}), 404
 
-    try:
-        # Use our existing Nginx parser
-        log_parser = NginxLogParser()
-        stream = log_parser.parse_file(filepath)
-        
-        # Collect stats
-        stats_collector = LogStatsCollector()
-        list(stats_collector.process_stream(stream)) # Exhaust stream
+    job = job_manager.submit(filepath, parser_for_file(filepath))
+    return jsonify(job.snapshot()), 202
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """API endpoint to poll a job's progress and (partial) stats."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events stream of a job's progress, ending with a 'done' or 'error' event."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def events():
+        version = -1
+        while True:
+            new_version = job.wait(version, timeout=SSE_HEARTBEAT_SECONDS)
+            if new_version == version and not job.done:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            snapshot = job.snapshot()
+            event = snapshot["status"] if job.done else "progress"
+            yield f"event: {event}\ndata: {json.dumps(snapshot)}\n\n"
+            if job.done:
+                return
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/logs')
+def get_logs():
+    """
+    API endpoint to get a page of parsed log lines.
+    Pass the X-Next-Cursor (or X-Prev-Cursor with direction=backward) response
+    header back as ?cursor= to continue; ?tail=1 returns the newest lines.
+    ?typed=1 returns typed values (int status/size, ISO 8601 time) where the format has them.
+    """
+    filename = request.args.get('filename')
+    
+    if not filename:
+        return jsonify({"error": "No filename provided"}), 400
         
-        # Format the results for the frontend
-        results = {
-            "total_requests": stats_collector.total_requests,
-            "ip_addresses": [{"ip": ip, "count": count} for ip, count in stats_collector.ip_addresses.most_common(10)],
-            "status_codes": [{"status": status, "count": count} for status, count in stats_collector.status_codes.most_common()],
-            "methods": [{"method": method, "count": count} for method, count in stats_collector.methods.most_common()]
-        }
+    filepath = os.path.join(LOG_DIR, filename)
+    if not in_log_dir(filepath):
+        return jsonify({"error": "Invalid filename"}), 400
+    if not os.path.exists(filepath):
+        return jsonify({"error": "File not found"}), 404
+
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    log_parser = parser_for_file(filepath)
         
-        return jsonify(results)
-    
+    try:
+        cursor = request.args.get('cursor')
+        offset = decode_cursor(cursor, filepath) if cursor else None
+        inode = os.stat(filepath).st_ino
+
+        # Each page seeks straight to its cursor, so its cost does not depend on its position
+        if flag('tail') or request.args.get('direction') == 'backward':
+            page = read_backward(filepath, log_parser, offset, limit)
+        else:
+            page = read_forward(filepath, log_parser, offset or 0, limit)
+
+        converter = log_parser.record_converter() if flag('typed') else None
+        if converter is not None:
+            rows = list(converter.convert_all(page.rows))
+            response = app.response_class(json.dumps(rows, default=json_default), mimetype='application/json')
+        else:
+            response = jsonify(page.rows)
+        prev_cursor, next_cursor = page.cursors(inode)
+        if prev_cursor:
+            response.headers['X-Prev-Cursor'] = prev_cursor
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/logs')
-def get_logs():
-    """API endpoint to get parsed log lines."""
+@app.route('/api/query')
+def query_logs():
+    """API endpoint to look up lines by ip/status/method/time range via the sidecar index."""
     filename = request.args.get('filename')
-    limit = int(request.args.get('limit', 50))
     
     if not filename:
         return jsonify({"error": "No filename provided"}), 400
+    try:
+        limit = int(request.args.get('limit', 100))
+        since = parse_query_time(request.args.get('since'))
+        until = parse_query_time(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+    limit = min(limit, MAX_QUERY_RESULTS)
         
     filepath = os.path.join(LOG_DIR, filename)
+    if not in_log_dir(filepath):
+        return jsonify({"error": "Invalid filename"}), 400
     if not os.path.exists(filepath):
         return jsonify({"error": "File not found"}), 404
+    log_parser = parser_for_file(filepath)
         
     try:
-        log_parser = NginxLogParser()
-        stream = log_parser.parse_file(filepath)
+        stream = query_index_for(filepath, log_parser).query(
+            log_parser,
+            ip=request.args.get('ip'),
+            status=request.args.get('status'),
+            method=request.args.get('method'),
+            since=since,
+            until=until,
+        )
         
-        # Grab the first 'limit' lines
         lines = []
-        for i, item in enumerate(stream):
-            if i >= limit:
+        for item in stream:
+            if len(lines) >= limit:
                 break
             lines.append(item)
             
@@ -80,5 +340,25 @@ def get_logs():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/cache')
+def cache_stats():
+    """API endpoint exposing parse-cache hit/miss counters."""
+    return jsonify(parse_cache.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Pipeline counters, stage timings, request counts and cache/job gauges in the Prometheus text format."""
+    cache = parse_cache.stats()
+    gauges = {
+        "cache_entries": (cache["entries"], "Files held in the parse cache"),
+        "cache_estimated_bytes": (cache["estimated_bytes"], "Estimated memory used by the parse cache"),
+        "cache_hits": (cache["hits"], "Parse cache hits since start"),
+        "cache_disk_hits": (cache["disk_hits"], "Parse cache entries loaded from LOG_CACHE_DIR since start"),
+        "cache_disk_bytes": (cache["disk_bytes"], "Bytes used by the parse cache in LOG_CACHE_DIR"),
+        "cache_misses": (cache["misses"], "Parse cache misses since start"),
+        "jobs_active": (job_manager.active_count(), "Analysis jobs queued or running"),
+    }
+    return Response(metrics.to_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    app.run(debug=True, port=5000, threaded=True)
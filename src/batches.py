@@ -0,0 +1,180 @@
+"""
+Columnar record batches.
+
+Instead of one dict of strings per line, parse_batches() yields RecordBatch objects
+holding one typed column per field:
+
+- 'int' fields (e.g. status, size) as array('q'); values that are not numbers
+  (such as Nginx's '-' size) are stored as 0.
+- 'timestamp' fields (e.g. time) as array('q') of epoch seconds, with
+  TIMESTAMP_NULL for unparseable values (it maps to NaT in pandas).
+- every other field as a DictionaryColumn: array('i') codes into a list of
+  distinct values, so repeated IPs, methods, protocols and user agents are stored once.
+
+The arrays are plain buffers, so to_pandas() can wrap them with NumPy without
+copying (dictionary columns become pandas Categoricals).
+"""
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+from src.timeutils import to_epoch
+
+DEFAULT_BATCH_SIZE = 65536
+
+# Smallest int64, which NumPy/pandas interpret as NaT for datetime64 data
+TIMESTAMP_NULL = -2 ** 63
+
+
+class DictionaryColumn:
+    """
+    A string column stored as integer codes into a list of distinct values (None = -1).
+    Other scalars (e.g. JSON numbers and booleans) are kept as they are.
+    """
+
+    def __init__(self):
+        self.codes = array('i')
+        self.values: List[Any] = []
+        # Strings are keyed by themselves, anything else by (type, value) so that True and 1 stay apart
+        self._lookup: Dict[Any, int] = {}
+
+    def append(self, value: Any):
+        if value is None:
+            self.codes.append(-1)
+            return
+        key = value if type(value) is str else (type(value), value)
+        code = self._lookup.get(key)
+        if code is None:
+            code = self._lookup[key] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        code = self.codes[index]
+        return None if code < 0 else self.values[code]
+
+    def to_list(self) -> List[Optional[str]]:
+        values = self.values
+        return [None if code < 0 else values[code] for code in self.codes]
+
+
+Column = Union[array, DictionaryColumn]
+
+
+def _to_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_timestamp(value: Any) -> int:
+    epoch = to_epoch(value)
+    return TIMESTAMP_NULL if epoch is None else epoch
+
+
+class RecordBatch:
+    """A fixed set of rows stored column by column."""
+
+    def __init__(self, columns: Dict[str, Column], field_types: Dict[str, str]):
+        self.columns = columns
+        self.field_types = field_types
+
+    @property
+    def num_rows(self) -> int:
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def column_values(self, name: str) -> List[Any]:
+        """Returns a column as a list of Python values (decoding dictionary columns)."""
+        column = self.columns[name]
+        if isinstance(column, DictionaryColumn):
+            return column.to_list()
+        return column.tolist()
+
+    def to_pandas(self):
+        """Builds a DataFrame that shares memory with this batch's arrays."""
+        import numpy as np
+        import pandas as pd
+
+        data = {}
+        for name, column in self.columns.items():
+            kind = self.field_types.get(name, 'string')
+            if isinstance(column, DictionaryColumn):
+                codes = np.frombuffer(column.codes, dtype=np.int32) if len(column) else np.empty(0, np.int32)
+                data[name] = pd.Categorical.from_codes(codes, categories=column.values, validate=False)
+            elif kind == 'timestamp':
+                data[name] = np.frombuffer(column, dtype='datetime64[s]') if len(column) else np.empty(0, 'datetime64[s]')
+            else:
+                data[name] = np.frombuffer(column, dtype=np.int64) if len(column) else np.empty(0, np.int64)
+        return pd.DataFrame(data, copy=False)
+
+
+class BatchBuilder:
+    """Accumulates parsed dicts into columns and cuts RecordBatch objects."""
+
+    def __init__(self, field_types: Optional[Dict[str, str]] = None):
+        self.field_types = field_types or {}
+        self._reset()
+
+    def _reset(self):
+        self.columns: Dict[str, Column] = {}
+        # Per-column functions that convert and append one value
+        self._appenders: Dict[str, Callable[[Any], None]] = {}
+        self.num_rows = 0
+
+    def _add_column(self, name: str) -> Callable[[Any], None]:
+        kind = self.field_types.get(name, 'string')
+        if kind == 'int':
+            column = array('q')
+            append = lambda value, push=column.append: push(_to_int(value))
+        elif kind == 'timestamp':
+            column = array('q')
+            append = lambda value, push=column.append: push(_to_timestamp(value))
+        else:
+            column = DictionaryColumn()
+            append = column.append
+
+        # Backfill rows that were added before this field first appeared
+        for _ in range(self.num_rows):
+            append(None)
+        self.columns[name] = column
+        self._appenders[name] = append
+        return append
+
+    def append(self, record: Dict[str, Any]):
+        appenders = self._appenders
+        for name, value in record.items():
+            append = appenders.get(name)
+            if append is None:
+                append = self._add_column(name)
+            append(value)
+        self.num_rows += 1
+
+        # Fill in fields missing from this record
+        if len(record) != len(appenders):
+            for name, column in self.columns.items():
+                if len(column) < self.num_rows:
+                    appenders[name](None)
+
+    def build(self) -> RecordBatch:
+        batch = RecordBatch(self.columns, self.field_types)
+        self._reset()
+        return batch
+
+
+def batches_from_records(records: Iterator[Dict[str, Any]], batch_size: int = DEFAULT_BATCH_SIZE,
+                         field_types: Optional[Dict[str, str]] = None) -> Iterator[RecordBatch]:
+    """Groups a stream of parsed dicts into RecordBatch objects of up to batch_size rows."""
+    builder = BatchBuilder(field_types)
+    for record in records:
+        builder.append(record)
+        if builder.num_rows >= batch_size:
+            yield builder.build()
+    if builder.num_rows:
+        yield builder.build()
@@ -0,0 +1,313 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from src.parser import BaseLogParser, parser_key
+from src.stats import LogStatsCollector
+from src.readers import open_binary, detect_compression
+from src.metrics import metrics
+
+# Rough per-key cost of a Counter entry, used to estimate an entry's memory footprint
+_BYTES_PER_COUNTER_KEY = 120
+
+# How often (in lines) extend() reports progress to its callback
+PROGRESS_EVERY_LINES = 16384
+
+# Bumped whenever the layout of the on-disk cache files changes
+CACHE_FORMAT_VERSION = 1
+
+# progress(bytes_read, stats) is called periodically while a file is parsed
+ProgressCallback = Callable[[int, LogStatsCollector], None]
+
+
+class CacheEntry:
+    """Computed stats for one file, plus how far into it they go."""
+
+    def __init__(self, filepath: str, inode: int):
+        self.filepath = filepath
+        self.inode = inode
+        self.size = 0
+        self.mtime = 0.0
+        self.offset = 0  # Bytes consumed so far
+        self.ends_mid_line = False  # True if the last line had no trailing newline
+        self.stats = LogStatsCollector()
+        # Offsets index the decompressed stream; compressed files are never extended in place
+        self.compressed = detect_compression(filepath) is not None
+
+    def estimated_bytes(self) -> int:
+        keys = len(self.stats.status_codes) + len(self.stats.ip_addresses) + len(self.stats.methods)
+        return keys * _BYTES_PER_COUNTER_KEY
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializes the entry (its stats as a partial aggregate) for the disk tier."""
+        return {
+            "version": CACHE_FORMAT_VERSION,
+            "filepath": self.filepath,
+            "inode": self.inode,
+            "size": self.size,
+            "mtime": self.mtime,
+            "offset": self.offset,
+            "ends_mid_line": self.ends_mid_line,
+            "compressed": self.compressed,
+            "stats": self.stats.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CacheEntry":
+        """Rebuilds an entry from the output of to_dict()."""
+        version = data.get("version")
+        if version != CACHE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported cache format version: {version}")
+        entry = cls.__new__(cls)
+        for name in ("filepath", "inode", "size", "mtime", "offset", "ends_mid_line", "compressed"):
+            setattr(entry, name, data[name])
+        entry.stats = LogStatsCollector.from_dict(data["stats"])
+        return entry
+
+    def copy(self) -> "CacheEntry":
+        """A copy whose stats can be extended without changing this entry."""
+        entry = CacheEntry.__new__(CacheEntry)
+        entry.__dict__.update(self.__dict__)
+        entry.stats = self.stats._new_empty().merge(self.stats)
+        return entry
+
+    def extend(self, log_parser: BaseLogParser, progress: Optional[ProgressCallback] = None):
+        """Parses everything after self.offset, updating stats."""
+        start_offset, start_rows = self.offset, self.stats.total_requests
+        lines = 0
+
+        def records():
+            nonlocal lines
+            with open_binary(self.filepath) as f:
+                f.seek(self.offset)
+                pos = self.offset
+                for raw in f:
+                    parsed = log_parser.parse_line(raw.decode('utf-8', errors='replace').strip())
+                    if parsed:
+                        yield parsed
+                    pos += len(raw)
+                    self.ends_mid_line = not raw.endswith(b'\n')
+                    lines += 1
+                    if progress is not None and lines % PROGRESS_EVERY_LINES == 0:
+                        progress(pos, self.stats)
+                self.offset = pos
+
+        source = records()
+        profiling = metrics.enabled
+        if profiling:
+            # Reading and parsing are interleaved line by line here, so they are timed together
+            source = (record for chunk in metrics.chunks(source, stage="read+parse") for record in chunk)
+        for _ in self.stats.process_stream(source):
+            pass
+        if progress is not None:
+            progress(self.offset, self.stats)
+        if profiling:
+            matched = self.stats.total_requests - start_rows
+            metrics.inc("lines_read", lines)
+            metrics.inc("lines_matched", matched)
+            metrics.inc("parse_failures", lines - matched)
+            metrics.inc("bytes_read", self.offset - start_offset)
+
+
+class ParseCache:
+    """
+    LRU cache of parse results keyed on (path, parser pattern), validated against
+    the file's inode, size and mtime. A file that has only grown since it was cached
+    is extended incrementally instead of being reparsed. Entries are evicted in LRU
+    order once either max_entries or the estimated max_bytes budget is exceeded.
+
+    With cache_dir, every entry is also written there (gzip-compressed JSON, one
+    file per key), so entries evicted from memory and results from before a restart
+    are loaded instead of reparsed. The files are trimmed, least recently used
+    first, to max_disk_bytes.
+
+    Parsing happens under a per-key lock, so concurrent requests for the same file
+    wait for one parse while requests for other files are not blocked.
+    """
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 256 * 1024 * 1024,
+                 cache_dir: Optional[str] = None, max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> [lock, number of requests using it]; dropped when no request uses it
+        self._key_locks: Dict[Tuple[str, str], List[Any]] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _parser_key(log_parser: BaseLogParser) -> str:
+        return parser_key(log_parser)
+
+    def get(self, filepath: str, log_parser: BaseLogParser,
+            progress: Optional[ProgressCallback] = None) -> CacheEntry:
+        """
+        Returns an up-to-date cache entry for filepath, (re)building it if needed.
+        progress, if given, is called periodically while new bytes are parsed.
+        """
+        filepath = os.path.abspath(filepath)
+        key = (filepath, self._parser_key(log_parser))
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                return self._get(key, log_parser, progress)
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self._key_locks[key]
+
+    def _get(self, key: Tuple[str, str], log_parser: BaseLogParser,
+             progress: Optional[ProgressCallback]) -> CacheEntry:
+        filepath = key[0]
+        st = os.stat(filepath)
+        with self._lock:
+            entry = self._entries.get(key)
+        from_disk = False
+        if entry is None:
+            entry = self._load(key)
+            from_disk = entry is not None
+
+        if entry is not None and entry.inode == st.st_ino:
+            if st.st_size == entry.size and st.st_mtime == entry.mtime:
+                with self._lock:
+                    if from_disk:
+                        self.disk_hits += 1
+                    else:
+                        self.hits += 1
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    self._evict()
+                return entry
+            if not (st.st_size > entry.size and not entry.ends_mid_line and not entry.compressed):
+                entry = None
+        else:
+            entry = None
+        with self._lock:
+            if entry is not None:
+                self.extensions += 1
+            else:
+                self.misses += 1
+
+        if entry is not None:
+            # Appended to since last time: only parse the new bytes. The cached entry
+            # is left alone (it may be in use, and parsing may fail) until the copy is done
+            entry = entry.copy()
+            entry.extend(log_parser, progress)
+        else:
+            entry = CacheEntry(filepath, st.st_ino)
+            entry.extend(log_parser, progress)
+        entry.size, entry.mtime = st.st_size, st.st_mtime
+        self._store(key, entry)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+        return entry
+
+    def _evict(self):
+        # Key locks are left alone: they belong to the requests using them, not to the entries
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self.total_bytes() > self.max_bytes):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # --- Disk tier ---
+
+    def _disk_path(self, key: Tuple[str, str]) -> str:
+        name = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + ".agg")
+
+    def _load(self, key: Tuple[str, str]) -> Optional[CacheEntry]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("key") != list(key):
+                return None
+            entry = CacheEntry.from_dict(data)
+            os.utime(path)  # The mtime orders the files for trimming
+        except (OSError, EOFError, ValueError, KeyError):
+            return None  # Missing, half-written or from another version: reparse
+        return entry
+
+    def _store(self, key: Tuple[str, str], entry: CacheEntry):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(dict(entry.to_dict(), key=list(key)), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+            self._trim_disk(keep=path)
+        except OSError:
+            # The disk tier is best effort; the entry is still cached in memory
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _trim_disk(self, keep: str):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".agg"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    def disk_bytes(self) -> int:
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith(".agg"))
+
+    def total_bytes(self) -> int:
+        return sum(entry.estimated_bytes() for entry in self._entries.values())
+
+    def clear(self):
+        """Empties the memory tier; files in cache_dir are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current usage, for monitoring."""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "extensions": self.extensions,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "estimated_bytes": self.total_bytes(),
+            "disk_bytes": self.disk_bytes(),
+        }
@@ -1,80 +1,244 @@
 import argparse
+import functools
+import json
+import os
 import sys
 import threading
-from src.parser import NginxLogParser, RegexLogParser
-from src.exporters import export_to_csv, export_to_json
+import time
+from src.parser import PatternError
+from src.formats import FormatDetectionError, available_formats, get_parser, parser_for_file
+from src.exporters import (export_to_csv, export_to_json, export_to_ndjson, export_to_parquet,
+                           export_to_arrow, export_in_background)
 from src.stats import LogStatsCollector
+from src.follow import LogFollower
+from src.index import build_index, parse_query_time
+from src.filters import RecordFilter, FilterSyntaxError
+from src.alerts import AlertConfigError, AlertEngine, load_rules, open_sink
+from src.metrics import metrics
+from src.multifile import DEFAULT_FILE_WORKERS, MultiFileStats, analyze_files, expand_inputs, stream_files
+from src.records import RecordFieldError
 from src.app import app
 
+EXPORTERS = {
+    "csv": export_to_csv,
+    "json": export_to_json,
+    "ndjson": export_to_ndjson,
+    "parquet": export_to_parquet,
+    "arrow": export_to_arrow,
+}
+
+OUT_FORMAT_EXTENSIONS = {
+    ".csv": "csv",
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".arrows": "arrow",
+}
+
 def create_parser():
     parser = argparse.ArgumentParser(description="Log File Parser and Analyzer")
     
-    parser.add_argument("command", choices=["parse", "analyze", "serve"], help="Action to perform")
+    parser.add_argument("command", choices=["parse", "analyze", "follow", "index", "query", "serve"], help="Action to perform")
     
     # Make input_file optional when using "serve" command
-    parser.add_argument("input_file", nargs="?", help="Path to the log file to parse (Not required for 'serve')")
+    parser.add_argument("input_file", nargs="*", help="Log file(s), directories or glob patterns such as 'access.log*' (Not required for 'serve')")
     
-    parser.add_argument("--format", choices=["nginx", "regex"], default="nginx", help="Log format to parse")
+    parser.add_argument("--format", choices=["auto"] + available_formats() + ["regex"], default="auto", help="Log format to parse (auto: detected from the start of the (first) input file)")
     parser.add_argument("--regex", help="Custom regex pattern (required if --format regex)")
     
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to parse with (0 = one per CPU core)")
+    parser.add_argument("--mmap", action="store_true", help="Memory-map plain (uncompressed) input files instead of reading them")
+    parser.add_argument("--file-workers", type=int, default=DEFAULT_FILE_WORKERS, help="With several input files, how many 'analyze' reads at once (0 = one per CPU core)")
+    parser.add_argument("--typed", action="store_true", help="Parse into compact typed records (int status/size, datetime time, interned values) instead of dicts")
+    parser.add_argument("--merge-by-time", action="store_true", help="With several input files, interleave their records in timestamp order instead of one file after another")
+    
+    parser.add_argument("--approximate", action="store_true", help="Track top IPs and distinct IPs/URLs in fixed memory (approximate counts)")
+    parser.add_argument("--top-k", type=int, default=1000, help="Number of IP counters kept in --approximate mode")
+    parser.add_argument("--rollups", action="store_true", help="Add per-minute/per-hour rollups and size/latency percentiles to 'analyze'")
+    parser.add_argument("--rollup-out", help="Write the minute and hour rollups to this JSON file (implies --rollups)")
+    parser.add_argument("--save-agg", help="Write a partial-aggregate file (e.g. node1.agg) after 'analyze'")
+    parser.add_argument("--merge", nargs="+", metavar="AGG_FILE", help="Combine partial-aggregate files into one report (with 'analyze')")
+    
+    parser.add_argument("--checkpoint", help="Checkpoint file used by 'follow' to resume where it left off")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls in 'follow' mode")
+    parser.add_argument("--once", action="store_true", help="With 'follow', catch up to the end of the file and exit")
+    
+    parser.add_argument("--ip", help="With 'query', only return lines from this client IP")
+    parser.add_argument("--status", help="With 'query', only return this status code or class (e.g. 404 or 5xx)")
+    parser.add_argument("--method", help="With 'query', only return this HTTP method")
+    parser.add_argument("--since", help="With 'query', start time (ISO 8601, UTC if no offset, or Nginx format)")
+    parser.add_argument("--until", help="With 'query', end time (ISO 8601, UTC if no offset, or Nginx format)")
+    
+    parser.add_argument("--where", metavar="EXPR", help="Only keep records matching EXPR, e.g. \"status >= 500 and method == 'POST'\"")
+    
+    parser.add_argument("--alerts", metavar="RULES_FILE", help="Evaluate the alert rules in this JSON file while reading (see src/alerts.py)")
+    parser.add_argument("--alert-out", metavar="TARGET", help="Where alerts go: '-' for stdout (default), a file (NDJSON) or an http(s):// webhook URL")
+    
     parser.add_argument("--out", help="Output file path (e.g., output.csv or output.json)")
-    parser.add_argument("--out-format", choices=["csv", "json"], help="Output format if writing to a file (implied by extension if not provided)")
+    parser.add_argument("--out-format", choices=["csv", "json", "ndjson", "parquet", "arrow"], help="Output format if writing to a file (implied by extension if not provided)")
+    parser.add_argument("--threaded-export", action="store_true", help="Write --out on a background thread so parsing and writing overlap")
+    
+    parser.add_argument("--profile", action="store_true", help="Print per-stage timings and line/byte counters to stderr when done")
     
     return parser
 
 def main():
     arg_parser = create_parser()
     args = arg_parser.parse_args()
+    started = time.perf_counter()
+    if args.profile:
+        metrics.enable()
     
     # 0. Handle 'serve' command
     if args.command == "serve":
         print("Starting Log Dashboard Web Server...")
         print("Available at: http://127.0.0.1:5000")
-        app.run(debug=False, port=5000)
+        # Threaded, so long analyses (which run as background jobs) never block other users
+        app.run(debug=False, port=5000, threaded=True)
+        sys.exit(0)
+
+    # Merging partial aggregates does not need to read any raw logs
+    if args.command == "analyze" and args.merge and not args.input_file:
+        stats_collector = LogStatsCollector.load(args.merge[0])
+        for agg_file in args.merge[1:]:
+            stats_collector.merge(LogStatsCollector.load(agg_file))
+        if args.save_agg:
+            stats_collector.save(args.save_agg)
+        stats_collector.print_report()
         sys.exit(0)
 
     # Validate input_file for other commands
     if not args.input_file:
          print(f"Error: the following arguments are required: input_file (Unless using 'serve' command)")
          sys.exit(1)
+    try:
+        input_files = expand_inputs(args.input_file)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if len(input_files) > 1 and args.command in ("follow", "index", "query"):
+        print(f"Error: '{args.command}' takes a single input file, got {len(input_files)}")
+        sys.exit(1)
+    input_file = input_files[0]
 
     # 1. Choose the parser
-    if args.format == "nginx":
-        log_parser = NginxLogParser()
-    elif args.format == "regex":
-        if not args.regex:
-            print("Error: --regex must be provided when --format is 'regex'")
+    if args.format == "regex" and not args.regex:
+        print("Error: --regex must be provided when --format is 'regex'")
+        sys.exit(1)
+    try:
+        if args.format == "auto":
+            log_parser = parser_for_file(input_file)
+        else:
+            log_parser = get_parser(args.format, args.regex)
+    except (FormatDetectionError, PatternError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.typed:
+        try:
+            log_parser.record_converter()  # Checks that the fields can be record attributes
+        except RecordFieldError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    record_filter = None
+    if args.where:
+        try:
+            record_filter = RecordFilter(args.where)
+        except FilterSyntaxError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    alert_engine = None
+    if args.alerts:
+        try:
+            alert_engine = AlertEngine(load_rules(args.alerts), [open_sink(args.alert_out)])
+        except (AlertConfigError, OSError) as e:
+            print(f"Error: {e}")
             sys.exit(1)
-        log_parser = RegexLogParser(args.regex)
         
+    # 'follow' tails the file instead of reading it once
+    if args.command == "follow":
+        stats_collector = LogStatsCollector(approximate=args.approximate, top_k=args.top_k, alerts=alert_engine)
+        follower = LogFollower(input_file, log_parser, stats_collector,
+                               checkpoint_path=args.checkpoint, poll_interval=args.interval,
+                               record_filter=record_filter)
+        try:
+            for item in follower.follow(max_polls=1 if args.once else None):
+                print(item)
+        except KeyboardInterrupt:
+            follower.save_checkpoint()
+        finally:
+            follower.close()
+            if alert_engine:
+                alert_engine.close()
+        follower.stats_collector.print_report()
+        sys.exit(0)
+
+    # 'index' builds or extends the sidecar index used by 'query'
+    if args.command == "index":
+        index = build_index(input_file, log_parser)
+        print(f"Indexed {index.indexed_bytes} bytes in {len(index.blocks)} blocks -> {index.index_path}")
+        sys.exit(0)
+
     # 2. Setup the stream
-    stream = log_parser.parse_file(args.input_file)
+    new_collector = functools.partial(LogStatsCollector, approximate=args.approximate, top_k=args.top_k,
+                                      rollups=args.rollups or bool(args.rollup_out))
+    multi_stats = per_file_stats = None
+    if args.command == "query":
+        try:
+            since, until = parse_query_time(args.since), parse_query_time(args.until)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        index = build_index(input_file, log_parser)
+        stream = index.query(log_parser, ip=args.ip, status=args.status, method=args.method,
+                             since=since, until=until)
+        if record_filter:
+            stream = record_filter.apply(stream)
+    elif len(input_files) > 1:
+        if args.command == "analyze" and not args.out and not alert_engine:
+            # Only stats are needed: each file is analyzed on its own worker and the results merged
+            multi_stats = analyze_files(input_files, log_parser, new_collector, workers=args.file_workers,
+                                        record_filter=record_filter)
+            stream = iter(())
+        else:
+            # Alert windows need the files' records in time order
+            stream, per_file_stats = stream_files(input_files, log_parser,
+                                                  sort_by_time=args.merge_by_time or bool(alert_engine),
+                                                  record_filter=record_filter, typed=args.typed,
+                                                  stats_factory=new_collector if args.command == "analyze" else None)
+    else:
+        stream = log_parser.parse_file(input_file, workers=args.workers or None, use_mmap=args.mmap,
+                                       record_filter=record_filter, typed=args.typed)
     
-    # 3. Apply stats if analyzing
+    # 3. Apply stats if analyzing (several files are counted per file, see above)
     stats_collector = None
-    if args.command == "analyze":
-        stats_collector = LogStatsCollector()
+    if args.command == "analyze" and len(input_files) == 1:
+        stats_collector = new_collector(alerts=alert_engine)
         stream = stats_collector.process_stream(stream)
+    elif alert_engine:
+        stream = alert_engine.process_stream(stream)
         
     # 4. Handle output processing
     if args.out:
         out_format = args.out_format
         if not out_format:
-            if args.out.endswith(".csv"):
-                out_format = "csv"
-            elif args.out.endswith(".json"):
-                out_format = "json"
-            else:
+            out_format = OUT_FORMAT_EXTENSIONS.get(os.path.splitext(args.out)[1].lower())
+            if not out_format:
                 print("Error: Could not determine output format from extension. Please specify --out-format.")
                 sys.exit(1)
                 
         # Consume the stream by exporting
-        if out_format == "csv":
-            export_to_csv(stream, args.out)
-            print(f"Data successfully exported to {args.out}")
-        elif out_format == "json":
-            export_to_json(stream, args.out)
-            print(f"Data successfully exported to {args.out}")
+        export_func = EXPORTERS[out_format]
+        kwargs = {"field_types": log_parser.FIELD_TYPES} if out_format in ("parquet", "arrow") else {}
+        if args.threaded_export:
+            export_in_background(export_func, stream, args.out, **kwargs)
+        else:
+            export_func(stream, args.out, **kwargs)
+        print(f"Data successfully exported to {args.out}")
 
     else:
         # If no output file...
@@ -88,8 +252,26 @@ def main():
                 print(item)
                 
     # 5. Print stats if requested
+    if args.command == "analyze" and len(input_files) > 1:
+        multi_stats = multi_stats or MultiFileStats(per_file_stats, new_collector)
+        multi_stats.print_per_file()
+        stats_collector = multi_stats.total
     if stats_collector:
+        for agg_file in args.merge or []:
+            stats_collector.merge(LogStatsCollector.load(agg_file))
+        if args.save_agg:
+            stats_collector.save(args.save_agg)
+            print(f"Partial aggregate written to {args.save_agg}")
+        if args.rollup_out:
+            with open(args.rollup_out, 'w', encoding='utf-8') as f:
+                json.dump({name: rollup.rows() for name, rollup in stats_collector.rollups.items()}, f, indent=2)
+            print(f"Rollups written to {args.rollup_out}")
         stats_collector.print_report()
 
+    if alert_engine:
+        alert_engine.close()
+    if args.profile:
+        print(metrics.report(wall_seconds=time.perf_counter() - started), file=sys.stderr)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,432 @@
+"""
+Persistent pre-aggregated store for the Streamlit visualizer.
+
+A log is ingested once into a SQLite file, next to it (<log>.cubes.sqlite) or
+in a separate store directory. The file holds group-by cubes for every dimension (each parsed field, plus
+'time_hour' and 'time_minute' buckets in place of the raw timestamp):
+
+- dimension_values: rows per value of each dimension
+- measure_values: count, sum, min and max of each numeric measure (the
+  parser's int fields, e.g. status and size) per dimension value
+- pair_counts: rows per combination of values of two low-cardinality
+  dimensions, which also gives distinct counts ("Unique") and scatter data
+
+Charts are answered from these small tables with SQL instead of keeping the
+parsed lines in every browser session. The store records the log's inode,
+size and mtime, the parser it was built with and how many bytes it has
+ingested. When the log has only been appended to, for_file() adds the new
+complete lines to the cubes in one transaction; otherwise (or for a compressed
+log) it rebuilds the store. Builds write to a temporary file that is then
+renamed into place, so other sessions and processes never see a partial store.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.batches import TIMESTAMP_NULL, DictionaryColumn, RecordBatch, batches_from_records
+from src.parser import BaseLogParser, parser_key
+from src.readers import detect_compression
+
+STORE_FORMAT_VERSION = 2
+
+# A dimension with more distinct values than this (e.g. a free-text message) is not stored
+MAX_DIMENSION_VALUES = 200_000
+
+# Dimensions with at most this many distinct values get pair cubes with each other
+MAX_PAIR_DIMENSION_VALUES = 500
+
+# (name, bucket width in seconds, strftime format) of the time dimensions
+TIME_DIMENSIONS = (("time_hour", 3600, "%Y-%m-%d %H:00"), ("time_minute", 60, "%Y-%m-%d %H:%M"))
+
+AGGREGATIONS = ("count", "sum", "mean", "min", "max")
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE dimension_values (dim TEXT, value TEXT, count INTEGER, PRIMARY KEY (dim, value));
+CREATE TABLE measure_values (dim TEXT, value TEXT, measure TEXT, count INTEGER, total REAL,
+                             minimum REAL, maximum REAL, PRIMARY KEY (dim, value, measure));
+CREATE TABLE pair_counts (dim_x TEXT, x TEXT, dim_y TEXT, y TEXT, count INTEGER,
+                          PRIMARY KEY (dim_x, dim_y, x, y));
+"""
+
+# Rows are upserted, so the same statements write a new store and add to an existing one
+_UPSERT_DIMENSION = """INSERT INTO dimension_values VALUES (?, ?, ?)
+    ON CONFLICT (dim, value) DO UPDATE SET count = count + excluded.count"""
+_UPSERT_MEASURE = """INSERT INTO measure_values VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (dim, value, measure) DO UPDATE SET count = count + excluded.count, total = total + excluded.total,
+    minimum = MIN(minimum, excluded.minimum), maximum = MAX(maximum, excluded.maximum)"""
+_UPSERT_PAIR = """INSERT INTO pair_counts VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (dim_x, dim_y, x, y) DO UPDATE SET count = count + excluded.count"""
+
+
+def _measures(field_types: Dict[str, str]) -> List[str]:
+    # The numeric fields; their values are summed, averaged and ranged per dimension value
+    return [field for field, kind in field_types.items() if kind == 'int']
+
+
+def store_path_for(filepath: str, store_dir: Optional[str] = None) -> str:
+    """Where the store of a log lives: <log>.cubes.sqlite, or a file named after the log's path in store_dir."""
+    if store_dir is None:
+        return filepath + '.cubes.sqlite'
+    filepath = os.path.abspath(filepath)
+    digest = hashlib.sha1(filepath.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(store_dir, f"{os.path.basename(filepath)}.{digest}.cubes.sqlite")
+
+
+def _complete_end(filepath: str, start: int, size: int) -> int:
+    """The offset just past the last newline in [start, size), or start if there is none."""
+    with open(filepath, 'rb') as f:
+        end = size
+        while end > start:
+            block_start = max(start, end - 65536)
+            f.seek(block_start)
+            newline = f.read(end - block_start).rfind(b'\n')
+            if newline >= 0:
+                return block_start + newline + 1
+            end = block_start
+    return start
+
+
+class CubeBuilder:
+    """
+    Accumulates the cubes of a stream of RecordBatch objects in memory; write()
+    saves them. Each batch is aggregated with NumPy over its dictionary codes,
+    so the per-row cost is a few array passes rather than Python dict updates.
+    """
+
+    def __init__(self, measures: Iterable[str] = (), dropped: Iterable[str] = (), wide: Iterable[str] = ()):
+        self.measures = tuple(measures)
+        self.total_rows = 0
+        self.dimensions: List[str] = []  # In order of first appearance
+        self.counts: Dict[str, Counter] = {}
+        # dim -> measure -> value -> [count, sum, min, max]
+        self.measure_stats: Dict[str, Dict[str, Dict[str, List[float]]]] = {}
+        self.pairs: Dict[Tuple[str, str], Counter] = {}
+        # dropped/wide carry over from the store being added to
+        self.dropped = set(dropped)  # Past MAX_DIMENSION_VALUES
+        self.wide = set(wide)  # Past MAX_PAIR_DIMENSION_VALUES, so without pair cubes
+
+    @staticmethod
+    def _batch_dimensions(batch: RecordBatch) -> List[Tuple[str, Any, List[str]]]:
+        """(dim, codes, labels) for each dimension of a batch; a code of -1 means no value."""
+        import numpy as np
+
+        dims = []
+        for name, column in batch.columns.items():
+            kind = batch.field_types.get(name, 'string')
+            if isinstance(column, DictionaryColumn):
+                dims.append((name, np.frombuffer(column.codes, dtype=np.int32), column.values))
+            elif kind == 'timestamp':
+                epochs = np.frombuffer(column, dtype=np.int64)
+                valid = epochs != TIMESTAMP_NULL
+                for dim, width, fmt in TIME_DIMENSIONS:
+                    buckets, codes = np.unique(epochs - epochs % width, return_inverse=True)
+                    codes = np.where(valid, codes, -1)
+                    labels = [time.strftime(fmt, time.gmtime(int(bucket))) for bucket in buckets]
+                    dims.append((dim, codes, labels))
+            else:
+                values, codes = np.unique(np.frombuffer(column, dtype=np.int64), return_inverse=True)
+                dims.append((name, codes, [str(value) for value in values.tolist()]))
+        return dims
+
+    def add_batch(self, batch: RecordBatch):
+        import numpy as np
+
+        self.total_rows += batch.num_rows
+        measures = {name: np.frombuffer(batch.columns[name], dtype=np.int64).astype(np.float64)
+                    for name in self.measures if name in batch.columns}
+
+        narrow = []
+        for dim, codes, labels in self._batch_dimensions(batch):
+            if dim in self.dropped:
+                continue
+            if dim not in self.counts:
+                self.counts[dim] = Counter()
+                self.measure_stats[dim] = {measure: {} for measure in self.measures}
+                self.dimensions.append(dim)
+            present = codes >= 0
+            valid_codes = codes[present]
+            rows = np.bincount(valid_codes, minlength=len(labels))
+            used = np.flatnonzero(rows)
+            used_labels = [labels[code] for code in used.tolist()]
+            used_rows = rows[used].tolist()
+            counts = self.counts[dim]
+            for label, count in zip(used_labels, used_rows):
+                counts[label] += count
+
+            for measure, values in measures.items():
+                values = values[present]
+                sums = np.bincount(valid_codes, weights=values, minlength=len(labels))
+                minimums = np.full(len(labels), np.inf)
+                maximums = np.full(len(labels), -np.inf)
+                np.minimum.at(minimums, valid_codes, values)
+                np.maximum.at(maximums, valid_codes, values)
+                stats = self.measure_stats[dim][measure]
+                for label, count, total, minimum, maximum in zip(used_labels, used_rows, sums[used].tolist(),
+                                                                 minimums[used].tolist(), maximums[used].tolist()):
+                    entry = stats.get(label)
+                    if entry is None:
+                        stats[label] = [count, total, minimum, maximum]
+                    else:
+                        entry[0] += count
+                        entry[1] += total
+                        if minimum < entry[2]:
+                            entry[2] = minimum
+                        if maximum > entry[3]:
+                            entry[3] = maximum
+
+            self._check_cardinality(dim)
+            if dim not in self.wide:
+                narrow.append((dim, codes, labels))
+
+        for i, first in enumerate(narrow):
+            for second in narrow[i + 1:]:
+                if (second[0], first[0]) in self.pairs:
+                    # Keep the orientation of earlier batches (columns can appear in a new order)
+                    self._add_pair(second, first)
+                else:
+                    self._add_pair(first, second)
+
+    def _add_pair(self, x: Tuple[str, Any, List[str]], y: Tuple[str, Any, List[str]]):
+        import numpy as np
+
+        (dim_x, codes_x, labels_x), (dim_y, codes_y, labels_y) = x, y
+        present = (codes_x >= 0) & (codes_y >= 0)
+        width = len(labels_y)
+        combined = codes_x[present].astype(np.int64) * width + codes_y[present]
+        keys, key_counts = np.unique(combined, return_counts=True)
+        pair = self.pairs.setdefault((dim_x, dim_y), Counter())
+        for key, count in zip(keys.tolist(), key_counts.tolist()):
+            pair[(labels_x[key // width], labels_y[key % width])] += count
+
+    def _check_cardinality(self, dim: str):
+        distinct = len(self.counts[dim])
+        if distinct > MAX_PAIR_DIMENSION_VALUES and dim not in self.wide:
+            self.wide.add(dim)
+            for key in [key for key in self.pairs if dim in key]:
+                del self.pairs[key]
+        if distinct > MAX_DIMENSION_VALUES:
+            self.dropped.add(dim)
+            del self.counts[dim], self.measure_stats[dim]
+
+    def add_batches(self, batches: Iterable[RecordBatch]) -> "CubeBuilder":
+        for batch in batches:
+            self.add_batch(batch)
+        return self
+
+    def write(self, conn: sqlite3.Connection, meta: Dict[str, Any]):
+        conn.executescript(_SCHEMA)
+        dimensions = [dim for dim in self.dimensions if dim not in self.dropped]
+        meta = dict(meta, version=STORE_FORMAT_VERSION, total_rows=self.total_rows, dimensions=dimensions,
+                    measures=list(self.measures), dropped=sorted(self.dropped), wide=sorted(self.wide),
+                    pairs=[list(key) for key in self.pairs])
+        self._write_rows(conn, meta)
+        conn.commit()
+
+    def add_to(self, conn: sqlite3.Connection, meta: Dict[str, Any]):
+        """
+        Adds these cubes to a store built earlier, whose meta is given (the builder
+        must have been created with its dropped and wide dimensions). The caller commits.
+        """
+        pairs = {tuple(key) for key in meta["pairs"]}
+        for x, y in list(self.pairs):
+            if (y, x) in pairs:
+                # Keep the store's orientation
+                self.pairs[(y, x)] = Counter({(b, a): count for (a, b), count in self.pairs.pop((x, y)).items()})
+        self._write_rows(conn, {})
+
+        # The limits apply to the combined number of values
+        dropped, wide = set(meta["dropped"]) | self.dropped, set(meta["wide"]) | self.wide
+        for dim, distinct in conn.execute("SELECT dim, COUNT(*) FROM dimension_values GROUP BY dim").fetchall():
+            if distinct > MAX_PAIR_DIMENSION_VALUES:
+                wide.add(dim)
+            if distinct > MAX_DIMENSION_VALUES:
+                dropped.add(dim)
+        for dim in wide - set(meta["wide"]):
+            conn.execute("DELETE FROM pair_counts WHERE dim_x = ? OR dim_y = ?", (dim, dim))
+        for dim in dropped - set(meta["dropped"]):
+            conn.execute("DELETE FROM dimension_values WHERE dim = ?", (dim,))
+            conn.execute("DELETE FROM measure_values WHERE dim = ?", (dim,))
+
+        dimensions = meta["dimensions"] + [dim for dim in self.dimensions if dim not in meta["dimensions"]]
+        pairs |= set(self.pairs)
+        meta = dict(meta, total_rows=meta["total_rows"] + self.total_rows,
+                    dimensions=[dim for dim in dimensions if dim not in dropped],
+                    dropped=sorted(dropped), wide=sorted(wide),
+                    pairs=[list(key) for key in pairs if not wide.intersection(key)])
+        conn.execute("DELETE FROM meta")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(key, json.dumps(value)) for key, value in meta.items()])
+
+    def _write_rows(self, conn: sqlite3.Connection, meta: Dict[str, Any]):
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(key, json.dumps(value)) for key, value in meta.items()])
+        for dim in self.dimensions:
+            if dim in self.dropped:
+                continue
+            conn.executemany(_UPSERT_DIMENSION, [(dim, value, count) for value, count in self.counts[dim].items()])
+            for measure, stats in self.measure_stats[dim].items():
+                conn.executemany(_UPSERT_MEASURE, [(dim, value, measure, *entry) for value, entry in stats.items()])
+        for (dim_x, dim_y), counts in self.pairs.items():
+            conn.executemany(_UPSERT_PAIR, [(dim_x, x, dim_y, y, count) for (x, y), count in counts.items()])
+
+
+# One build at a time per store file within this process
+_build_locks: Dict[str, threading.Lock] = {}
+_build_locks_guard = threading.Lock()
+
+
+class CubeStore:
+    """Read access to a store written by CubeBuilder; safe to share between threads."""
+
+    def __init__(self, conn: sqlite3.Connection, path: str = ":memory:"):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = conn
+        self._lock = threading.Lock()
+        self.meta = {key: json.loads(value) for key, value in self._query("SELECT key, value FROM meta")}
+        self.total_rows: int = self.meta["total_rows"]
+        self.dimensions: List[str] = self.meta["dimensions"]
+        self.measures: List[str] = self.meta["measures"]
+        # Dimensions left out for having more than MAX_DIMENSION_VALUES values
+        self.dropped: List[str] = self.meta.get("dropped", [])
+        self._pairs = {tuple(key) for key in self.meta["pairs"]}
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], field_types: Dict[str, str]) -> "CubeStore":
+        """An in-memory store, e.g. for a sample of a file; field_types is the parser's FIELD_TYPES."""
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        CubeBuilder(_measures(field_types)).add_batches(
+            batches_from_records(iter(records), field_types=field_types)).write(conn, {})
+        return cls(conn)
+
+    @classmethod
+    def for_file(cls, filepath: str, log_parser: BaseLogParser, store_path: Optional[str] = None,
+                 store_dir: Optional[str] = None) -> "CubeStore":
+        """
+        Opens the store of a log file (see store_path_for()), first building it if
+        it is missing or out of date, or adding the new lines if the log has grown.
+        """
+        store_path = store_path or store_path_for(filepath, store_dir)
+        if store_dir is not None:
+            os.makedirs(store_dir, exist_ok=True)
+        with _build_locks_guard:
+            lock = _build_locks.setdefault(os.path.abspath(store_path), threading.Lock())
+        with lock:
+            st = os.stat(filepath)
+            source = {"inode": st.st_ino, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                      "parser": parser_key(log_parser)}
+            if os.path.exists(store_path):
+                store = cls(sqlite3.connect(store_path, check_same_thread=False), store_path)
+                if store.meta.get("version") == STORE_FORMAT_VERSION and store.meta.get("source") == source:
+                    return store
+                store.close()
+                if cls._add_new_lines(store_path, filepath, log_parser, source):
+                    return cls(sqlite3.connect(store_path, check_same_thread=False), store_path)
+
+            tmp_path = f"{store_path}.{os.getpid()}.tmp"
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            conn = sqlite3.connect(tmp_path)
+            # A crash leaves only the temporary file behind, so skip the journal and fsyncs
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            try:
+                if detect_compression(filepath):
+                    offset, batches = None, log_parser.parse_batches(filepath)
+                else:
+                    # Up to the last complete line, so that later appends can continue from there
+                    offset = _complete_end(filepath, 0, st.st_size)
+                    batches = log_parser.parse_batches(filepath) if offset == st.st_size else batches_from_records(
+                        log_parser.parse_range(filepath, 0, offset), field_types=log_parser.FIELD_TYPES)
+                CubeBuilder(_measures(log_parser.FIELD_TYPES)).add_batches(batches).write(
+                    conn, {"source": source, "offset": offset, "filepath": os.path.abspath(filepath)})
+            finally:
+                conn.close()
+            os.replace(tmp_path, store_path)
+            return cls(sqlite3.connect(store_path, check_same_thread=False), store_path)
+
+    @staticmethod
+    def _add_new_lines(store_path: str, filepath: str, log_parser: BaseLogParser, source: Dict[str, Any]) -> bool:
+        """
+        Adds the lines appended to the log since the store was last updated, in one
+        transaction. Returns False if the store has to be rebuilt instead (the log
+        was replaced, truncated or is compressed, or another parser built it).
+        """
+        conn = sqlite3.connect(store_path, isolation_level=None)
+        try:
+            # The write lock is taken before meta is read, so another process cannot add the same lines
+            conn.execute("BEGIN IMMEDIATE")
+            meta = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+            old, offset = meta.get("source") or {}, meta.get("offset")
+            if (meta.get("version") != STORE_FORMAT_VERSION or offset is None or old.get("inode") != source["inode"]
+                    or old.get("parser") != source["parser"] or source["size"] < old.get("size", 0)):
+                conn.execute("ROLLBACK")
+                return False
+            end = _complete_end(filepath, offset, source["size"])
+            builder = CubeBuilder(_measures(log_parser.FIELD_TYPES), meta["dropped"], meta["wide"])
+            builder.add_batches(batches_from_records(log_parser.parse_range(filepath, offset, end),
+                                                     field_types=log_parser.FIELD_TYPES))
+            builder.add_to(conn, dict(meta, source=source, offset=end))
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def close(self):
+        """Closes the connection; a closed store reopens its file if it is queried again."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            return self._conn.execute(sql, params).fetchall()
+
+    def cardinality(self, dim: str) -> int:
+        return self._query("SELECT COUNT(*) FROM dimension_values WHERE dim = ?", (dim,))[0][0]
+
+    def counts(self, dim: str, by_count: bool = True) -> List[Tuple[str, int]]:
+        """(value, rows) for each value of dim, most frequent first or by value."""
+        order = "count DESC, value" if by_count else "value"
+        return self._query(f"SELECT value, count FROM dimension_values WHERE dim = ? ORDER BY {order}", (dim,))
+
+    def aggregate(self, dim: str, measure: str, how: str) -> List[Tuple[str, float]]:
+        """(value, how(measure)) for each value of dim, where how is one of AGGREGATIONS."""
+        if measure not in self.measures:
+            raise KeyError(f"{measure!r} is not a numeric measure; available: {', '.join(self.measures)}")
+        column = {"count": "count", "sum": "total", "mean": "total / count",
+                  "min": "minimum", "max": "maximum"}[how]
+        return self._query(f"SELECT value, {column} FROM measure_values WHERE dim = ? AND measure = ? ORDER BY value",
+                           (dim, measure))
+
+    def has_pairs(self, dim_x: str, dim_y: str) -> bool:
+        return dim_x == dim_y or (dim_x, dim_y) in self._pairs or (dim_y, dim_x) in self._pairs
+
+    def pairs(self, dim_x: str, dim_y: str) -> List[Tuple[str, str, int]]:
+        """(x, y, rows) for each combination of values; KeyError unless has_pairs()."""
+        if dim_x == dim_y:
+            return [(value, value, count) for value, count in self.counts(dim_x, by_count=False)]
+        if (dim_x, dim_y) in self._pairs:
+            sql = "SELECT x, y, count FROM pair_counts WHERE dim_x = ? AND dim_y = ? ORDER BY x, y"
+            return self._query(sql, (dim_x, dim_y))
+        if (dim_y, dim_x) in self._pairs:
+            sql = "SELECT y, x, count FROM pair_counts WHERE dim_x = ? AND dim_y = ? ORDER BY y, x"
+            return self._query(sql, (dim_y, dim_x))
+        raise KeyError(f"No pair cube for {dim_x!r} x {dim_y!r}; pairs are kept for dimensions "
+                       f"with at most {MAX_PAIR_DIMENSION_VALUES} values")
+
+    def unique(self, dim: str, other: str) -> List[Tuple[str, int]]:
+        """(value, number of distinct values of other) for each value of dim."""
+        distinct = Counter()
+        for x, _, _ in self.pairs(dim, other):
+            distinct[x] += 1
+        return sorted(distinct.items())
@@ -1,9 +1,47 @@
 import csv
+import functools
 import json
-from typing import Iterator, Dict, Any
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Iterator, Dict, Any, Callable, List, Optional
+from src.batches import DEFAULT_BATCH_SIZE, TIMESTAMP_NULL, DictionaryColumn, RecordBatch, batches_from_records
+from src.metrics import metrics
+from src.records import LogRecord, cached_json_default
 
+try:
+    import pyarrow
+except ImportError:  # Optional dependency, only needed for Parquet/Arrow output
+    pyarrow = None
+
+def _instrumented(format_name: str):
+    """
+    Records an exporter's own time as the 'export.<format>' stage when metrics are
+    enabled (time spent waiting for upstream records is not counted), plus the
+    records and bytes written. A no-op wrapper when they are disabled.
+    """
+    def decorate(export_func):
+        @functools.wraps(export_func)
+        def wrapper(data, filepath, *args, **kwargs):
+            if not metrics.enabled:
+                return export_func(data, filepath, *args, **kwargs)
+            result, records = metrics.time_consumer(f"export.{format_name}", export_func, data,
+                                                    filepath, *args, **kwargs)
+            metrics.inc("records_exported", records, format=format_name)
+            if os.path.exists(filepath):
+                metrics.inc("bytes_written", os.path.getsize(filepath), format=format_name)
+            return result
+        return wrapper
+    return decorate
+
+@_instrumented("csv")
 def export_to_csv(data: Iterator[Dict[str, Any]], filepath: str):
-    """Exports a stream of parsed log dictionaries to a CSV file."""
+    """
+    Exports a stream of parsed log dictionaries to a CSV file.
+    Columns come from the first record; if later records bring new keys, the
+    columns are appended and the file is rewritten once at the end with the full header.
+    """
     # We need to figure out fieldnames from the first item
     try:
         first_item = next(data)
@@ -11,23 +49,229 @@ def export_to_csv(data: Iterator[Dict[str, Any]], filepath: str):
         return # No data to write
 
     fieldnames = list(first_item.keys())
-    
+    known = set(fieldnames)
+    header_size = len(fieldnames)
+    # Typed records of the first record's layout are written as plain value tuples,
+    # skipping DictWriter's per-key lookups (their columns are the header's first ones).
+    # Neighbouring records share their time object, so its text is only built once.
+    record_class = time_index = last_time = last_text = None
+    if isinstance(first_item, LogRecord):
+        record_class = type(first_item)
+        time_index = next((i for i, value in enumerate(first_item.to_tuple()) if isinstance(value, datetime)), None)
+
     with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        write_values = writer.writer.writerow
         writer.writeheader()
         writer.writerow(first_item)
         for item in data:
+            if type(item) is record_class:
+                values = item.to_tuple()
+                if time_index is not None:
+                    stamp = values[time_index]
+                    if stamp is not last_time:
+                        last_time, last_text = stamp, ('' if stamp is None else str(stamp))
+                    values = values[:time_index] + (last_text,) + values[time_index + 1:]
+                write_values(values)
+                continue
+            if not known.issuperset(item):
+                # DictWriter reads the (shared) fieldnames list on every row
+                for key in item:
+                    if key not in known:
+                        known.add(key)
+                        fieldnames.append(key)
             writer.writerow(item)
 
+    if len(fieldnames) > header_size:
+        _rewrite_csv_header(filepath, fieldnames)
+
+def _rewrite_csv_header(filepath: str, fieldnames: List[str]):
+    """Replaces the header of a CSV file and pads rows written before the last columns appeared."""
+    tmp_path = filepath + '.tmp'
+    with open(filepath, 'r', newline='', encoding='utf-8') as src, \
+            open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        next(reader)
+        writer.writerow(fieldnames)
+        width = len(fieldnames)
+        for row in reader:
+            if len(row) < width:
+                row.extend([''] * (width - len(row)))
+            writer.writerow(row)
+    os.replace(tmp_path, filepath)
+
+@_instrumented("json")
 def export_to_json(data: Iterator[Dict[str, Any]], filepath: str):
-    """Exports a stream of parsed log dictionaries to a JSON file."""
+    """Exports a stream of parsed log dictionaries (or typed records) to a JSON file."""
     # To avoid loading everything into memory, we write a JSON array manually
     with open(filepath, 'w', encoding='utf-8') as jsonfile:
         jsonfile.write("[\n")
+        # encode() runs in C in one shot; json.dump() would stream through the Python encoder
+        dumps = json.JSONEncoder(default=cached_json_default()).encode
         first = True
         for item in data:
             if not first:
                 jsonfile.write(",\n")
-            json.dump(item, jsonfile)
+            if type(item) is not dict and isinstance(item, LogRecord):
+                item = item.to_dict()
+            jsonfile.write(dumps(item))
             first = False
         jsonfile.write("\n]\n")
+
+@_instrumented("ndjson")
+def export_to_ndjson(data: Iterator[Dict[str, Any]], filepath: str):
+    """Exports a stream of parsed log dictionaries as newline-delimited JSON (one object per line)."""
+    dumps = json.JSONEncoder(default=cached_json_default()).encode
+    with open(filepath, 'w', encoding='utf-8') as f:
+        for item in data:
+            if type(item) is not dict and isinstance(item, LogRecord):
+                item = item.to_dict()  # A dict is encoded in C; a record would go through default=
+            f.write(dumps(item))
+            f.write("\n")
+
+# --- Columnar output (requires pyarrow) ---
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("Parquet and Arrow output require the 'pyarrow' package")
+
+def _arrow_type(kind: str):
+    if kind == 'int':
+        return pyarrow.int64()
+    if kind == 'timestamp':
+        return pyarrow.timestamp('s', tz='UTC')
+    return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+
+def _arrow_text(value: Any) -> str:
+    """The text of a non-string value in a string column, as JSON would write it (true, 1.5, {...})."""
+    return json.dumps(value, default=str)
+
+def _arrow_column(batch: RecordBatch, name: str, kind: str):
+    """Wraps one column of a RecordBatch as an Arrow array, reusing its buffer where possible."""
+    import pyarrow.compute as pc
+
+    column = batch.columns[name]
+    if isinstance(column, DictionaryColumn):
+        indices = pyarrow.Array.from_buffers(pyarrow.int32(), len(column), [None, pyarrow.py_buffer(column.codes)])
+        if -1 in column.codes:
+            indices = pc.if_else(pc.less(indices, 0), None, indices)
+        values = [value if type(value) is str else _arrow_text(value) for value in column.values]
+        return pyarrow.DictionaryArray.from_arrays(indices, pyarrow.array(values, pyarrow.string()))
+    values = pyarrow.Array.from_buffers(pyarrow.int64(), len(column), [None, pyarrow.py_buffer(column)])
+    if kind == 'timestamp':
+        values = pc.if_else(pc.equal(values, TIMESTAMP_NULL), None, values)
+    return values.cast(_arrow_type(kind))
+
+def _iter_arrow_batches(data: Iterator[Dict[str, Any]], batch_size: int, field_types: Optional[Dict[str, str]]):
+    """Yields (schema, pyarrow.RecordBatch); the schema is fixed by the first batch."""
+    field_types = field_types or {}
+    schema = None
+    for batch in batches_from_records(data, batch_size, field_types):
+        if schema is None:
+            schema = pyarrow.schema([(name, _arrow_type(field_types.get(name, 'string'))) for name in batch.columns])
+        unknown = [name for name in batch.columns if schema.get_field_index(name) < 0]
+        if unknown:
+            raise ValueError(f"Fields {unknown} first appeared after the first row group; "
+                             "Parquet/Arrow files have a fixed schema")
+        arrays = []
+        for field in schema:
+            if field.name in batch.columns:
+                arrays.append(_arrow_column(batch, field.name, field_types.get(field.name, 'string')))
+            else:
+                arrays.append(pyarrow.nulls(batch.num_rows, field.type))
+        yield schema, pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+@_instrumented("parquet")
+def export_to_parquet(data: Iterator[Dict[str, Any]], filepath: str, field_types: Optional[Dict[str, str]] = None,
+                      batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Exports a stream of parsed log dictionaries to Parquet, one row group per batch_size rows.
+    Typed columns follow field_types (e.g. a parser's FIELD_TYPES); other fields are dictionary-encoded strings.
+    """
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for schema, record_batch in _iter_arrow_batches(data, batch_size, field_types):
+            if writer is None:
+                writer = pq.ParquetWriter(filepath, schema)
+            writer.write_batch(record_batch, row_group_size=batch_size)
+    finally:
+        if writer is not None:
+            writer.close()
+
+@_instrumented("arrow")
+def export_to_arrow(data: Iterator[Dict[str, Any]], filepath: str, field_types: Optional[Dict[str, str]] = None,
+                    batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Exports a stream of parsed log dictionaries in the Arrow IPC streaming format
+    (read it with pyarrow.ipc.open_stream), one record batch per batch_size rows.
+    The streaming format is used because the IPC file format cannot hold a new
+    dictionary per batch, which dictionary-encoded string columns need.
+    """
+    _require_pyarrow()
+
+    writer = None
+    try:
+        for schema, record_batch in _iter_arrow_batches(data, batch_size, field_types):
+            if writer is None:
+                writer = pyarrow.ipc.new_stream(filepath, schema)
+            writer.write_batch(record_batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+# --- Background writer ---
+
+_DONE = object()
+
+def export_in_background(export_func: Callable[..., None], data: Iterator[Dict[str, Any]], filepath: str,
+                         chunk_size: int = 1024, max_chunks: int = 64, **kwargs):
+    """
+    Runs export_func on a writer thread while the calling thread keeps producing
+    records, so parsing and file I/O (and pyarrow encoding, which releases the GIL)
+    overlap. Records are handed over in chunks through a bounded queue, so at most
+    chunk_size * max_chunks records are buffered. Errors from the writer are re-raised here.
+    """
+    chunks = queue.Queue(maxsize=max_chunks)
+    errors = []
+    finished = threading.Event()
+
+    def consume() -> Iterator[Dict[str, Any]]:
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE:
+                finished.set()
+                return
+            yield from chunk
+
+    def run():
+        try:
+            export_func(consume(), filepath, **kwargs)
+        except BaseException as e:
+            errors.append(e)
+        # Drain whatever is left so the producer never blocks on a dead writer
+        while not finished.is_set():
+            if chunks.get() is _DONE:
+                finished.set()
+
+    writer = threading.Thread(target=run, name="log-export-writer", daemon=True)
+    writer.start()
+    try:
+        chunk = []
+        for item in data:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                chunks.put(chunk)
+                chunk = []
+                if errors:
+                    break
+        if chunk and not errors:
+            chunks.put(chunk)
+    finally:
+        chunks.put(_DONE)
+        writer.join()
+    if errors:
+        raise errors[0]
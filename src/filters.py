@@ -0,0 +1,206 @@
+"""
+Filter expressions for --where.
+
+An expression such as  status >= 500 and method == 'POST'  is parsed with Python's
+ast module (only comparisons, and/or/not, field names and literals are accepted;
+nothing is ever eval'd) and compiled into:
+
+- matches(record): the exact predicate on a parsed record. Ordering comparisons
+  against numbers convert the field to a number first; fields that are missing or
+  not numeric never match. Equality (==, !=, in) against integers compares the
+  field's text with the integer's canonical form, so status == 200 matches '200'
+  but not '+200' or '2e2'. A string literal on the left of in/not in is a
+  substring test on the field: 'bot' in user_agent.
+- line_may_match(line): a cheap check on the raw line that runs before the parser.
+  Equality against a string or integer literal (and a substring test) requires
+  that literal to appear somewhere in the line, so most non-matching lines are
+  rejected without running the regex. It never rejects a line that could match.
+"""
+import ast
+import operator
+from typing import Any, Callable, Dict, Iterator, Optional
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda value, options: value in options,
+    ast.NotIn: lambda value, options: value not in options,
+}
+
+# literal < field  is the same as  field > literal
+_MIRRORED = {ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE, ast.Eq: ast.Eq, ast.NotEq: ast.NotEq}
+
+_EQUALITY = (ast.Eq, ast.NotEq, ast.In, ast.NotIn)
+
+
+class FilterSyntaxError(ValueError):
+    """Raised for expressions outside the supported filter language."""
+
+
+def _literal(node: ast.AST) -> Any:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float)):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _literal(node.operand)
+        if not _is_number(value):
+            raise FilterSyntaxError(f"Only numbers can be negated, got: {ast.unparse(node)}")
+        return -value
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return tuple(_literal(element) for element in node.elts)
+    raise FilterSyntaxError(f"Expected a literal, got: {ast.unparse(node)}")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _compile_comparison(field: str, op: ast.cmpop, literal: Any) -> Predicate:
+    compare = _COMPARISONS.get(type(op))
+    if compare is None:
+        raise FilterSyntaxError(f"Unsupported operator: {type(op).__name__}")
+
+    options = literal if isinstance(literal, tuple) else (literal,)
+    numeric = all(_is_number(option) for option in options)
+    if numeric and type(op) in _EQUALITY and all(isinstance(option, int) for option in options):
+        # Text equality with the canonical form, which is what the line check looks for
+        numeric = False
+    if not numeric:
+        literal = tuple(str(o) for o in literal) if isinstance(literal, tuple) else str(literal)
+
+    def predicate(record: Dict[str, Any]) -> bool:
+        value = record.get(field)
+        if value is None:
+            return False
+        if numeric:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return False
+        else:
+            value = str(value)
+        return compare(value, literal)
+
+    return predicate
+
+
+def _compile_contains(field: str, op: ast.cmpop, literal: Any) -> Predicate:
+    """'text' in field: a substring test on the field's value."""
+    if not isinstance(literal, (str, int)) or isinstance(literal, bool):
+        raise FilterSyntaxError(f"Expected a string before 'in', got: {literal!r}")
+    text, negate = str(literal), isinstance(op, ast.NotIn)
+
+    def predicate(record: Dict[str, Any]) -> bool:
+        value = record.get(field)
+        if value is None:
+            return False
+        return (text in str(value)) != negate
+
+    return predicate
+
+
+def _line_literals(op: ast.cmpop, literal: Any) -> Optional[tuple]:
+    """Strings of which at least one must appear in the raw line for the comparison to hold."""
+    if isinstance(op, ast.Eq):
+        options = (literal,)
+    elif isinstance(op, ast.In) and isinstance(literal, tuple):
+        options = literal
+    else:
+        return None
+    if not all(isinstance(o, str) or (isinstance(o, int) and not isinstance(o, bool)) for o in options):
+        return None
+    if any(o == '' for o in options):
+        return None
+    return tuple(str(o) for o in options)
+
+
+def _compile(node: ast.AST):
+    """Returns (predicate, line_check or None) for an expression node."""
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(value) for value in node.values]
+        predicates = [p for p, _ in parts]
+        checks = [c for _, c in parts]
+        if isinstance(node.op, ast.And):
+            known = [c for c in checks if c is not None]
+            check = (lambda line: all(c(line) for c in known)) if known else None
+            return (lambda record: all(p(record) for p in predicates)), check
+        # For 'or', the line check is only usable if every branch has one
+        check = (lambda line: any(c(line) for c in checks)) if all(checks) else None
+        return (lambda record: any(p(record) for p in predicates)), check
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner, _ = _compile(node.operand)
+        return (lambda record: not inner(record)), None
+
+    if isinstance(node, ast.Compare):
+        # Chains like 200 <= status < 300 become an 'and' of pairwise comparisons
+        terms = [node.left] + node.comparators
+        parts = []
+        for left, op, right in zip(terms, node.ops, terms[1:]):
+            if isinstance(left, ast.Name):
+                if isinstance(op, (ast.In, ast.NotIn)) and not isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+                    # field in 'text' would be a substring test of the literal, so status in 5000 matched 500
+                    raise FilterSyntaxError(f"Expected a list or tuple after 'in': {ast.unparse(node)}")
+                field, literal = left.id, _literal(right)
+            elif isinstance(right, ast.Name) and isinstance(op, (ast.In, ast.NotIn)):
+                field, literal = right.id, _literal(left)
+                predicate = _compile_contains(field, op, literal)
+                literals = (str(literal),) if isinstance(op, ast.In) and literal != '' else None
+                check = (lambda line, options=literals: any(o in line for o in options)) if literals else None
+                parts.append((predicate, check))
+                continue
+            elif isinstance(right, ast.Name) and type(op) in _MIRRORED:
+                field, literal = right.id, _literal(left)
+                op = _MIRRORED[type(op)]()
+            else:
+                raise FilterSyntaxError(f"Comparison needs a field name: {ast.unparse(node)}")
+            predicate = _compile_comparison(field, op, literal)
+            literals = _line_literals(op, literal)
+            check = (lambda line, options=literals: any(o in line for o in options)) if literals else None
+            parts.append((predicate, check))
+        if len(parts) == 1:
+            return parts[0]
+        predicates = [p for p, _ in parts]
+        known = [c for _, c in parts if c is not None]
+        check = (lambda line: all(c(line) for c in known)) if known else None
+        return (lambda record: all(p(record) for p in predicates)), check
+
+    raise FilterSyntaxError(f"Unsupported expression: {ast.unparse(node)}")
+
+
+class RecordFilter:
+    """A compiled --where expression (picklable, so it can be sent to parser worker processes)."""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        try:
+            tree = ast.parse(expression, mode='eval')
+        except SyntaxError as e:
+            raise FilterSyntaxError(f"Invalid filter expression: {expression!r}") from e
+        self.matches, self._line_check = _compile(tree.body)
+
+    def line_may_match(self, line: str) -> bool:
+        """Cheap pre-parse check: False only if the line cannot possibly match."""
+        return self._line_check is None or self._line_check(line)
+
+    @property
+    def has_line_check(self) -> bool:
+        return self._line_check is not None
+
+    def apply(self, records: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Filters an already parsed stream."""
+        matches = self.matches
+        for record in records:
+            if matches(record):
+                yield record
+
+    def __getstate__(self):
+        return {"expression": self.expression}
+
+    def __setstate__(self, state):
+        self.__init__(state["expression"])
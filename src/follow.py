@@ -0,0 +1,194 @@
+import io
+import json
+import os
+import time
+from typing import Iterator, Dict, Any, Optional
+from src.filters import RecordFilter
+from src.parser import BaseLogParser
+from src.stats import LogStatsCollector
+
+
+class LogFollower:
+    """
+    Tails a growing log file like `tail -F`, updating a LogStatsCollector incrementally.
+
+    Progress (inode, byte offset and serialized stats) can be saved to a checkpoint
+    file, so a restarted follower only reads bytes written since the last checkpoint.
+    Logrotate-style renames are detected by an inode change and truncation by the
+    file shrinking below the current offset.
+    """
+
+    READ_BLOCK_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, filepath: str, log_parser: BaseLogParser,
+                 stats_collector: Optional[LogStatsCollector] = None,
+                 checkpoint_path: Optional[str] = None, poll_interval: float = 1.0,
+                 record_filter: Optional[RecordFilter] = None):
+        self.filepath = filepath
+        self.log_parser = log_parser
+        self.record_filter = record_filter
+        self.stats_collector = stats_collector or LogStatsCollector()
+        self.checkpoint_path = checkpoint_path
+        self.poll_interval = poll_interval
+
+        self.inode: Optional[int] = None
+        self.offset = 0
+        self._file = None
+        # Live file to switch to once a rotated file found at startup is drained
+        self._pending_reopen = None
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.load_checkpoint()
+
+    def load_checkpoint(self):
+        """Restores inode, offset and stats from the checkpoint file."""
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        self.inode = checkpoint["inode"]
+        self.offset = checkpoint["offset"]
+        alerts = self.stats_collector.alerts
+        self.stats_collector = LogStatsCollector.from_dict(checkpoint["stats"])
+        self.stats_collector.alerts = alerts
+
+    def save_checkpoint(self):
+        """Atomically writes the current position and stats to the checkpoint file."""
+        if not self.checkpoint_path:
+            return
+        checkpoint = {
+            "path": os.path.abspath(self.filepath),
+            "inode": self.inode,
+            "offset": self.offset,
+            "stats": self.stats_collector.to_dict(),
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _find_rotated(self) -> Optional[str]:
+        """Looks for the file we were reading among its siblings (e.g. access.log.1) by inode."""
+        directory = os.path.dirname(os.path.abspath(self.filepath))
+        prefix = os.path.basename(self.filepath)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith(prefix) and path != os.path.abspath(self.filepath):
+                try:
+                    if os.stat(path).st_ino == self.inode:
+                        return path
+                except OSError:
+                    continue
+        return None
+
+    def _open(self):
+        """Opens the log, resuming from a checkpointed offset when it is still the same file."""
+        try:
+            self._file = open(self.filepath, 'rb')
+        except FileNotFoundError:
+            self._file = None
+            return
+
+        st = os.fstat(self._file.fileno())
+        if st.st_ino != self.inode:
+            # Rotated while we were not running: finish the old file first if it is still around
+            rotated = self._find_rotated() if self.inode is not None else None
+            if rotated:
+                old_file = self._file
+                self._file = open(rotated, 'rb')
+                self._pending_reopen = old_file
+                return
+            self.inode = st.st_ino
+            self.offset = 0
+        elif st.st_size < self.offset:
+            self.offset = 0
+
+    def _read_complete_lines(self, final: bool = False) -> Iterator[Dict[str, Any]]:
+        """Reads and parses every complete line after the current offset, in blocks."""
+        self._file.seek(self.offset)
+        while True:
+            data = self._file.read(self.READ_BLOCK_SIZE)
+            if not data:
+                return
+            if len(data) == self.READ_BLOCK_SIZE:
+                # Extend the block to the end of the line it stops in
+                data += self._file.readline()
+
+            if final or data.endswith(b'\n'):
+                end = len(data)
+            else:
+                # Leave a partially written last line for the next poll
+                end = data.rfind(b'\n') + 1
+
+            # The offset advances line by line, so a checkpoint saved while the
+            # block is being consumed covers exactly the records counted so far
+            for raw in io.BytesIO(data[:end]):
+                self.offset += len(raw)
+                parsed = self.log_parser.parse_line(raw.decode('utf-8', errors='replace').strip())
+                if parsed:
+                    yield parsed
+            if end < len(data):
+                return
+
+    def _poll_raw(self) -> Iterator[Dict[str, Any]]:
+        if self._file is None:
+            self._open()
+            if self._file is None:
+                return
+
+        yield from self._read_complete_lines()
+
+        if self._pending_reopen is not None:
+            # Done draining a rotated file found at startup; switch to the live one
+            yield from self._read_complete_lines(final=True)
+            self._file.close()
+            self._file = self._pending_reopen
+            self._pending_reopen = None
+            self.inode = os.fstat(self._file.fileno()).st_ino
+            self.offset = 0
+            yield from self._read_complete_lines()
+            return
+
+        try:
+            st = os.stat(self.filepath)
+        except FileNotFoundError:
+            # Rotated away and not recreated yet; keep the old handle for now
+            return
+
+        if st.st_ino != self.inode:
+            # Renamed by logrotate: drain the old file, then start on the new one
+            yield from self._read_complete_lines(final=True)
+            self._file.close()
+            self._file = None
+            self.inode = None
+            self._open()
+            if self._file is not None:
+                yield from self._read_complete_lines()
+        elif st.st_size < self.offset:
+            # Truncated in place (copytruncate)
+            self.offset = 0
+            yield from self._read_complete_lines()
+
+    def poll(self) -> Iterator[Dict[str, Any]]:
+        """Yields the records appended since the last call, updating the stats as it goes."""
+        records = self._poll_raw()
+        if self.record_filter is not None:
+            records = self.record_filter.apply(records)
+        return self.stats_collector.process_stream(records)
+
+    def follow(self, max_polls: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields new records as they are written, checkpointing after every poll.
+        Runs forever unless max_polls is given.
+        """
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            yield from self.poll()
+            self.save_checkpoint()
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                time.sleep(self.poll_interval)
+
+    def close(self):
+        for handle in (self._file, self._pending_reopen):
+            if handle is not None:
+                handle.close()
+        self._file = self._pending_reopen = None
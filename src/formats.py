@@ -0,0 +1,139 @@
+"""
+Parser registry and log format auto-detection.
+
+Parsers are registered under a format name (the values accepted by --format).
+detect_format() reads the first few KB of a file (decompressed if needed) and
+picks the registered format that parses the largest share of the sampled lines.
+parser_for_file() caches that decision per file, and parsers are shared
+instances, so a web request pays neither the detection nor a regex compile.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from src.parser import (ApacheVhostCombinedParser, BaseLogParser, FastNginxLogParser, JsonLinesParser,
+                        RegexLogParser, SyslogParser)
+from src.readers import open_binary
+
+# Bytes sampled from the start of a file by detect_format()
+DETECT_SAMPLE_BYTES = 4096
+
+# Share of sampled lines the best format must parse to be accepted
+DETECT_MIN_MATCH = 0.5
+
+# Used for files with nothing to sample (empty files)
+DEFAULT_FORMAT = "nginx"
+
+# Files whose detected parser is remembered by parser_for_file()
+MAX_CACHED_FILES = 1024
+
+
+class FormatDetectionError(ValueError):
+    """Raised when no registered format parses enough of a file's first lines."""
+
+
+# name -> (factory, whether detect_format() considers it); in registration order,
+# which also breaks ties between formats that parse the same share of a sample
+_REGISTRY: "OrderedDict[str, Tuple[Callable[[], BaseLogParser], bool]]" = OrderedDict()
+
+# Parsers are stateless, so one instance per format is shared
+_instances: Dict[str, BaseLogParser] = {}
+_lock = threading.Lock()
+
+
+def register_parser(name: str, factory: Callable[[], BaseLogParser], detectable: bool = True):
+    """Makes a parser available as --format name (and to detect_format unless detectable=False)."""
+    with _lock:
+        _REGISTRY[name] = (factory, detectable)
+        _instances.pop(name, None)
+        _detected.clear()
+
+
+def available_formats() -> List[str]:
+    return list(_REGISTRY)
+
+
+def get_parser(name: str, pattern: Optional[str] = None) -> BaseLogParser:
+    """
+    Returns the shared parser for a registered format. 'regex' builds a
+    RegexLogParser from pattern (compiled once per pattern string, see compile_pattern).
+    Raises KeyError for an unknown format and PatternError for a bad pattern.
+    """
+    if name == "regex":
+        if not pattern:
+            raise ValueError("A pattern is required for the 'regex' format")
+        return RegexLogParser(pattern)
+    with _lock:
+        log_parser = _instances.get(name)
+        if log_parser is None:
+            if name not in _REGISTRY:
+                raise KeyError(f"Unknown log format {name!r}; available: {', '.join(_REGISTRY)}")
+            log_parser = _instances[name] = _REGISTRY[name][0]()
+        return log_parser
+
+
+def _sample_lines(filepath: str, sample_bytes: int) -> List[str]:
+    with open_binary(filepath) as f:
+        sample = f.read(sample_bytes)
+    lines = sample.split(b'\n')
+    if len(lines) > 1 and len(sample) >= sample_bytes:
+        lines.pop()  # Cut off mid-line by the sample size
+    return [line.decode('utf-8', errors='replace').strip() for line in lines if line.strip()]
+
+
+def detect_format(filepath: str, sample_bytes: int = DETECT_SAMPLE_BYTES) -> str:
+    """Name of the registered format that parses most of the first sample_bytes of a file."""
+    lines = _sample_lines(filepath, sample_bytes)
+    if not lines:
+        return DEFAULT_FORMAT
+
+    best_name, best_matched = None, 0
+    for name, (_, detectable) in list(_REGISTRY.items()):
+        if not detectable:
+            continue
+        parse_line = get_parser(name).parse_line
+        matched = sum(1 for line in lines if parse_line(line))
+        if matched > best_matched:
+            best_name, best_matched = name, matched
+    if best_name is None or best_matched < len(lines) * DETECT_MIN_MATCH:
+        raise FormatDetectionError(f"Could not detect the log format of {filepath}; "
+                                   f"use --format with one of: {', '.join(_REGISTRY)}, regex")
+    return best_name
+
+
+# abspath -> (inode, size when detected, format name), in LRU order
+_detected: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+
+
+def parser_for_file(filepath: str) -> BaseLogParser:
+    """
+    The shared parser for a file's detected format. Detection only reads the start
+    of a file, so it is redone only if the file was replaced (new inode), truncated,
+    or was shorter than the sample last time; a growing log is detected once.
+    """
+    filepath = os.path.abspath(filepath)
+    st = os.stat(filepath)
+    name = None
+    with _lock:
+        cached = _detected.get(filepath)
+        if cached is not None:
+            inode, size, cached_name = cached
+            if inode == st.st_ino and st.st_size >= size and (size >= DETECT_SAMPLE_BYTES or st.st_size == size):
+                _detected.move_to_end(filepath)
+                name = cached_name
+    if name is not None:
+        return get_parser(name)
+
+    name = detect_format(filepath)
+    with _lock:
+        _detected[filepath] = (st.st_ino, st.st_size, name)
+        _detected.move_to_end(filepath)
+        while len(_detected) > MAX_CACHED_FILES:
+            _detected.popitem(last=False)
+    return get_parser(name)
+
+
+register_parser("nginx", FastNginxLogParser)
+register_parser("apache_vhost", ApacheVhostCombinedParser)
+register_parser("jsonl", JsonLinesParser)
+register_parser("syslog", SyslogParser)
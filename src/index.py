@@ -0,0 +1,257 @@
+"""
+Sidecar index for fast range queries over large (plain-text) log files.
+
+The log is cut into blocks of roughly block_bytes. For every block the index
+stores its byte range, the min/max timestamp seen in it (sparse time -> offset
+checkpoints), the set of status codes and methods, and a bloom filter of client
+IPs. A query only seeks to and parses the blocks that can contain matches.
+
+The index lives next to the log as <log>.idx and is extended incrementally when
+the log is appended to. It records which parser built it and is rebuilt when a
+different one is used. Times are read with parse_timestamp (Nginx or ISO 8601);
+blocks whose times cannot be read are never pruned by a time range.
+"""
+import base64
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+from src.parser import BaseLogParser, parser_key
+from src.readers import detect_compression
+from src.timeutils import parse_timestamp
+
+INDEX_FORMAT_VERSION = 2
+DEFAULT_BLOCK_BYTES = 1024 * 1024
+
+
+class BloomFilter:
+    """Fixed-size bloom filter using double hashing over a blake2b digest."""
+
+    def __init__(self, num_bits: int = 16384, num_hashes: int = 4, bits: Optional[bytearray] = None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray(num_bits // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def to_str(self) -> str:
+        return base64.b64encode(bytes(self.bits)).decode('ascii')
+
+    @classmethod
+    def from_str(cls, data: str, num_hashes: int = 4) -> "BloomFilter":
+        bits = bytearray(base64.b64decode(data))
+        return cls(len(bits) * 8, num_hashes, bits)
+
+
+class IndexBlock:
+    """Summary of one byte range of the log."""
+
+    def __init__(self, start: int):
+        self.start = start
+        self.end = start
+        self.lines = 0
+        self.min_time: Optional[int] = None
+        self.max_time: Optional[int] = None
+        self.statuses = set()
+        self.methods = set()
+        self.ips = BloomFilter()
+
+    def add(self, record: Dict[str, Any]):
+        self.lines += 1
+        epoch = parse_timestamp(record.get('time'))
+        if epoch is not None:
+            self.min_time = epoch if self.min_time is None else min(self.min_time, epoch)
+            self.max_time = epoch if self.max_time is None else max(self.max_time, epoch)
+        if record.get('status') is not None:
+            self.statuses.add(str(record['status']))
+        if record.get('method') is not None:
+            self.methods.add(record['method'])
+        if record.get('ip') is not None:
+            self.ips.add(record['ip'])
+
+    def may_match(self, ip: Optional[str] = None, status: Optional[str] = None, method: Optional[str] = None,
+                  since: Optional[int] = None, until: Optional[int] = None) -> bool:
+        if ip is not None and ip not in self.ips:
+            return False
+        if status is not None and not any(status_matches(s, status) for s in self.statuses):
+            return False
+        if method is not None and method not in self.methods:
+            return False
+        if since is not None and self.max_time is not None and self.max_time < since:
+            return False
+        if until is not None and self.min_time is not None and self.min_time > until:
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "start": self.start, "end": self.end, "lines": self.lines,
+            "min_time": self.min_time, "max_time": self.max_time,
+            "statuses": sorted(self.statuses), "methods": sorted(self.methods),
+            "ips": self.ips.to_str(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndexBlock":
+        block = cls(data["start"])
+        block.end, block.lines = data["end"], data["lines"]
+        block.min_time, block.max_time = data["min_time"], data["max_time"]
+        block.statuses, block.methods = set(data["statuses"]), set(data["methods"])
+        block.ips = BloomFilter.from_str(data["ips"])
+        return block
+
+
+def status_matches(status: Any, wanted: str) -> bool:
+    """True if status equals wanted, or falls in a class such as '5xx'."""
+    status = str(status)
+    if wanted.endswith('xx'):
+        return status[:1] == wanted[:1]
+    return status == wanted
+
+
+def parse_query_time(value: Optional[str]) -> Optional[int]:
+    """
+    Accepts ISO 8601 ('2023-05-15T08:00:00', naive means UTC) or Nginx format; returns
+    epoch seconds. Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    epoch = parse_timestamp(value)
+    if epoch is None:
+        raise ValueError(f"Unrecognized time {value!r}: use ISO 8601 or the Nginx format")
+    return epoch
+
+
+class LogIndex:
+    """Block index for one log file, stored as <log>.idx."""
+
+    def __init__(self, filepath: str, block_bytes: int = DEFAULT_BLOCK_BYTES):
+        self.filepath = filepath
+        self.index_path = filepath + '.idx'
+        self.block_bytes = block_bytes
+        self.inode: Optional[int] = None
+        self.parser: Optional[str] = None  # parser_key() of the parser that built the blocks
+        self.indexed_bytes = 0
+        self.blocks: List[IndexBlock] = []
+
+    @classmethod
+    def load(cls, filepath: str) -> Optional["LogIndex"]:
+        """Reads the sidecar index for filepath, or returns None if there is none."""
+        index = cls(filepath)
+        if not os.path.exists(index.index_path):
+            return None
+        with open(index.index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            return None
+        index.block_bytes = data["block_bytes"]
+        index.inode = data["inode"]
+        index.parser = data["parser"]
+        index.indexed_bytes = data["indexed_bytes"]
+        index.blocks = [IndexBlock.from_dict(block) for block in data["blocks"]]
+        return index
+
+    def save(self):
+        data = {
+            "version": INDEX_FORMAT_VERSION,
+            "block_bytes": self.block_bytes,
+            "inode": self.inode,
+            "parser": self.parser,
+            "indexed_bytes": self.indexed_bytes,
+            "blocks": [block.to_dict() for block in self.blocks],
+        }
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.index_path)
+
+    def update(self, log_parser: BaseLogParser) -> int:
+        """
+        Indexes everything appended since the last update (or the whole file if it
+        was replaced or truncated, or indexed with another parser). Returns the
+        number of new bytes indexed.
+        """
+        if detect_compression(self.filepath):
+            raise ValueError("Compressed logs cannot be indexed; byte offsets must be seekable")
+
+        st = os.stat(self.filepath)
+        key = parser_key(log_parser)
+        if st.st_ino != self.inode or st.st_size < self.indexed_bytes or key != self.parser:
+            self.inode, self.parser, self.indexed_bytes, self.blocks = st.st_ino, key, 0, []
+
+        start_offset = self.indexed_bytes
+        block = None
+        if self.blocks and self.blocks[-1].end - self.blocks[-1].start < self.block_bytes:
+            # Keep filling the last, not yet full block
+            block = self.blocks.pop()
+        with open(self.filepath, 'rb') as f:
+            f.seek(self.indexed_bytes)
+            pos = self.indexed_bytes
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break  # Partially written line; index it next time
+                if block is None:
+                    block = IndexBlock(pos)
+                parsed = log_parser.parse_line(raw.decode('utf-8', errors='replace').strip())
+                if parsed:
+                    block.add(parsed)
+                pos += len(raw)
+                block.end = pos
+                if pos - block.start >= self.block_bytes:
+                    self.blocks.append(block)
+                    block = None
+            if block is not None:
+                self.blocks.append(block)
+            self.indexed_bytes = pos
+
+        return self.indexed_bytes - start_offset
+
+    def query(self, log_parser: BaseLogParser, ip: Optional[str] = None, status: Optional[str] = None,
+              method: Optional[str] = None, since: Optional[int] = None,
+              until: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yields records matching all given criteria, reading only candidate blocks."""
+        with open(self.filepath, 'rb') as f:
+            # A snapshot: the app may extend the index while a query is running
+            for block in list(self.blocks):
+                if not block.may_match(ip, status, method, since, until):
+                    continue
+                f.seek(block.start)
+                data = f.read(block.end - block.start)
+                # Only '\n' ends a line, as in update(); splitlines() would also split on a bare '\r'
+                for raw in data.split(b'\n'):
+                    record = log_parser.parse_line(raw.decode('utf-8', errors='replace').strip())
+                    if record and _record_matches(record, ip, status, method, since, until):
+                        yield record
+
+
+def _record_matches(record: Dict[str, Any], ip, status, method, since, until) -> bool:
+    if ip is not None and record.get('ip') != ip:
+        return False
+    if status is not None and (record.get('status') is None or not status_matches(record['status'], status)):
+        return False
+    if method is not None and record.get('method') != method:
+        return False
+    if since is not None or until is not None:
+        epoch = parse_timestamp(record.get('time'))
+        if epoch is None or (since is not None and epoch < since) or (until is not None and epoch > until):
+            return False
+    return True
+
+
+def build_index(filepath: str, log_parser: BaseLogParser, block_bytes: int = DEFAULT_BLOCK_BYTES) -> LogIndex:
+    """Loads the sidecar index for filepath, brings it up to date and saves it."""
+    index = LogIndex.load(filepath) or LogIndex(filepath, block_bytes)
+    if index.update(log_parser):
+        index.save()
+    return index
@@ -0,0 +1,162 @@
+"""
+Background analysis jobs for the web dashboard.
+
+Analysing a large log inside a request handler ties up that request (and, with
+the single-threaded dev server, every other user). JobManager instead runs each
+analysis on a small thread pool and lets clients poll or stream its progress:
+bytes processed, lines/sec and partial stats, refreshed while the file is parsed.
+
+Jobs are de-duplicated per (file, parser): while an analysis of a file is queued
+or running, further requests for it attach to the same job instead of starting
+another parse. Results land in the shared ParseCache, so a finished job makes
+later requests for an unchanged file instant.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from src.cache import ParseCache
+from src.parser import BaseLogParser
+from src.readers import detect_compression
+from src.stats import LogStatsCollector
+
+
+def summarize_stats(stats: LogStatsCollector, top_n: int = 10) -> Dict[str, Any]:
+    """The stats payload shown by the dashboard."""
+    return {
+        "total_requests": stats.total_requests,
+        "ip_addresses": [{"ip": ip, "count": count} for ip, count in stats.ip_addresses.most_common(top_n)],
+        "status_codes": [{"status": status, "count": count} for status, count in stats.status_codes.most_common()],
+        "methods": [{"method": method, "count": count} for method, count in stats.methods.most_common()],
+    }
+
+
+class AnalysisJob:
+    """State of one background analysis; updated by the worker, read by request handlers."""
+
+    def __init__(self, job_id: str, filepath: str):
+        self.id = job_id
+        self.filepath = filepath
+        self.status = "queued"  # queued -> running -> done | error
+        # Progress is measured in decompressed bytes, so there is no total for compressed files
+        self.total_bytes = None if detect_compression(filepath) else os.path.getsize(filepath)
+        self.bytes_processed = 0
+        self.lines = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stats: Optional[Dict[str, Any]] = None
+        self.collector: Optional[LogStatsCollector] = None  # Full stats once done, for merging across files
+        self.error: Optional[str] = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "error")
+
+    def update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait(self, version: int, timeout: Optional[float] = None) -> int:
+        """Blocks until the job changes from `version` (or finishes, or timeout); returns the new version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version or self.done, timeout)
+            return self.version
+
+    def wait_done(self, timeout: Optional[float] = None) -> bool:
+        with self._changed:
+            return self._changed.wait_for(lambda: self.done, timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._changed:
+            elapsed = 0.0
+            if self.started_at is not None:
+                elapsed = (self.finished_at or time.monotonic()) - self.started_at
+            return {
+                "id": self.id,
+                "filename": os.path.basename(self.filepath),
+                "status": self.status,
+                "bytes_processed": self.bytes_processed,
+                "total_bytes": self.total_bytes,
+                "lines": self.lines,
+                "elapsed": round(elapsed, 3),
+                "lines_per_sec": round(self.lines / elapsed) if elapsed > 0 else None,
+                "bytes_per_sec": round(self.bytes_processed / elapsed) if elapsed > 0 else None,
+                "stats": self.stats,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """Runs analyses on a bounded thread pool, at most one job per (file, parser) at a time."""
+
+    def __init__(self, parse_cache: ParseCache, max_workers: int = 2,
+                 progress_interval: float = 0.5, max_jobs: int = 256):
+        self.parse_cache = parse_cache
+        self.progress_interval = progress_interval
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="log-analysis")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._active: Dict[Tuple[str, str], AnalysisJob] = {}
+
+    def submit(self, filepath: str, log_parser: BaseLogParser) -> AnalysisJob:
+        """Starts analysing filepath, or returns the job already doing so."""
+        filepath = os.path.abspath(filepath)
+        key = (filepath, ParseCache._parser_key(log_parser))
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None and not job.done:
+                return job
+            job = AnalysisJob(uuid.uuid4().hex[:12], filepath)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._prune()
+        self._executor.submit(self._run, job, log_parser)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_count(self) -> int:
+        """Number of jobs queued or running."""
+        with self._lock:
+            return sum(1 for job in self._active.values() if not job.done)
+
+    def _prune(self):
+        """Forgets the oldest finished jobs beyond max_jobs."""
+        excess = len(self._jobs) - self.max_jobs
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: AnalysisJob, log_parser: BaseLogParser):
+        job.update(status="running", started_at=time.monotonic())
+        last_report = 0.0
+
+        def progress(bytes_read: int, stats: LogStatsCollector):
+            nonlocal last_report
+            now = time.monotonic()
+            # Summarising walks the counters, so only do it every progress_interval
+            if now - last_report >= self.progress_interval:
+                last_report = now
+                job.update(bytes_processed=bytes_read, lines=stats.total_requests,
+                           stats=summarize_stats(stats))
+
+        try:
+            entry = self.parse_cache.get(job.filepath, log_parser, progress=progress)
+            job.update(status="done", finished_at=time.monotonic(), bytes_processed=entry.offset,
+                       lines=entry.stats.total_requests, stats=summarize_stats(entry.stats),
+                       collector=entry.stats)
+        except Exception as e:
+            job.update(status="error", finished_at=time.monotonic(), error=str(e))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,192 @@
+"""
+Pipeline instrumentation: per-stage timers and counters.
+
+Instrumented code checks `metrics.enabled` once per stream (or per chunk), never
+per line, and only then switches to a profiled code path that moves records
+through the stages in chunks of CHUNK_SIZE. Each stage is timed once per chunk,
+so the cost of a timer is shared by thousands of lines. When metrics are
+disabled (the default) the original loops run unchanged.
+
+Stages recorded by the pipeline:
+- read         reading and decoding input lines
+- parse        parse_line (RegexLogParser splits it into parse.match and parse.build;
+               parse.parallel is the time spent waiting for worker processes)
+- filter       --where checks
+- stats        LogStatsCollector updates
+- export.<fmt> exporter writes (time spent waiting for input excluded)
+
+The CLI prints a summary with --profile; the web app serves everything at /metrics
+in the Prometheus text format.
+"""
+import threading
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 4096
+
+# Metric name -> help text, for the Prometheus exposition
+DESCRIPTIONS = {
+    "lines_read": "Input lines read",
+    "lines_matched": "Input lines that parsed into a record",
+    "parse_failures": "Input lines that did not parse",
+    "bytes_read": "Input bytes read from log files",
+    "lines_filtered_out": "Lines dropped by a --where filter, before or after parsing",
+    "records_exported": "Records written by an exporter",
+    "bytes_written": "Bytes written by exporters",
+    "stage_seconds": "Time spent in each pipeline stage",
+    "stage_items": "Items (lines or records) handled by each pipeline stage",
+    "http_requests": "HTTP requests served, by endpoint and status",
+    "http_request_seconds": "Time spent serving HTTP requests, by endpoint",
+    "alerts": "Alert state changes, by rule and state",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Thread-safe counters keyed by name and labels. Disabled until enable() is called."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def add_time(self, stage: str, seconds: float, items: int = 0):
+        """Records `seconds` spent in a stage while handling `items` lines or records."""
+        key = (("stage", stage),)
+        with self._lock:
+            seconds_series = self._counters.setdefault("stage_seconds", {})
+            seconds_series[key] = seconds_series.get(key, 0) + seconds
+            items_series = self._counters.setdefault("stage_items", {})
+            items_series[key] = items_series.get(key, 0) + items
+
+    def get(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def chunks(self, data: Iterable[Any], stage: Optional[str] = None, size: int = CHUNK_SIZE) -> Iterator[List[Any]]:
+        """Yields lists of up to `size` items from data, timing the pulls as `stage` if given."""
+        iterator = iter(data)
+        perf_counter = time.perf_counter
+        while True:
+            started = perf_counter()
+            chunk = list(islice(iterator, size))
+            if not chunk:
+                return
+            if stage is not None:
+                self.add_time(stage, perf_counter() - started, len(chunk))
+            yield chunk
+
+    def time_consumer(self, stage: str, consumer: Callable[..., Any], data: Iterable[Any], *args, **kwargs):
+        """
+        Runs consumer(data, *args, **kwargs) and records its own time as `stage`:
+        the time it spent waiting for data (upstream stages) is subtracted.
+        Returns (consumer result, number of items consumed).
+        """
+        waited, consumed = 0.0, 0
+
+        def feed():
+            nonlocal waited, consumed
+            iterator = iter(data)
+            while True:
+                started = time.perf_counter()
+                chunk = list(islice(iterator, CHUNK_SIZE))
+                waited += time.perf_counter() - started
+                if not chunk:
+                    return
+                consumed += len(chunk)
+                yield from chunk
+
+        started = time.perf_counter()
+        result = consumer(feed(), *args, **kwargs)
+        self.add_time(stage, time.perf_counter() - started - waited, consumed)
+        return result, consumed
+
+    def snapshot(self) -> Dict[str, Dict[LabelKey, float]]:
+        with self._lock:
+            return {name: dict(series) for name, series in self._counters.items()}
+
+    def report(self, wall_seconds: Optional[float] = None) -> str:
+        """Human-readable summary of stage times and counters (for --profile)."""
+        data = self.snapshot()
+        stage_seconds = {dict(key)["stage"]: value for key, value in data.get("stage_seconds", {}).items()}
+        stage_items = {dict(key)["stage"]: value for key, value in data.get("stage_items", {}).items()}
+        total = wall_seconds or sum(stage_seconds.values()) or 1.0
+
+        lines = ["--- Pipeline Profile ---", f"{'stage':<16}{'seconds':>10}{'share':>8}{'items':>14}{'items/sec':>14}"]
+        for stage, seconds in sorted(stage_seconds.items(), key=lambda kv: -kv[1]):
+            items = stage_items.get(stage, 0)
+            rate = f"{items / seconds:,.0f}" if seconds > 0 and items else "-"
+            lines.append(f"{stage:<16}{seconds:>10.3f}{seconds / total:>8.1%}{items:>14,.0f}{rate:>14}")
+        if wall_seconds is not None:
+            other = wall_seconds - sum(stage_seconds.values())
+            if other >= 0:
+                lines.append(f"{'(other)':<16}{other:>10.3f}{other / total:>8.1%}")
+            else:
+                # e.g. --threaded-export: the writer thread's time overlaps the parsing
+                lines.append("(stages ran concurrently; their shares add up to more than 100%)")
+            lines.append(f"{'total (wall)':<16}{wall_seconds:>10.3f}")
+
+        lines.append("")
+        for name, series in sorted(data.items()):
+            if name.startswith("stage_"):
+                continue
+            for key, value in sorted(series.items()):
+                label = ", ".join(f"{k}={v}" for k, v in key)
+                lines.append(f"  {name}{f' ({label})' if label else ''}: {value:,.0f}")
+        lines.append("------------------------")
+        return "\n".join(lines)
+
+    def to_prometheus(self, gauges: Optional[Dict[str, Tuple[float, str]]] = None, prefix: str = "logparser_") -> str:
+        """Prometheus text exposition: counters as <prefix><name>_total, plus optional gauges (value, help)."""
+        out = []
+        for name, series in sorted(self.snapshot().items()):
+            metric = f"{prefix}{name}_total"
+            out.append(f"# HELP {metric} {DESCRIPTIONS.get(name, name)}")
+            out.append(f"# TYPE {metric} counter")
+            for key, value in sorted(series.items()):
+                labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+                text = _format_value(value)
+                out.append(f"{metric}{{{labels}}} {text}" if labels else f"{metric} {text}")
+        for name, (value, help_text) in sorted((gauges or {}).items()):
+            metric = f"{prefix}{name}"
+            out.append(f"# HELP {metric} {help_text}")
+            out.append(f"# TYPE {metric} gauge")
+            out.append(f"{metric} {_format_value(value)}")
+        return "\n".join(out) + "\n"
+
+
+def _format_value(value: float) -> str:
+    """The exact value for Prometheus: {:g} would round a counter to 6 digits, so it looks frozen."""
+    if value != value:
+        return "NaN"
+    if value in (float('inf'), float('-inf')):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Process-wide registry used by the parser, stats, exporters, cache and web app
+metrics = MetricsRegistry()
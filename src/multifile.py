@@ -0,0 +1,153 @@
+"""
+Multi-file input: globs and directories, per-file stats computed concurrently,
+and a timestamp-ordered merge of several files into one stream.
+
+Servers keep access.log next to dozens of rotated siblings (access.log.1,
+access.log.2.gz, ...). Stats for each file are independent, so analyze_files()
+computes them on a bounded process pool and folds the per-file collectors into
+one total. When the records themselves are needed (export, printing),
+stream_files() chains the files or k-way merges them by timestamp.
+"""
+import glob
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from src.filters import RecordFilter
+from src.parser import BaseLogParser
+from src.readers import is_log_filename
+from src.stats import LogStatsCollector
+from src.timeutils import to_epoch
+
+# Files parsed at once by analyze_files()
+DEFAULT_FILE_WORKERS = 4
+
+StatsFactory = Callable[[], LogStatsCollector]
+
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """
+    Turns file paths, directories and glob patterns into a list of files.
+    A directory contributes the log files directly inside it (see is_log_filename).
+    The files a directory or glob expands to are ordered oldest-first by mtime, so
+    rotated logs come out in chronological order. Duplicates are dropped.
+    Raises FileNotFoundError for a missing path or a pattern that matches nothing.
+    """
+    files, seen = [], set()
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = [os.path.join(item, name) for name in os.listdir(item)
+                       if is_log_filename(name) and os.path.isfile(os.path.join(item, name))]
+        elif os.path.exists(item):
+            matches = [item]
+        elif glob.has_magic(item):
+            matches = [path for path in glob.glob(item) if os.path.isfile(path)]
+        else:
+            raise FileNotFoundError(f"No such file or directory: {item}")
+        if not matches:
+            raise FileNotFoundError(f"No log files found for {item!r}")
+
+        matches.sort(key=lambda path: (os.path.getmtime(path), path))
+        for path in matches:
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
+
+
+class MultiFileStats:
+    """Stats for each input file plus their merged total."""
+
+    def __init__(self, per_file: Dict[str, LogStatsCollector], stats_factory: StatsFactory = LogStatsCollector):
+        self.per_file = per_file
+        self.total = stats_factory()
+        for stats in per_file.values():
+            self.total.merge(stats)
+
+    def print_per_file(self):
+        """Prints one summary line per file; the total is printed by self.total.print_report()."""
+        print("--- Per-File Totals ---")
+        width = max(len(path) for path in self.per_file)
+        for path, stats in self.per_file.items():
+            errors = sum(count for status, count in stats.status_codes.items() if str(status).startswith('5'))
+            print(f"  {path:<{width}}  {stats.total_requests:>10} requests  {errors:>8} 5xx")
+        print()
+
+
+def _file_stats(log_parser: BaseLogParser, filepath: str, stats_factory: StatsFactory,
+                record_filter: Optional[RecordFilter]) -> Dict[str, Any]:
+    """Worker entry point: the stats of one file as a partial aggregate (module-level to be picklable)."""
+    stats = stats_factory()
+    for _ in stats.process_stream(log_parser.parse_file(filepath, record_filter=record_filter)):
+        pass
+    return stats.to_dict()
+
+
+def analyze_files(filepaths: List[str], log_parser: BaseLogParser, stats_factory: StatsFactory = LogStatsCollector,
+                  workers: int = DEFAULT_FILE_WORKERS,
+                  record_filter: Optional[RecordFilter] = None) -> MultiFileStats:
+    """
+    Computes the stats of each file, up to `workers` files at a time in separate
+    processes (each file is read by one worker), and merges them. stats_factory
+    must be picklable, e.g. LogStatsCollector or a functools.partial of it.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(filepaths))
+    if workers <= 1:
+        results = [_file_stats(log_parser, path, stats_factory, record_filter) for path in filepaths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_file_stats, log_parser, path, stats_factory, record_filter)
+                       for path in filepaths]
+            results = [future.result() for future in futures]
+    per_file = {path: LogStatsCollector.from_dict(data) for path, data in zip(filepaths, results)}
+    return MultiFileStats(per_file, stats_factory)
+
+
+def _keyed_by_time(stream: Iterator[Dict[str, Any]], index: int) -> Iterator[Tuple[float, int, int, Dict[str, Any]]]:
+    # Records without a parsable time keep the position of the record before them
+    last = float('-inf')
+    for seq, record in enumerate(stream):
+        epoch = to_epoch(record.get('time'))
+        if epoch is not None:
+            last = epoch
+        yield last, index, seq, record
+
+
+def merge_by_time(streams: List[Iterator[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """
+    k-way merge of record streams, each already in time order (as a log file is),
+    into one stream ordered by the 'time' field. Ties keep the order of the inputs.
+    Only one record per stream is held in memory.
+    """
+    keyed = [_keyed_by_time(stream, index) for index, stream in enumerate(streams)]
+    for _, _, _, record in heapq.merge(*keyed):
+        yield record
+
+
+def stream_files(filepaths: List[str], log_parser: BaseLogParser, sort_by_time: bool = False,
+                 record_filter: Optional[RecordFilter] = None,
+                 stats_factory: Optional[StatsFactory] = None, typed: bool = False
+                 ) -> Tuple[Iterator[Dict[str, Any]], Dict[str, LogStatsCollector]]:
+    """
+    Returns (records, per_file_stats): the records of all files, one file after
+    another or, with sort_by_time, merged by timestamp. With stats_factory, each
+    file's records also feed its own collector in per_file_stats, which is
+    complete once the records have been consumed. typed is passed on to parse_file.
+    """
+    per_file: Dict[str, LogStatsCollector] = {}
+    streams = []
+    for path in filepaths:
+        stream = log_parser.parse_file(path, record_filter=record_filter, typed=typed)
+        if stats_factory is not None:
+            per_file[path] = stats_factory()
+            stream = per_file[path].process_stream(stream)
+        streams.append(stream)
+
+    if sort_by_time:
+        return merge_by_time(streams), per_file
+
+    def chained():
+        for stream in streams:
+            yield from stream
+    return chained(), per_file
@@ -0,0 +1,175 @@
+"""
+Cursor-based paging over a log file.
+
+A cursor is an opaque token holding a byte offset (always the start of a line)
+and the file's inode, so reading a page seeks straight to it: the cost of a page
+is proportional to its size, not to how far into the file it is. Pages can be
+read forwards from a cursor, or backwards from it, which with the end of the
+file as the cursor gives a "tail" of the newest lines.
+
+Compressed files have no random access: forward pages still work but seeking
+decompresses everything before the cursor, and backward pages scan the stream.
+"""
+import base64
+import os
+from collections import deque
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from src.parser import BaseLogParser
+from src.readers import detect_compression, open_binary
+
+DEFAULT_PAGE_SIZE = 50
+
+# Bytes read per step when scanning backwards
+BACKWARD_BLOCK_SIZE = 64 * 1024
+
+
+class CursorError(ValueError):
+    """Raised for malformed cursors or cursors from a different (rotated) file."""
+
+
+def encode_cursor(inode: int, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{inode}:{offset}".encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, filepath: str) -> int:
+    """Returns the byte offset in a cursor, checking it belongs to filepath as it is now."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        inode, offset = (int(part) for part in base64.urlsafe_b64decode(padded).decode('ascii').split(':'))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorError(f"Invalid cursor: {token!r}") from e
+    if inode != os.stat(filepath).st_ino:
+        raise CursorError("Cursor belongs to a previous version of the file (it was rotated or replaced)")
+    if offset < 0:
+        raise CursorError(f"Invalid cursor: {token!r}")
+    return offset
+
+
+class LogPage:
+    """Parsed rows from the byte range [start, end) of a file, in file order."""
+
+    def __init__(self, rows: List[Dict[str, Any]], start: int, end: int, at_start: bool, at_end: bool):
+        self.rows = rows
+        self.start = start
+        self.end = end
+        self.at_start = at_start
+        self.at_end = at_end
+
+    def cursors(self, inode: int) -> Tuple[Optional[str], Optional[str]]:
+        """(prev_cursor, next_cursor); None where there is nothing more to read."""
+        prev_cursor = None if self.at_start else encode_cursor(inode, self.start)
+        next_cursor = None if self.at_end else encode_cursor(inode, self.end)
+        return prev_cursor, next_cursor
+
+
+def _parse(log_parser: BaseLogParser, raw: bytes) -> Optional[Dict[str, Any]]:
+    return log_parser.parse_line(raw.decode('utf-8', errors='replace').strip())
+
+
+def _line_start_at_or_before(f: BinaryIO, offset: int) -> int:
+    """Offset just after the last newline before `offset` (or 0): the start of the line containing offset - 1."""
+    pos = offset
+    while pos > 0:
+        step = min(BACKWARD_BLOCK_SIZE, pos)
+        f.seek(pos - step)
+        found = f.read(step).rfind(b'\n')
+        if found >= 0:
+            return pos - step + found + 1
+        pos -= step
+    return 0
+
+
+def _iter_lines_backward(f: BinaryIO, end: int) -> Iterator[Tuple[int, bytes]]:
+    """Yields (start_offset, line) for every line before `end` (a line start), newest first."""
+    # buffer holds the bytes from buffer_start; buffer[:line_end] has not been yielded yet
+    buffer, buffer_start, line_end = b'', end, 0
+    while buffer_start + line_end > 0:
+        # The line ending at line_end (with its newline at line_end - 1) starts after the previous newline
+        found = buffer.rfind(b'\n', 0, max(line_end - 1, 0))
+        if found < 0 and buffer_start > 0:
+            step = min(BACKWARD_BLOCK_SIZE, buffer_start)
+            buffer_start -= step
+            f.seek(buffer_start)
+            buffer = f.read(step) + buffer[:line_end]
+            line_end += step
+            continue
+        yield buffer_start + found + 1, buffer[found + 1:line_end]
+        line_end = found + 1
+
+
+def read_forward(filepath: str, log_parser: BaseLogParser, offset: int = 0,
+                 limit: int = DEFAULT_PAGE_SIZE) -> LogPage:
+    """
+    Reads up to `limit` parsed rows starting at byte offset. An offset in the middle
+    of a line skips to the next line. A final line without a trailing newline (still
+    being written) is left for a later page.
+    """
+    with open_binary(filepath) as f:
+        if offset > 0:
+            f.seek(offset - 1)
+            if f.read(1) != b'\n':
+                f.readline()  # Resynchronise on the next line start
+        start = pos = f.tell() if offset > 0 else 0
+
+        rows, at_end = [], False
+        while len(rows) < limit:
+            raw = f.readline()
+            if not raw.endswith(b'\n'):
+                at_end = True
+                break
+            pos += len(raw)
+            parsed = _parse(log_parser, raw)
+            if parsed:
+                rows.append(parsed)
+        if not at_end:
+            # Look ahead so the last page does not hand out a cursor to an empty one
+            at_end = not f.readline().endswith(b'\n')
+    return LogPage(rows, start, pos, start == 0, at_end)
+
+
+def read_backward(filepath: str, log_parser: BaseLogParser, offset: Optional[int] = None,
+                  limit: int = DEFAULT_PAGE_SIZE) -> LogPage:
+    """
+    Reads up to `limit` parsed rows ending just before byte offset (default: end of
+    file, i.e. the newest lines), returned in file order. Plain files are read
+    backwards block by block, so the cost depends only on the page size.
+    """
+    if detect_compression(filepath):
+        return _read_backward_stream(filepath, log_parser, offset, limit)
+
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = _line_start_at_or_before(f, size if offset is None else min(offset, size))
+
+        rows, start = [], end
+        for line_start, raw in _iter_lines_backward(f, end):
+            start = line_start
+            parsed = _parse(log_parser, raw)
+            if parsed:
+                rows.append(parsed)
+                if len(rows) >= limit:
+                    break
+        rows.reverse()
+        at_end = _line_start_at_or_before(f, size) <= end
+    return LogPage(rows, start, end, start == 0, at_end)
+
+
+def _read_backward_stream(filepath: str, log_parser: BaseLogParser, offset: Optional[int],
+                          limit: int) -> LogPage:
+    """Backward paging for compressed files: scan forward, keeping the last `limit` rows."""
+    window = deque(maxlen=limit)
+    pos, at_end = 0, True
+    with open_binary(filepath) as f:
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            if offset is not None and pos + len(raw) > offset:
+                at_end = False
+                break
+            parsed = _parse(log_parser, raw)
+            if parsed:
+                window.append((pos, parsed))
+            pos += len(raw)
+    # A window that never filled up covers everything from the start of the file
+    start = window[0][0] if len(window) == limit else 0
+    return LogPage([row for _, row in window], start, pos, start == 0, at_end)
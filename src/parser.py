@@ -1,30 +1,277 @@
+import json
+import os
 import re
-from typing import Iterator, Dict, Any, Optional
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterator, Dict, Any, Optional, List, Tuple
 from abc import ABC, abstractmethod
+from src.readers import iter_lines, detect_compression
+from src.batches import RecordBatch, batches_from_records, DEFAULT_BATCH_SIZE
+from src.filters import RecordFilter
+from src.metrics import metrics
+from src.records import RecordConverter
+
+# Default size of the byte ranges handed to each worker in parallel mode.
+DEFAULT_CHUNK_SIZE = 32 * 1024 * 1024
+
+
+def find_chunk_boundaries(filepath: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Splits a file into (start, end) byte ranges of roughly chunk_size bytes.
+    Every boundary sits just after a newline, so no line straddles two ranges.
+    """
+    size = os.path.getsize(filepath)
+    if size == 0:
+        return []
+
+    boundaries = [0]
+    with open(filepath, 'rb') as f:
+        pos = chunk_size
+        while pos < size:
+            f.seek(pos)
+            f.readline()  # Skip forward to the start of the next line
+            pos = f.tell()
+            if pos >= size:
+                break
+            boundaries.append(pos)
+            pos += chunk_size
+    boundaries.append(size)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+class PatternError(ValueError):
+    """Raised for a custom log pattern that does not compile or has no named groups."""
+
+
+@lru_cache(maxsize=128)
+def compile_pattern(pattern: str) -> "re.Pattern[str]":
+    """
+    Compiles and checks a log pattern, caching the result by pattern string, so
+    parsers created per request or per file never recompile the same pattern.
+    """
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise PatternError(f"Invalid regex {pattern!r}: {e}") from e
+    if not compiled.groupindex:
+        raise PatternError(f"Regex {pattern!r} has no named groups, e.g. (?P<ip>\\S+)")
+    return compiled
+
+
+def _parse_chunk(log_parser: "BaseLogParser", filepath: str, start: int, end: int,
+                 record_filter: Optional[RecordFilter] = None) -> List[Dict[str, Any]]:
+    """Worker entry point for parallel parsing (must be a module-level function to be picklable)."""
+    return list(log_parser.parse_range(filepath, start, end, record_filter))
 
 
 class BaseLogParser(ABC):
     """Abstract base class for all log parsers."""
+
+    # Column types used by parse_batches(): 'int', 'timestamp' or (default) 'string'
+    FIELD_TYPES: Dict[str, str] = {}
+
+    # True if every parsed value is a substring of its line, so a RecordFilter's
+    # cheap line check can reject lines before they are parsed
+    SUPPORTS_LINE_PREFILTER = False
+
+    # Low-cardinality fields shared between typed records (see src/records.py)
+    INTERN_FIELDS: Tuple[str, ...] = ()
     
     @abstractmethod
     def parse_line(self, line: str) -> Optional[Dict[str, Any]]:
         """Parses a single log line into a dictionary. Returns None if it fails to parse."""
         pass
 
-    def parse_file(self, filepath: str) -> Iterator[Dict[str, Any]]:
-        """Yields parsed log lines from a file."""
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                parsed = self.parse_line(line.strip())
-                if parsed:
-                    yield parsed
+    def record_converter(self) -> Optional[RecordConverter]:
+        """
+        A converter to typed records for parse_file(typed=True), or None if this
+        parser's records have no fixed set of fields (they are then left as dicts).
+        """
+        return None
+
+    def parse_file(self, filepath: str, workers: int = 1, use_mmap: bool = False,
+                   record_filter: Optional[RecordFilter] = None,
+                   typed: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Yields parsed log lines from a file, which may be gzip/bz2/xz/zstd compressed.
+        Use workers > 1 to parse on several cores. With record_filter, only matching
+        records are yielded and lines that cannot match are skipped before parsing.
+        With typed=True, records are LogRecord objects with converted, interned values.
+        """
+        if typed:
+            converter = self.record_converter()
+            if converter is not None:
+                yield from converter.convert_all(self.parse_file(filepath, workers, use_mmap, record_filter))
+                return
+
+        if workers != 1:
+            records = self.parse_file_parallel(filepath, workers, record_filter=record_filter)
+            if metrics.enabled:
+                # Workers run in other processes: only the wall time spent waiting for them is known
+                for chunk in metrics.chunks(records, stage="parse.parallel"):
+                    metrics.inc("lines_matched", len(chunk))
+                    yield from chunk
+                metrics.inc("bytes_read", os.path.getsize(filepath))
+                return
+            yield from records
+            return
+
+        lines = iter_lines(filepath, use_mmap=use_mmap)
+        if metrics.enabled:
+            yield from self._parse_profiled(lines, record_filter)
+            metrics.inc("bytes_read", os.path.getsize(filepath))
+            return
+        if record_filter is not None:
+            yield from self._parse_filtered(lines, record_filter)
+            return
+
+        parse_line = self.parse_line
+        for line in lines:
+            parsed = parse_line(line)
+            if parsed:
+                yield parsed
+
+    def _parse_filtered(self, lines: Iterator[str], record_filter: RecordFilter) -> Iterator[Dict[str, Any]]:
+        parse_line = self.parse_line
+        matches = record_filter.matches
+        if self.SUPPORTS_LINE_PREFILTER and record_filter.has_line_check:
+            line_may_match = record_filter.line_may_match
+            lines = (line for line in lines if line_may_match(line))
+        for line in lines:
+            parsed = parse_line(line)
+            if parsed and matches(parsed):
+                yield parsed
+
+    def _parse_profiled(self, lines: Iterator[str],
+                        record_filter: Optional[RecordFilter]) -> Iterator[Dict[str, Any]]:
+        """
+        parse_file's loop when metrics are enabled. Lines are handled in chunks so each
+        stage (read, filter, parse) is timed once per chunk rather than once per line.
+        """
+        perf_counter = time.perf_counter
+        line_may_match = matches = None
+        if record_filter is not None:
+            matches = record_filter.matches
+            if self.SUPPORTS_LINE_PREFILTER and record_filter.has_line_check:
+                line_may_match = record_filter.line_may_match
+
+        for chunk in metrics.chunks(lines, stage="read"):
+            lines_read = len(chunk)
+            if line_may_match is not None:
+                started = perf_counter()
+                chunk = [line for line in chunk if line_may_match(line)]
+                metrics.add_time("filter", perf_counter() - started, lines_read)
+
+            records = [parsed for parsed in self._parse_chunk_profiled(chunk) if parsed]
+            metrics.inc("lines_read", lines_read)
+            metrics.inc("lines_matched", len(records))
+            metrics.inc("parse_failures", len(chunk) - len(records))
+
+            if matches is not None:
+                started = perf_counter()
+                kept = [record for record in records if matches(record)]
+                metrics.add_time("filter", perf_counter() - started, len(records))
+                metrics.inc("lines_filtered_out", lines_read - len(chunk) + len(records) - len(kept))
+                records = kept
+            yield from records
+
+    def _parse_chunk_profiled(self, lines: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Parses a chunk of lines, recording the time as the 'parse' stage."""
+        started = time.perf_counter()
+        parse_line = self.parse_line
+        parsed = [parse_line(line) for line in lines]
+        metrics.add_time("parse", time.perf_counter() - started, len(lines))
+        return parsed
+
+    def parse_batches(self, filepath: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                      use_mmap: bool = False) -> Iterator[RecordBatch]:
+        """Yields the parsed file as columnar RecordBatch objects of up to batch_size rows."""
+        return batches_from_records(self.parse_file(filepath, use_mmap=use_mmap), batch_size, self.FIELD_TYPES)
+
+    def parse_range(self, filepath: str, start: int, end: int,
+                    record_filter: Optional[RecordFilter] = None) -> Iterator[Dict[str, Any]]:
+        """Yields parsed log lines from the byte range [start, end) of a file."""
+        lines = self._iter_range(filepath, start, end)
+        if record_filter is not None:
+            yield from self._parse_filtered(lines, record_filter)
+            return
+        for line in lines:
+            parsed = self.parse_line(line)
+            if parsed:
+                yield parsed
+
+    @staticmethod
+    def _iter_range(filepath: str, start: int, end: int) -> Iterator[str]:
+        with open(filepath, 'rb') as f:
+            f.seek(start)
+            pos = start
+            while pos < end:
+                raw = f.readline()
+                if not raw:
+                    break
+                pos += len(raw)
+                yield raw.decode('utf-8', errors='replace').strip()
+
+    def parse_file_parallel(self, filepath: str, workers: Optional[int] = None,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE,
+                            record_filter: Optional[RecordFilter] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Parses a file on several cores and yields the results in input order.
+        The file is split into newline-aligned byte ranges which are parsed in a
+        process pool. Only a bounded number of chunks is in flight at once, so
+        memory stays proportional to workers * chunk_size rather than file size.
+        """
+        workers = workers or os.cpu_count() or 1
+        if detect_compression(filepath):
+            # Compressed streams cannot be split by byte offset
+            yield from self.parse_file(filepath, record_filter=record_filter)
+            return
+        chunks = find_chunk_boundaries(filepath, chunk_size)
+
+        # Not worth paying for a process pool
+        if workers == 1 or len(chunks) <= 1:
+            for start, end in chunks:
+                yield from self.parse_range(filepath, start, end, record_filter)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            chunk_iter = iter(chunks)
+            for start, end in chunk_iter:
+                pending.append(executor.submit(_parse_chunk, self, filepath, start, end, record_filter))
+                if len(pending) >= workers * 2:
+                    break
+
+            while pending:
+                results = pending.popleft().result()
+                for start, end in chunk_iter:
+                    pending.append(executor.submit(_parse_chunk, self, filepath, start, end, record_filter))
+                    break
+                yield from results
+
+
+def parser_key(log_parser: BaseLogParser) -> str:
+    """Identifies what a parser produces: its pattern, or its class for parsers without one."""
+    pattern = getattr(log_parser, 'pattern', None)
+    if pattern is not None:
+        return getattr(pattern, 'pattern', str(pattern))
+    return type(log_parser).__name__
 
 
 class RegexLogParser(BaseLogParser):
     """A generic log parser that uses a regular expression with named groups."""
+
+    SUPPORTS_LINE_PREFILTER = True
     
     def __init__(self, pattern: str):
-        self.pattern = re.compile(pattern)
+        self.pattern = compile_pattern(pattern)
+
+    def record_converter(self) -> Optional[RecordConverter]:
+        # The named groups are the fields, in pattern order
+        return RecordConverter(self.pattern.groupindex, self.FIELD_TYPES, self.INTERN_FIELDS)
 
     def parse_line(self, line: str) -> Optional[Dict[str, Any]]:
         match = self.pattern.match(line)
@@ -32,6 +279,20 @@ class RegexLogParser(BaseLogParser):
             return match.groupdict()
         return None
 
+    def _parse_chunk_profiled(self, lines: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Times regex matching ('parse.match') and dict building ('parse.build') separately."""
+        if type(self).parse_line is not RegexLogParser.parse_line:
+            # Subclasses with their own parse_line (FastNginxLogParser) are timed as a whole
+            return super()._parse_chunk_profiled(lines)
+        started = time.perf_counter()
+        match = self.pattern.match
+        matched = [match(line) for line in lines]
+        built_at = time.perf_counter()
+        parsed = [m.groupdict() if m else None for m in matched]
+        metrics.add_time("parse.match", built_at - started, len(lines))
+        metrics.add_time("parse.build", time.perf_counter() - built_at, len(lines))
+        return parsed
+
 
 class NginxLogParser(RegexLogParser):
     """
@@ -41,7 +302,130 @@ class NginxLogParser(RegexLogParser):
     """
     
     # Common Log Format (CLF) + User Agent etc (Combined Log Format often used by Nginx)
+    FIELD_TYPES = {'status': 'int', 'size': 'int', 'time': 'timestamp'}
+    INTERN_FIELDS = ('ip', 'method', 'protocol', 'status', 'referrer', 'user_agent')
+
     NGINX_PATTERN = r'^(?P<ip>\S+) \S+ \S+ \[(?P<time>.*?)\] "(?P<method>\S+) (?P<url>\S+) (?P<protocol>\S+)" (?P<status>\d{3}) (?P<size>\S+)(?: "(?P<referrer>.*?)" "(?P<user_agent>.*?)")?$'
 
     def __init__(self):
         super().__init__(self.NGINX_PATTERN)
+
+
+class FastNginxLogParser(NginxLogParser):
+    """
+    Drop-in replacement for NginxLogParser that splits combined-format lines on
+    their fixed delimiters (spaces, brackets, quotes) with str methods instead of
+    running the regex. Any line that does not fit the expected shape, including
+    non-ASCII lines, falls back to the regex, so results are identical.
+    """
+
+    def parse_line(self, line: str) -> Optional[Dict[str, Any]]:
+        # Splitting on quotes gives: head, request, " status size " and, when present,
+        # referrer, " ", user agent, "". Quotes inside fields produce other shapes.
+        pieces = line.split('"')
+        if len(pieces) == 7:
+            head, request, middle, referrer, between, user_agent, end = pieces
+            if between != ' ' or end:
+                return super().parse_line(line)
+            counts = middle.split(' ')
+            if len(counts) != 4 or counts[3]:
+                return super().parse_line(line)
+        elif len(pieces) == 3:
+            head, request, middle = pieces
+            referrer = user_agent = None
+            counts = middle.split(' ')
+            if len(counts) != 3:
+                return super().parse_line(line)
+        else:
+            return super().parse_line(line)
+
+        if counts[0] or not head.endswith('] '):
+            return super().parse_line(line)
+        status, size = counts[1], counts[2]
+
+        prefix = head.split(' ', 3)
+        if len(prefix) != 4 or prefix[3][:1] != '[':
+            return super().parse_line(line)
+        ip, ident, user, bracketed = prefix
+
+        request_parts = request.split(' ')
+        if len(request_parts) != 3:
+            return super().parse_line(line)
+        method, url, protocol = request_parts
+
+        # \S+ fields must be non-empty and free of tabs and other non-space whitespace;
+        # for ASCII text isprintable() is a cheap superset check
+        if (not ip or not ident or not user or not method or not url or not protocol or not size
+                or len(status) != 3 or not status.isdigit() or not line.isascii() or '\n' in line
+                or not (ip + ident + user + request + size).isprintable()):
+            return super().parse_line(line)
+
+        return {
+            'ip': ip,
+            'time': bracketed[1:-2],
+            'method': method,
+            'url': url,
+            'protocol': protocol,
+            'status': status,
+            'size': size,
+            'referrer': referrer,
+            'user_agent': user_agent,
+        }
+
+
+class ApacheVhostCombinedParser(RegexLogParser):
+    """
+    Apache's vhost_combined format: the combined format prefixed with the virtual
+    host and port (%v:%p), e.g.
+    www.example.com:443 127.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET / HTTP/1.1" 200 2326 "-" "curl/8.0"
+    """
+
+    FIELD_TYPES = {'status': 'int', 'size': 'int', 'port': 'int', 'time': 'timestamp'}
+    INTERN_FIELDS = ('vhost', 'port', 'ip', 'method', 'protocol', 'status', 'referrer', 'user_agent')
+
+    VHOST_PATTERN = r'^(?P<vhost>[^\s:]+)(?::(?P<port>\d+))? (?P<ip>\S+) \S+ \S+ \[(?P<time>.*?)\] "(?P<method>\S+) (?P<url>\S+) (?P<protocol>\S+)" (?P<status>\d{3}) (?P<size>\S+)(?: "(?P<referrer>.*?)" "(?P<user_agent>.*?)")?$'
+
+    def __init__(self):
+        super().__init__(self.VHOST_PATTERN)
+
+
+class SyslogParser(RegexLogParser):
+    """
+    BSD syslog (RFC 3164) lines as written by rsyslog/syslog-ng, with an optional
+    <priority> prefix and either the traditional or the ISO 8601 timestamp:
+    May 15 08:00:00 web1 sshd[1234]: Accepted publickey for deploy
+    2023-05-15T08:00:00.123456+00:00 web1 kernel: eth0: link up
+    """
+
+    INTERN_FIELDS = ('priority', 'host', 'program', 'pid')
+
+    SYSLOG_PATTERN = r'^(?:<(?P<priority>\d{1,3})>)?(?P<time>[A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}|\d{4}-\d{2}-\d{2}T\S+) (?P<host>\S+) (?P<program>[^\s\[:]+)(?:\[(?P<pid>\d+)\])?: (?P<message>.*)$'
+
+    def __init__(self):
+        super().__init__(self.SYSLOG_PATTERN)
+
+
+class JsonLinesParser(BaseLogParser):
+    """
+    One JSON object per line, as written by most application loggers. Decoding
+    uses the C json decoder, with no regex involved. Top-level scalar values keep
+    their JSON types; nested objects and arrays are kept as JSON strings, so every
+    value can go into a flat row (CSV, columnar batches).
+    """
+
+    def __init__(self):
+        self._decode = json.JSONDecoder().decode
+
+    def parse_line(self, line: str) -> Optional[Dict[str, Any]]:
+        if not line.startswith('{'):
+            return None
+        try:
+            record = self._decode(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+        for key, value in record.items():
+            if isinstance(value, (dict, list)):
+                record[key] = json.dumps(value, separators=(',', ':'))
+        return record
@@ -0,0 +1,140 @@
+"""
+Bulk readers for log files.
+
+Files are read through large buffers (or memory-mapped) and decoded lazily.
+gzip, bz2 and xz input is streamed through the standard library and zstd through
+the optional `zstandard` package, detected by magic bytes rather than by file
+extension, so compressed archives never need a temporary decompressed copy.
+
+Note: for line-at-a-time consumers, CPython's C text-mode line iterator over a
+large buffer beats splitting decoded blocks in Python, so iter_lines uses it for
+the non-mmap path; iter_blocks is for consumers that work on whole blocks.
+"""
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import re
+from typing import BinaryIO, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+_MAGIC_BYTES = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'BZh', 'bz2'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+]
+
+# access.log, access.log.1, access.log.2.gz, app.log.xz, ...
+_LOG_FILENAME = re.compile(r'\.log(\.\d+)?(\.(gz|xz|bz2|zst))?$')
+
+
+def is_log_filename(name: str) -> bool:
+    """True for plain and rotated/compressed log file names."""
+    return bool(_LOG_FILENAME.search(name))
+
+
+def detect_compression(filepath: str) -> Optional[str]:
+    """Returns 'gzip', 'xz', 'bz2' or 'zstd' based on the file's magic bytes, or None."""
+    with open(filepath, 'rb') as f:
+        head = f.read(6)
+    for magic, name in _MAGIC_BYTES:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_binary(filepath: str) -> BinaryIO:
+    """Opens a log file for binary reading, transparently decompressing it if needed."""
+    compression = detect_compression(filepath)
+    if compression is None:
+        return open(filepath, 'rb')
+    if compression == 'gzip':
+        return gzip.open(filepath, 'rb')
+    if compression == 'xz':
+        return lzma.open(filepath, 'rb')
+    if compression == 'bz2':
+        return bz2.open(filepath, 'rb')
+    if zstandard is None:
+        raise RuntimeError(f"{filepath} is zstd-compressed; install the 'zstandard' package to read it")
+    return zstandard.open(filepath, 'rb')
+
+
+def open_text(filepath: str, block_size: int = DEFAULT_BLOCK_SIZE, encoding: str = 'utf-8') -> io.TextIOBase:
+    """
+    Opens a (possibly compressed) log file as buffered text; undecodable bytes are replaced.
+    Lines end at '\n' only, as in the byte-range (--workers) and mmap readers; a
+    bare '\r' stays part of its line.
+    """
+    if detect_compression(filepath) is None:
+        return open(filepath, 'r', encoding=encoding, errors='replace', buffering=block_size, newline='\n')
+    return io.TextIOWrapper(io.BufferedReader(open_binary(filepath), block_size),
+                            encoding=encoding, errors='replace', newline='\n')
+
+
+def _iter_blocks(f: BinaryIO, block_size: int) -> Iterator[bytes]:
+    """Yields newline-aligned blocks; the final block may lack a trailing newline."""
+    leftover = b''
+    while True:
+        block = f.read(block_size)
+        if not block:
+            break
+        cut = block.rfind(b'\n') + 1
+        if cut == 0:
+            leftover += block
+            continue
+        yield leftover + block[:cut]
+        leftover = block[cut:]
+    if leftover:
+        yield leftover
+
+
+def _iter_mmap_blocks(filepath: str, block_size: int) -> Iterator[bytes]:
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size, pos = len(mm), 0
+            while pos < size:
+                end = mm.find(b'\n', min(pos + block_size, size) - 1)
+                end = size if end < 0 else end + 1
+                yield mm[pos:end]
+                pos = end
+
+
+def iter_blocks(filepath: str, block_size: int = DEFAULT_BLOCK_SIZE,
+                use_mmap: bool = False) -> Iterator[bytes]:
+    """
+    Yields the (decompressed) contents of a log file in newline-aligned blocks of
+    roughly block_size bytes. use_mmap memory-maps plain files instead of reading them.
+    """
+    if use_mmap and detect_compression(filepath) is None:
+        yield from _iter_mmap_blocks(filepath, block_size)
+        return
+    with open_binary(filepath) as f:
+        yield from _iter_blocks(f, block_size)
+
+
+def iter_lines(filepath: str, block_size: int = DEFAULT_BLOCK_SIZE,
+               use_mmap: bool = False, encoding: str = 'utf-8') -> Iterator[str]:
+    """Yields stripped text lines from a (possibly compressed) log file."""
+    if use_mmap and detect_compression(filepath) is None:
+        for block in _iter_mmap_blocks(filepath, block_size):
+            lines = block.decode(encoding, errors='replace').split('\n')
+            if block.endswith(b'\n'):
+                lines.pop()  # Nothing after the final newline
+            for line in lines:
+                yield line.strip()
+        return
+
+    with open_text(filepath, block_size, encoding) as f:
+        for line in f:
+            yield line.strip()
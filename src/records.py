@@ -0,0 +1,210 @@
+"""
+Typed log records.
+
+A parser's typed mode (parse_file(..., typed=True)) yields LogRecord objects
+instead of dicts: one __slots__ class per field layout, with values converted
+according to the parser's FIELD_TYPES ('int' -> int, 'timestamp' -> an aware
+datetime) and low-cardinality fields (the parser's INTERN_FIELDS) interned, so
+a million records share one '200', one 'GET' and one copy of each user agent.
+
+A record costs a fixed-size object instead of a dict and a fresh string per
+field. See benchmarks/bench_records.py for the numbers.
+
+LogRecord is a read-only Mapping, so code written for parsed dicts (record['ip'],
+record.get('status'), 'url' in record, .items()) works unchanged; to_dict() and
+json_default() cover what needs a real dict, such as the JSON encoders.
+"""
+import keyword
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from src.timeutils import parse_nginx_time
+
+# Distinct values remembered per interned field; past this, new values are kept as they are
+MAX_INTERNED_VALUES = 65536
+
+
+class RecordFieldError(ValueError):
+    """Raised for field names (e.g. a custom regex's groups) that cannot be record attributes."""
+
+
+class LogRecord(Mapping):
+    """Base class of the generated record types; FIELDS lists the slots in order."""
+
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+    _FIELD_SET: frozenset = frozenset()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._FIELD_SET
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self._FIELD_SET else default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def to_tuple(self) -> Tuple[Any, ...]:
+        """The values in FIELDS order."""
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS)
+        return f"{type(self).__name__}({values})"
+
+    def __reduce__(self):
+        return _rebuild, (self.FIELDS, tuple(getattr(self, field) for field in self.FIELDS))
+
+
+@lru_cache(maxsize=None)
+def record_type(fields: Tuple[str, ...]) -> type:
+    """The LogRecord subclass with these fields (one class per field layout)."""
+    # Keywords cannot be parameter names in the generated code, '_self' is its own
+    # parameter, and '__x' slots would be name-mangled
+    clashes = [field for field in fields if not field.isidentifier() or keyword.iskeyword(field)
+               or field == "_self" or field.startswith("__") or hasattr(LogRecord, field)]
+    if clashes:
+        raise RecordFieldError(f"Field names {clashes} cannot be used as typed record attributes")
+
+    # Generated like namedtuple's, so construction is one call with plain assignments,
+    # and the exporters' to_dict()/to_tuple() are one expression instead of a loop
+    namespace: Dict[str, Any] = {}
+    attributes = ", ".join(f"_self.{field}" for field in fields)
+    exec(f"def __init__(_self, {', '.join(fields)}):\n" +
+         ("".join(f"    _self.{field} = {field}\n" for field in fields) or "    pass\n") +
+         "def to_dict(_self):\n    return {" + ", ".join(f"{field!r}: _self.{field}" for field in fields) + "}\n" +
+         f"def to_tuple(_self):\n    return ({attributes}{',' if fields else ''})\n", namespace)
+
+    return type("LogRecord_" + "_".join(fields), (LogRecord,), {
+        "__slots__": fields,
+        "__init__": namespace["__init__"],
+        "to_dict": namespace["to_dict"],
+        "to_tuple": namespace["to_tuple"],
+        "__module__": __name__,
+        "FIELDS": fields,
+        "_FIELD_SET": frozenset(fields),
+    })
+
+
+def _rebuild(fields: Tuple[str, ...], values: Tuple[Any, ...]) -> LogRecord:
+    # Record classes are generated, so pickling goes through their field layout
+    return record_type(fields)(*values)
+
+
+def json_default(value: Any) -> Any:
+    """`default=` hook for json.dump(s): records become dicts and datetimes ISO 8601 strings."""
+    if isinstance(value, LogRecord):
+        return value.to_dict()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def cached_json_default() -> Callable[[Any], Any]:
+    """
+    json_default for one export: neighbouring records share their time object,
+    so the ISO 8601 string of the last datetime is reused.
+    """
+    last_time, last_iso = None, None
+
+    def default(value: Any) -> Any:
+        nonlocal last_time, last_iso
+        if isinstance(value, datetime):
+            if value is not last_time:
+                last_time, last_iso = value, value.isoformat()
+            return last_iso
+        return json_default(value)
+    return default
+
+
+@lru_cache(maxsize=64)
+def _tz(offset: str) -> timezone:
+    seconds = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+    return timezone(timedelta(seconds=-seconds if offset[0] == '-' else seconds))
+
+
+def _interner(convert: Optional[Callable[[str], Any]] = None) -> Callable[[Any], Any]:
+    """A function mapping equal raw values to one shared (optionally converted) object."""
+    table: Dict[Any, Any] = {}
+
+    def intern(value: Any) -> Any:
+        shared = table.get(value)
+        if shared is None and value is not None:
+            shared = convert(value) if convert else value
+            if len(table) < MAX_INTERNED_VALUES:
+                table[value] = shared
+        return shared
+    return intern
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None  # e.g. '-' for an empty response body
+
+
+def _to_datetime(value: str) -> Optional[datetime]:
+    epoch = parse_nginx_time(value)
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, _tz(value[-5:]) if value[-5:-4] in '+-' else timezone.utc)
+
+
+def _timestamp_converter() -> Callable[[Any], Any]:
+    # Lines come in time order, so consecutive records usually share their timestamp
+    last_value, last_result = None, None
+
+    def convert(value: Any) -> Optional[datetime]:
+        nonlocal last_value, last_result
+        if value != last_value:
+            last_value, last_result = value, (_to_datetime(value) if value else None)
+        return last_result
+    return convert
+
+
+class RecordConverter:
+    """Turns parsed dicts with a known set of fields into typed records."""
+
+    def __init__(self, fields: Iterable[str], field_types: Optional[Dict[str, str]] = None,
+                 intern_fields: Iterable[str] = ()):
+        self.fields = tuple(fields)
+        self.record_type = record_type(self.fields)
+        field_types = field_types or {}
+        intern_fields = set(intern_fields)
+
+        converters = []
+        for field in self.fields:
+            kind = field_types.get(field)
+            if kind == 'int':
+                # Interning ints too: only -5..256 are shared by CPython itself
+                converters.append(_interner(_to_int) if field in intern_fields else _to_int)
+            elif kind == 'timestamp':
+                converters.append(_timestamp_converter())
+            elif field in intern_fields:
+                converters.append(_interner())
+            else:
+                converters.append(None)
+        self._converters = converters
+
+    def convert(self, record: Dict[str, Any]) -> LogRecord:
+        get = record.get
+        return self.record_type(*[get(field) if convert is None else convert(get(field))
+                                  for field, convert in zip(self.fields, self._converters)])
+
+    def convert_all(self, records: Iterator[Dict[str, Any]]) -> Iterator[LogRecord]:
+        convert = self.convert
+        for record in records:
+            yield convert(record)
@@ -0,0 +1,135 @@
+"""
+Time-bucketed rollups for capacity planning.
+
+Each TimeRollup groups records into fixed buckets (e.g. per minute or per hour)
+keyed by epoch seconds, tracking request count, bytes sent, counts per status
+class and bounded-memory percentile sketches of response size and, when the
+log has a request_time field, request latency.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from src.sketches import QuantileSketch
+
+# Buckets per rollup sketch; ~1% accuracy needs far fewer for real size/latency ranges
+ROLLUP_SKETCH_MAX_BUCKETS = 512
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def _new_sketch() -> QuantileSketch:
+    return QuantileSketch(max_buckets=ROLLUP_SKETCH_MAX_BUCKETS)
+
+
+class RollupBucket:
+    """Aggregates for one time bucket."""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.status_classes = Counter()
+        self.sizes = _new_sketch()
+        self.request_times: Optional[QuantileSketch] = None
+
+    def add(self, status: Optional[int], size: int, request_time: Optional[float]):
+        self.requests += 1
+        self.bytes += size
+        if status is not None:
+            self.status_classes[f"{status // 100}xx"] += 1
+        self.sizes.add(size)
+        if request_time is not None:
+            if self.request_times is None:
+                self.request_times = _new_sketch()
+            self.request_times.add(request_time)
+
+    @property
+    def error_rate(self) -> float:
+        """Share of requests answered with a 4xx or 5xx status."""
+        if not self.requests:
+            return 0.0
+        return (self.status_classes["4xx"] + self.status_classes["5xx"]) / self.requests
+
+    def merge(self, other: "RollupBucket"):
+        self.requests += other.requests
+        self.bytes += other.bytes
+        self.status_classes.update(other.status_classes)
+        self.sizes.merge(other.sizes)
+        if other.request_times is not None:
+            if self.request_times is None:
+                self.request_times = _new_sketch()
+            self.request_times.merge(other.request_times)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "status_classes": dict(self.status_classes),
+            "sizes": self.sizes.to_dict(),
+            "request_times": self.request_times.to_dict() if self.request_times else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RollupBucket":
+        bucket = cls()
+        bucket.requests = data["requests"]
+        bucket.bytes = data["bytes"]
+        bucket.status_classes = Counter(data["status_classes"])
+        bucket.sizes = QuantileSketch.from_dict(data["sizes"])
+        if data["request_times"]:
+            bucket.request_times = QuantileSketch.from_dict(data["request_times"])
+        return bucket
+
+
+class TimeRollup:
+    """Per-bucket aggregates over fixed windows of bucket_seconds (60 = per minute)."""
+
+    def __init__(self, bucket_seconds: int):
+        self.bucket_seconds = bucket_seconds
+        self.buckets: Dict[int, RollupBucket] = {}
+
+    def add(self, epoch: int, status: Optional[int], size: int, request_time: Optional[float] = None):
+        start = epoch - epoch % self.bucket_seconds
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = RollupBucket()
+        bucket.add(status, size, request_time)
+
+    def merge(self, other: "TimeRollup") -> "TimeRollup":
+        for start, bucket in other.buckets.items():
+            if start in self.buckets:
+                self.buckets[start].merge(bucket)
+            else:
+                self.buckets[start] = RollupBucket.from_dict(bucket.to_dict())
+        return self
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """One summary dict per bucket, in time order."""
+        rows = []
+        for start in sorted(self.buckets):
+            bucket = self.buckets[start]
+            row = {
+                "bucket_start": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+                "requests": bucket.requests,
+                "bytes": bucket.bytes,
+                "status_classes": dict(bucket.status_classes),
+                "error_rate": round(bucket.error_rate, 4),
+            }
+            for q in PERCENTILES:
+                row[f"size_p{int(q * 100)}"] = bucket.sizes.quantile(q)
+            if bucket.request_times is not None:
+                for q in PERCENTILES:
+                    row[f"request_time_p{int(q * 100)}"] = bucket.request_times.quantile(q)
+            rows.append(row)
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "buckets": {str(start): bucket.to_dict() for start, bucket in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TimeRollup":
+        rollup = cls(data["bucket_seconds"])
+        rollup.buckets = {int(start): RollupBucket.from_dict(bucket) for start, bucket in data["buckets"].items()}
+        return rollup
@@ -0,0 +1,238 @@
+"""
+Sampling mode: estimated stats for a first look at very large files.
+
+A plain file is cut into fixed-size byte blocks, and each block owns the lines
+that start inside it, so the blocks partition the file's lines exactly.
+BlockSampler reads blocks in a random order (sampling without replacement). Every
+count is estimated as N/n times its sum over the n blocks read so far (out of
+N). A 95% confidence interval comes from the spread of the per-block counts,
+with the finite population correction, so it narrows as more blocks are read.
+Once every block has been read, the estimate is the exact answer. refine() and
+progressive() continue the same sample rather than starting over.
+
+Compressed files cannot be read at random offsets. For them (and for any other
+stream), reservoir_sample() keeps a uniform fixed-size sample of the records in
+one pass.
+"""
+import math
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from src.parser import BaseLogParser
+from src.readers import detect_compression
+
+# Bytes per sampling block: small enough for many blocks (tight intervals), large enough to read efficiently
+SAMPLE_BLOCK_SIZE = 256 * 1024
+
+# z for a two-sided 95% confidence interval
+CONFIDENCE_Z = 1.96
+
+# Fields whose per-value counts are estimated
+SAMPLED_FIELDS = ('status', 'method', 'ip')
+
+
+def _line_start_at_or_after(f: BinaryIO, offset: int) -> int:
+    """Offset of the first line starting at or after offset."""
+    if offset == 0:
+        return 0
+    f.seek(offset - 1)
+    if f.read(1) != b'\n':
+        f.readline()  # offset is mid-line; that line belongs to an earlier block
+    return f.tell()
+
+
+class Estimate:
+    """An estimated count with its 95% confidence interval (high is None until two blocks are read)."""
+
+    __slots__ = ('value', 'low', 'high')
+
+    def __init__(self, value: float, low: float, high: Optional[float]):
+        self.value = value
+        self.low = low
+        self.high = high
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": round(self.value), "ci95": [round(self.low), None if self.high is None else round(self.high)]}
+
+
+class BlockSampler:
+    """
+    Estimates the stats of one plain (uncompressed) file from a random sample of
+    its blocks. With keep_records, the parsed records of the blocks read so far
+    are kept in self.records, e.g. to chart a sample of the file.
+    """
+
+    def __init__(self, filepath: str, log_parser: BaseLogParser, block_size: int = SAMPLE_BLOCK_SIZE,
+                 seed: Optional[int] = None, keep_records: bool = False):
+        if detect_compression(filepath):
+            raise ValueError(f"{filepath} is compressed and cannot be sampled by offset; use reservoir_sample()")
+        self.filepath = filepath
+        self.log_parser = log_parser
+        self.block_size = block_size
+        self.file_size = os.path.getsize(filepath)
+        self.num_blocks = max(1, math.ceil(self.file_size / block_size))
+        self._order = list(range(self.num_blocks))
+        random.Random(seed).shuffle(self._order)
+
+        self.blocks_read = 0
+        self.bytes_read = 0
+        self.seconds = 0.0
+        self.records: Optional[List[Dict[str, Any]]] = [] if keep_records else None
+        # Sum and sum of squares of the per-block counts, for the totals and each field value
+        self._requests = [0, 0]
+        self._sums = {field: Counter() for field in SAMPLED_FIELDS}
+        self._squares = {field: Counter() for field in SAMPLED_FIELDS}
+
+    @property
+    def exact(self) -> bool:
+        return self.blocks_read >= self.num_blocks
+
+    @property
+    def fraction(self) -> float:
+        return self.blocks_read / self.num_blocks
+
+    def _read_block(self, f: BinaryIO, index: int):
+        start = _line_start_at_or_after(f, index * self.block_size)
+        end = min((index + 1) * self.block_size, self.file_size)
+        parse_line = self.log_parser.parse_line
+        requests, counts = 0, {field: Counter() for field in SAMPLED_FIELDS}
+
+        f.seek(start)
+        pos = start
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            parsed = parse_line(raw.decode('utf-8', errors='replace').strip())
+            if not parsed:
+                continue
+            requests += 1
+            for field, field_counts in counts.items():
+                if field in parsed:
+                    field_counts[parsed[field]] += 1
+            if self.records is not None:
+                self.records.append(parsed)
+
+        self.bytes_read += max(pos - start, 0)
+        self._requests[0] += requests
+        self._requests[1] += requests * requests
+        for field, field_counts in counts.items():
+            sums, squares = self._sums[field], self._squares[field]
+            for value, count in field_counts.items():
+                sums[value] += count
+                squares[value] += count * count
+
+    def refine(self, fraction: float) -> "BlockSampler":
+        """Reads random blocks until at least `fraction` of them (0 < fraction <= 1) have been read."""
+        target = min(self.num_blocks, max(1, math.ceil(fraction * self.num_blocks)))
+        if self.blocks_read >= target:
+            return self
+        started = time.perf_counter()
+        with open(self.filepath, 'rb') as f:
+            while self.blocks_read < target:
+                self._read_block(f, self._order[self.blocks_read])
+                self.blocks_read += 1
+        self.seconds += time.perf_counter() - started
+        return self
+
+    def progressive(self, start_fraction: float = 0.01, factor: float = 2.0) -> Iterator["BlockSampler"]:
+        """Yields self after reading start_fraction of the blocks, then factor times more each step, until exact."""
+        fraction = start_fraction
+        while True:
+            yield self.refine(fraction)
+            if self.exact:
+                return
+            fraction *= factor
+
+    def _expand(self, total: int, squares: int) -> Estimate:
+        n, big_n = self.blocks_read, self.num_blocks
+        if n == 0:
+            return Estimate(0, 0, None)
+        if n >= big_n:
+            return Estimate(total, total, total)
+        value = big_n * total / n
+        if n < 2:
+            return Estimate(value, total, None)
+        variance = max(squares - total * total / n, 0) / (n - 1)
+        half_width = CONFIDENCE_Z * big_n * math.sqrt((1 - n / big_n) * variance / n)
+        # What the sample saw is a hard lower bound
+        return Estimate(value, max(total, value - half_width), value + half_width)
+
+    def estimate(self, field: Optional[str] = None) -> Any:
+        """The estimated total requests, or {value: Estimate} for one of SAMPLED_FIELDS."""
+        if field is None:
+            return self._expand(*self._requests)
+        squares = self._squares[field]
+        return {value: self._expand(total, squares[value]) for value, total in self._sums[field].items()}
+
+    def summary(self, top_n: int = 10) -> Dict[str, Any]:
+        """The dashboard stats payload (see summarize_stats) with estimates, intervals and sample progress."""
+        def ranked(field: str, name: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+            estimates = sorted(self.estimate(field).items(), key=lambda item: item[1].value, reverse=True)
+            return [{name: value, **estimate.to_dict()} for value, estimate in estimates[:limit]]
+
+        total = self.estimate()
+        return {
+            "total_requests": round(total.value),
+            "total_requests_ci95": total.to_dict()["ci95"],
+            "ip_addresses": ranked('ip', 'ip', top_n),
+            "status_codes": ranked('status', 'status'),
+            "methods": ranked('method', 'method'),
+            "sample": {
+                "fraction": self.fraction,
+                "blocks_read": self.blocks_read,
+                "num_blocks": self.num_blocks,
+                "bytes_read": self.bytes_read,
+                "seconds": round(self.seconds, 3),
+                "exact": self.exact,
+            },
+        }
+
+
+def _uniform(rng: random.Random) -> float:
+    # In (0, 1): logarithms are taken of it
+    value = rng.random()
+    while value == 0.0:
+        value = rng.random()
+    return value
+
+
+def reservoir_sample(records: Iterable[Dict[str, Any]], k: int,
+                     seed: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    A uniform random sample of k records from a stream of unknown length, in one
+    pass and O(k) memory (Algorithm L). Returns (sample, number of records seen);
+    the sample keeps the stream's order.
+    """
+    rng = random.Random(seed)
+    iterator = iter(records)
+    if k <= 0:
+        return [], sum(1 for _ in iterator)
+    reservoir: List[Tuple[int, Dict[str, Any]]] = []
+    for seen, record in enumerate(iterator):
+        reservoir.append((seen, record))
+        if len(reservoir) == k:
+            break
+    if len(reservoir) < k:
+        return [record for _, record in reservoir], len(reservoir)
+
+    # Skip ahead geometrically instead of drawing a random number per record
+    seen = k
+    w = math.exp(math.log(_uniform(rng)) / k)
+    while True:
+        skip = math.floor(math.log(_uniform(rng)) / math.log(1 - w))
+        record = None
+        for record in iterator:
+            seen += 1
+            if skip == 0:
+                break
+            skip -= 1
+        else:
+            break
+        reservoir[rng.randrange(k)] = (seen - 1, record)
+        w *= math.exp(math.log(_uniform(rng)) / k)
+    reservoir.sort(key=lambda item: item[0])
+    return [record for _, record in reservoir], seen
@@ -0,0 +1,273 @@
+"""
+Fixed-memory approximate counters used by LogStatsCollector's approximate and rollup modes.
+
+- SpaceSaving tracks the top-k heavy hitters of a stream with at most
+  `capacity` counters. Every key whose true count exceeds N / capacity
+  (N = total items seen) is guaranteed to be tracked, and each reported
+  count overestimates the true count by at most N / capacity.
+- HyperLogLog estimates the number of distinct keys using 2**precision
+  one-byte registers, with a standard error of about 1.04 / sqrt(2**precision)
+  (0.81% at the default precision of 14, using 16 KB).
+- QuantileSketch estimates percentiles (p50/p95/p99) within 1% relative error
+  using a bounded number of log-spaced buckets.
+
+All are mergeable and serializable so they work with partial aggregates.
+"""
+import base64
+import hashlib
+import heapq
+import math
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+def _hash64(key: Any) -> int:
+    """Stable 64-bit hash (unlike hash(), identical across processes and hosts)."""
+    return int.from_bytes(hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitter sketch with a Counter-like read API."""
+
+    def __init__(self, capacity: int = 1000):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        # Lazy min-heap of (count, key); entries whose count is stale are skipped
+        self._heap: List[Tuple[int, Hashable]] = []
+
+    def add(self, key: Hashable, count: int = 1):
+        """Records `count` occurrences of key."""
+        self.total += count
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+        else:
+            # Replace the current minimum; the new key inherits its count as error
+            min_key, min_count = self._pop_min()
+            del counts[min_key]
+            del self.errors[min_key]
+            counts[key] = min_count + count
+            self.errors[key] = min_count
+        heapq.heappush(self._heap, (counts[key], key))
+
+        # Stale entries accumulate on every increment; rebuild periodically
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def _pop_min(self) -> Tuple[Hashable, int]:
+        heap = self._heap
+        while heap:
+            count, key = heapq.heappop(heap)
+            if self.counts.get(key) == count:
+                return key, count
+        self._rebuild_heap()
+        return self._pop_min()
+
+    def _rebuild_heap(self):
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def min_count(self) -> int:
+        """Smallest tracked count, i.e. the most an untracked key could have been seen."""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def __getitem__(self, key: Hashable) -> int:
+        return self.counts.get(key, 0)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.counts
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        """Returns (key, estimated_count) pairs, highest first, like Counter.most_common."""
+        items = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)
+        return items if n is None else items[:n]
+
+    def error(self, key: Hashable) -> int:
+        """Upper bound on how much the count of key is overestimated."""
+        return self.errors.get(key, 0)
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Combines another sketch into this one (in place) and returns self."""
+        self_min, other_min = self.min_count(), other.min_count()
+        counts: Dict[Hashable, int] = {}
+        errors: Dict[Hashable, int] = {}
+        for key in set(self.counts) | set(other.counts):
+            # A key missing from a full sketch may have been seen up to its min count
+            counts[key] = self.counts.get(key, self_min) + other.counts.get(key, other_min)
+            errors[key] = self.errors.get(key, self_min) + other.errors.get(key, other_min)
+
+        top = heapq.nlargest(self.capacity, counts.items(), key=lambda kv: kv[1])
+        self.counts = dict(top)
+        self.errors = {key: errors[key] for key in self.counts}
+        self.total += other.total
+        self._rebuild_heap()
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "counts": [[key, count, self.errors[key]] for key, count in self.counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpaceSaving":
+        sketch = cls(data["capacity"])
+        sketch.total = data["total"]
+        for key, count, error in data["counts"]:
+            sketch.counts[key] = count
+            sketch.errors[key] = error
+        sketch._rebuild_heap()
+        return sketch
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count estimator."""
+
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+
+    def add(self, key: Any):
+        """Records one occurrence of key."""
+        h = _hash64(key)
+        index = h >> (64 - self.precision)
+        remainder = h & ((1 << (64 - self.precision)) - 1)
+        # Position of the leftmost 1-bit in the remaining (64 - p) bits
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        """Estimated number of distinct keys added."""
+        m = self.num_registers
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction: linear counting is more accurate here
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Combines another sketch into this one (in place) and returns self."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(bytes(self.registers)).decode('ascii'),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(data["precision"])
+        sketch.registers = bytearray(base64.b64decode(data["registers"]))
+        return sketch
+
+
+class QuantileSketch:
+    """
+    Streaming quantile sketch (DDSketch-style log-spaced buckets) for non-negative values.
+
+    Any quantile is returned with a relative error of at most relative_accuracy
+    (1% by default) as long as no more than max_buckets buckets are needed; beyond
+    that the lowest buckets are collapsed, which only affects the smallest values.
+    Memory is bounded by max_buckets regardless of how many values are added.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        if not math.isfinite(value):
+            return  # NaN and infinities have no bucket
+        self.count += count
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        """Folds the lowest buckets together so at most max_buckets remain."""
+        indexes = sorted(self.buckets)
+        excess = len(indexes) - self.max_buckets
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            self.buckets[target] += self.buckets.pop(index)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0..1), or None if the sketch is empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint (in relative terms) of the bucket (gamma^(i-1), gamma^i]
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Combines another sketch (with the same accuracy) into this one and returns self."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge quantile sketches with different accuracy")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "zero_count": self.zero_count,
+            "buckets": [[index, count] for index, count in self.buckets.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], data["max_buckets"])
+        sketch.zero_count = data["zero_count"]
+        sketch.buckets = {index: count for index, count in data["buckets"]}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
@@ -1,20 +1,109 @@
+import gzip
+import itertools
+import json
+import math
+import time
 from collections import Counter
-from typing import Iterator, Dict, Any, List
+from typing import Iterator, Dict, Any, List, Optional
+from src.sketches import SpaceSaving, HyperLogLog
+from src.batches import RecordBatch, DictionaryColumn, TIMESTAMP_NULL
+from src.rollups import TimeRollup
+from src.timeutils import to_epoch
+from src.metrics import metrics
+from src.records import LogRecord
+
+try:
+    import numpy as np
+except ImportError:  # Optional: batch stats fall back to Counter
+    np = None
+
+# Bumped whenever the on-disk partial-aggregate layout changes.
+AGGREGATE_FORMAT_VERSION = 1
+
+_MISSING = object()
+
+def _to_int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float_or_none(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None  # 'nan'/'inf' parse but cannot be ranked
+
 
 class LogStatsCollector:
-    """Collects and aggregates statistics from parsed log lines."""
+    """
+    Collects and aggregates statistics from parsed log lines.
+
+    With approximate=True, IP addresses are tracked with a fixed-memory
+    Space-Saving sketch of top_k counters instead of an unbounded Counter,
+    and distinct IPs/URLs are estimated with HyperLogLog. See src/sketches.py
+    for the error bounds.
+
+    With rollups=True, per-minute and per-hour rollups (requests, bytes, status
+    classes, size and request_time percentiles) are kept in self.rollups.
+
+    With alerts (an AlertEngine from src/alerts.py), every record is also run
+    through the alert rules on its way past. Alert state is not merged or saved.
+    """
+
+    # Rollup name -> bucket width in seconds
+    ROLLUP_BUCKETS = {"minute": 60, "hour": 3600}
     
-    def __init__(self):
+    def __init__(self, approximate: bool = False, top_k: int = 1000, hll_precision: int = 14,
+                 rollups: bool = False, alerts=None):
+        self.approximate = approximate
+        self.alerts = alerts
+        self.top_k = top_k
+        self.hll_precision = hll_precision
+        self.rollups: Dict[str, TimeRollup] = {}
+        if rollups:
+            self.rollups = {name: TimeRollup(seconds) for name, seconds in self.ROLLUP_BUCKETS.items()}
+
         self.total_requests = 0
         self.status_codes = Counter()
-        self.ip_addresses = Counter()
         self.methods = Counter()
+        if approximate:
+            self.ip_addresses = SpaceSaving(top_k)
+            self.distinct_ips = HyperLogLog(hll_precision)
+            self.distinct_urls = HyperLogLog(hll_precision)
+        else:
+            self.ip_addresses = Counter()
 
     def process_stream(self, data: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
         """
         Processes a stream of log dictionaries, updating stats,
         and yielding the item back so it can be passed to exporters.
         """
+        if metrics.enabled:
+            return self._process_stream_profiled(data)
+        return self._process_stream(data)
+
+    def _process_stream(self, data: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        if self.rollups:
+            data = self._track_rollups(data)
+        if self.alerts is not None:
+            data = self.alerts.process_stream(data)
+
+        data = iter(data)
+        first = next(data, _MISSING)
+        if first is _MISSING:
+            return
+        data = itertools.chain((first,), data)
+
+        if isinstance(first, LogRecord):
+            yield from self._process_records(data)
+            return
+        if self.approximate:
+            yield from self._process_stream_approximate(data)
+            return
+
         for item in data:
             self.total_requests += 1
             
@@ -29,10 +118,252 @@ class LogStatsCollector:
                 
             yield item
 
+    def _process_stream_profiled(self, data: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """process_stream with the updates timed as the 'stats' stage, one chunk at a time."""
+        for chunk in metrics.chunks(data):
+            started = time.perf_counter()
+            processed = list(self._process_stream(chunk))
+            metrics.add_time("stats", time.perf_counter() - started, len(processed))
+            yield from processed
+
+    def _track_rollups(self, data: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Feeds each record into the time rollups on its way through."""
+        rollups = list(self.rollups.values())
+        for item in data:
+            epoch = to_epoch(item.get('time'))
+            if epoch is not None:
+                status = _to_int_or_none(item.get('status'))
+                size = _to_int_or_none(item.get('size')) or 0
+                request_time = _to_float_or_none(item.get('request_time'))
+                for rollup in rollups:
+                    rollup.add(epoch, status, size, request_time)
+            yield item
+
+    def _process_stream_approximate(self, data: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Same as process_stream, but feeding the fixed-memory sketches."""
+        for item in data:
+            self.total_requests += 1
+
+            if 'status' in item:
+                self.status_codes[item['status']] += 1
+            if 'ip' in item:
+                self.ip_addresses.add(item['ip'])
+                self.distinct_ips.add(item['ip'])
+            if 'url' in item:
+                self.distinct_urls.add(item['url'])
+            if 'method' in item:
+                self.methods[item['method']] += 1
+
+            yield item
+
+    def _process_records(self, data: Iterator[LogRecord]) -> Iterator[LogRecord]:
+        """
+        process_stream for typed records (parse_file(typed=True)): fields are read as
+        attributes, and int statuses are counted under their str form so reports,
+        saved aggregates and merges look the same as with dict records.
+        """
+        approximate = self.approximate
+        status_keys: Dict[int, str] = {}
+        record_class, lookup = None, None
+        for item in data:
+            if item.__class__ is not record_class:
+                # Records are slots objects; a plain dict can show up from a format without a typed mode
+                record_class = item.__class__
+                lookup = getattr if issubclass(record_class, LogRecord) else record_class.get
+            self.total_requests += 1
+
+            status = lookup(item, 'status', _MISSING)
+            if status is not _MISSING:
+                if status.__class__ is int:
+                    key = status_keys.get(status)
+                    if key is None:
+                        key = status_keys[status] = str(status)
+                    status = key
+                self.status_codes[status] += 1
+            ip = lookup(item, 'ip', _MISSING)
+            if ip is not _MISSING:
+                if approximate:
+                    self.ip_addresses.add(ip)
+                    self.distinct_ips.add(ip)
+                else:
+                    self.ip_addresses[ip] += 1
+            if approximate:
+                url = lookup(item, 'url', _MISSING)
+                if url is not _MISSING:
+                    self.distinct_urls.add(url)
+            method = lookup(item, 'method', _MISSING)
+            if method is not _MISSING:
+                self.methods[method] += 1
+
+            yield item
+
+    def process_batches(self, batches: Iterator[RecordBatch]) -> Iterator[RecordBatch]:
+        """Columnar counterpart of process_stream for RecordBatch input."""
+        for batch in batches:
+            if metrics.enabled:
+                started = time.perf_counter()
+                self.update_from_batch(batch)
+                metrics.add_time("stats", time.perf_counter() - started, len(batch))
+            else:
+                self.update_from_batch(batch)
+            yield batch
+
+    @staticmethod
+    def _column_counts(batch: RecordBatch, name: str) -> Dict[Any, int]:
+        """
+        Counts the values of one column, keyed the same way process_stream would key them.
+        Uses NumPy bincount/unique over the raw buffers when available.
+        """
+        column = batch.columns.get(name)
+        if column is None or len(column) == 0:
+            return {}
+
+        if isinstance(column, DictionaryColumn):
+            values = column.values
+            if np is None:
+                return {values[code]: count for code, count in Counter(column.codes).items() if code >= 0}
+            codes = np.frombuffer(column.codes, dtype=np.int32)
+            counts = np.bincount(codes[codes >= 0], minlength=len(values))
+            present = np.flatnonzero(counts)
+            return {values[code]: count for code, count in zip(present.tolist(), counts[present].tolist())}
+
+        # Typed integer columns are keyed by their string form, like the parsed dicts
+        if np is None:
+            return {str(value): count for value, count in Counter(column).items()}
+        uniques, counts = np.unique(np.frombuffer(column, dtype=np.int64), return_counts=True)
+        return {str(value): count for value, count in zip(uniques.tolist(), counts.tolist())}
+
+    def update_from_batch(self, batch: RecordBatch):
+        """Adds every row of a RecordBatch to the statistics."""
+        self.total_requests += batch.num_rows
+        self.status_codes.update(self._column_counts(batch, 'status'))
+        self.methods.update(self._column_counts(batch, 'method'))
+
+        ip_counts = self._column_counts(batch, 'ip')
+        if self.approximate:
+            for ip, count in ip_counts.items():
+                self.ip_addresses.add(ip, count)
+                self.distinct_ips.add(ip)
+            for url in self._column_counts(batch, 'url'):
+                self.distinct_urls.add(url)
+        else:
+            self.ip_addresses.update(ip_counts)
+
+        if self.rollups:
+            self._update_rollups_from_batch(batch)
+
+    def _update_rollups_from_batch(self, batch: RecordBatch):
+        times = batch.columns.get('time')
+        if times is None:
+            return
+        rollups = list(self.rollups.values())
+        num_rows = batch.num_rows
+        statuses = batch.column_values('status') if 'status' in batch.columns else [None] * num_rows
+        sizes = batch.column_values('size') if 'size' in batch.columns else [0] * num_rows
+        request_times = (batch.column_values('request_time') if 'request_time' in batch.columns
+                         else [None] * num_rows)
+
+        for epoch, status, size, request_time in zip(times, statuses, sizes, request_times):
+            if epoch == TIMESTAMP_NULL:
+                continue
+            status, size = _to_int_or_none(status), _to_int_or_none(size) or 0
+            for rollup in rollups:
+                rollup.add(epoch, status, size, _to_float_or_none(request_time))
+
+    def _new_empty(self) -> "LogStatsCollector":
+        """Returns an empty collector configured like this one."""
+        return LogStatsCollector(approximate=self.approximate, top_k=self.top_k,
+                                 hll_precision=self.hll_precision, rollups=bool(self.rollups))
+
+    def merge(self, other: "LogStatsCollector") -> "LogStatsCollector":
+        """Folds another collector's counts into this one (in place) and returns self."""
+        if other.approximate != self.approximate:
+            raise ValueError("Cannot merge exact and approximate collectors")
+
+        self.total_requests += other.total_requests
+        self.status_codes.update(other.status_codes)
+        self.methods.update(other.methods)
+        if self.approximate:
+            self.ip_addresses.merge(other.ip_addresses)
+            self.distinct_ips.merge(other.distinct_ips)
+            self.distinct_urls.merge(other.distinct_urls)
+        else:
+            self.ip_addresses.update(other.ip_addresses)
+        for name, rollup in other.rollups.items():
+            if name in self.rollups:
+                self.rollups[name].merge(rollup)
+            else:
+                self.rollups[name] = TimeRollup.from_dict(rollup.to_dict())
+        return self
+
+    def __add__(self, other: "LogStatsCollector") -> "LogStatsCollector":
+        combined = self._new_empty()
+        combined.merge(self)
+        combined.merge(other)
+        return combined
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializes the collected counts as a JSON-compatible partial aggregate."""
+        data = {
+            "version": AGGREGATE_FORMAT_VERSION,
+            "approximate": self.approximate,
+            "total_requests": self.total_requests,
+            "status_codes": dict(self.status_codes),
+            "methods": dict(self.methods),
+        }
+        if self.approximate:
+            data["ip_addresses"] = self.ip_addresses.to_dict()
+            data["distinct_ips"] = self.distinct_ips.to_dict()
+            data["distinct_urls"] = self.distinct_urls.to_dict()
+        else:
+            data["ip_addresses"] = dict(self.ip_addresses)
+        if self.rollups:
+            data["rollups"] = {name: rollup.to_dict() for name, rollup in self.rollups.items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LogStatsCollector":
+        """Rebuilds a collector from the output of to_dict()."""
+        version = data.get("version")
+        if version != AGGREGATE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported aggregate format version: {version}")
+
+        if data.get("approximate"):
+            ip_sketch = SpaceSaving.from_dict(data["ip_addresses"])
+            distinct_ips = HyperLogLog.from_dict(data["distinct_ips"])
+            collector = cls(approximate=True, top_k=ip_sketch.capacity,
+                            hll_precision=distinct_ips.precision)
+            collector.ip_addresses = ip_sketch
+            collector.distinct_ips = distinct_ips
+            collector.distinct_urls = HyperLogLog.from_dict(data["distinct_urls"])
+        else:
+            collector = cls()
+            collector.ip_addresses = Counter(data["ip_addresses"])
+
+        collector.rollups = {name: TimeRollup.from_dict(rollup) for name, rollup in data.get("rollups", {}).items()}
+        collector.total_requests = data["total_requests"]
+        collector.status_codes = Counter(data["status_codes"])
+        collector.methods = Counter(data["methods"])
+        return collector
+
+    def save(self, filepath: str):
+        """Writes a compact (gzip-compressed JSON) partial-aggregate file, e.g. node1.agg."""
+        with gzip.open(filepath, 'wt', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, filepath: str) -> "LogStatsCollector":
+        """Reads a partial-aggregate file written by save()."""
+        with gzip.open(filepath, 'rt', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
     def print_report(self):
         """Prints a human-readable summary report to stdout."""
         print(f"--- Log Statistics Report ---")
         print(f"Total Requests Processed: {self.total_requests}")
+        if self.approximate:
+            print(f"Distinct IP Addresses (approx.): {self.distinct_ips.count()}")
+            print(f"Distinct URLs (approx.): {self.distinct_urls.count()}")
         
         print("\nTop 5 IP Addresses:")
         for ip, count in self.ip_addresses.most_common(5):
@@ -46,4 +377,11 @@ class LogStatsCollector:
         for method, count in self.methods.most_common():
             print(f"  {method}: {count}")
 
+        if "hour" in self.rollups:
+            print("\nHourly Rollups (UTC):")
+            for row in self.rollups["hour"].rows():
+                print(f"  {row['bucket_start']}: {row['requests']} reqs, {row['bytes']} bytes, "
+                      f"error rate {row['error_rate']:.1%}, size p50/p95/p99 "
+                      f"{row['size_p50']:.0f}/{row['size_p95']:.0f}/{row['size_p99']:.0f}")
+
         print("-----------------------------")
@@ -0,0 +1,66 @@
+import calendar
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+_MONTHS = {name: i for i, name in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1)}
+
+
+@lru_cache(maxsize=4096)
+def _minute_epoch(minute_prefix: str, tz_offset: str) -> int:
+    """Epoch seconds for 'dd/Mon/yyyy:HH:MM' in the given '+hhmm' offset (cached per minute)."""
+    day = int(minute_prefix[0:2])
+    month = _MONTHS[minute_prefix[3:6]]
+    year = int(minute_prefix[7:11])
+    hour = int(minute_prefix[12:14])
+    minute = int(minute_prefix[15:17])
+
+    offset = int(tz_offset[1:3]) * 3600 + int(tz_offset[3:5]) * 60
+    if tz_offset[0] == '-':
+        offset = -offset
+    return calendar.timegm((year, month, day, hour, minute, 0)) - offset
+
+
+def parse_nginx_time(value: Optional[str]) -> Optional[int]:
+    """
+    Converts an Nginx/Apache timestamp ('10/Oct/2000:13:55:36 -0700') to epoch seconds.
+    Log lines arrive in time order, so the expensive part is cached per minute and
+    only the seconds are parsed per call. Returns None if the value cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        if len(value) == 26 and value[17] == ':' and value[20] == ' ':
+            return _minute_epoch(value[:17], value[21:]) + int(value[18:20])
+        return int(datetime.strptime(value, '%d/%b/%Y:%H:%M:%S %z').timestamp())
+    except (ValueError, KeyError):
+        return None
+
+
+def parse_timestamp(value) -> Optional[int]:
+    """
+    Like to_epoch, but also accepts ISO 8601 strings (naive means UTC), as written
+    by JSON-lines logs and ISO syslog. Slower on non-Nginx strings; for lookups, not hot loops.
+    """
+    epoch = to_epoch(value)
+    if epoch is not None or not isinstance(value, str) or not value:
+        return epoch
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00') if value.endswith('Z') else value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def to_epoch(value) -> Optional[int]:
+    """Epoch seconds for an Nginx timestamp string, a datetime (typed records) or an int epoch."""
+    if isinstance(value, str):
+        return parse_nginx_time(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
@@ -4,10 +4,14 @@ Run with: streamlit run streamlit_app.py
 """
 import streamlit as st
 import pandas as pd
-import json
 import os
-from src.parser import NginxLogParser
-from src.stats import LogStatsCollector
+import threading
+from collections import OrderedDict
+from src.formats import FormatDetectionError, parser_for_file
+from src.readers import detect_compression, is_log_filename
+from src.cubes import MAX_DIMENSION_VALUES, CubeStore
+from src.pagination import read_forward
+from src.sampling import BlockSampler, reservoir_sample
 
 # Configure Streamlit page
 st.set_page_config(page_title="Log Parser Visualizer", layout="wide")
@@ -15,43 +19,77 @@ st.set_page_config(page_title="Log Parser Visualizer", layout="wide")
 # Directory where log files are stored
 LOG_DIR = os.path.join(os.path.dirname(__file__), 'tests', 'sample_logs')
 
-def load_log_data(filename):
-    """Load and parse log file data"""
+# Rows kept when sampling a compressed file, which has to be read in full
+SAMPLE_ROWS = 100_000
+
+# Where the pre-aggregated stores are kept (outside LOG_DIR, which may be read-only)
+CUBES_DIR = os.environ.get('LOG_CUBES_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'log-parser', 'cubes')
+
+# Stores kept open across sessions; the least recently used one is closed past this
+MAX_OPEN_STORES = 32
+
+@st.cache_resource
+def open_stores():
+    """(file version -> store, least recently used first; its lock), shared by all sessions"""
+    return OrderedDict(), threading.Lock()
+
+def open_store(filepath, size, mtime_ns):
+    """The file's pre-aggregated store; one per file version, shared by all sessions"""
+    stores, lock = open_stores()
+    key = (filepath, size, mtime_ns)
+    with lock:
+        store = stores.get(key)
+        if store is not None:
+            stores.move_to_end(key)
+            return store
+    # Built on the first load (or extended when the log has grown) and kept in CUBES_DIR,
+    # so it also survives restarts
+    store = CubeStore.for_file(filepath, parser_for_file(filepath), store_dir=CUBES_DIR)
+    with lock:
+        if key in stores:
+            # Another session opened it meanwhile
+            store.close()
+            return stores[key]
+        # Older versions of the file and the least recently used stores are closed; a
+        # session still holding one just reopens it on its next query
+        for old_key in [old_key for old_key in stores if old_key[0] == filepath and old_key != key]:
+            stores.pop(old_key).close()
+        stores[key] = store
+        while len(stores) > MAX_OPEN_STORES:
+            stores.popitem(last=False)[1].close()
+    return store
+
+def load_log_data(filename, sample_percent=100):
+    """
+    Return (store, estimate, preview rows) for a log file. Charts are served from
+    the store's pre-aggregated cubes rather than from parsed lines. Below 100%, only
+    a random sample of the file is parsed; estimate then holds estimated totals.
+    """
     filepath = os.path.join(LOG_DIR, filename)
-    log_parser = NginxLogParser()
-    stream = log_parser.parse_file(filepath)
+    # Detected from the file's first few KB, once per file across reruns and sessions
+    log_parser = parser_for_file(filepath)
     
-    # Convert to list for multiple processing
-    logs = list(stream)
-    return logs
-
-def get_dataframe(logs):
-    """Convert parsed logs to DataFrame"""
-    if not logs:
-        return pd.DataFrame()
-    
-    df = pd.DataFrame(logs)
-    return df
-
-def get_numeric_columns(df):
-    """Get columns that can be used for numeric aggregation"""
-    numeric_cols = []
-    for col in df.columns:
-        # Check if column has numeric values
-        if df[col].dtype in ['int64', 'float64']:
-            numeric_cols.append(col)
-        # Also check if it's a column that could be converted
-        elif col in ['status', 'bytes']:
-            numeric_cols.append(col)
-    return numeric_cols
-
-def get_categorical_columns(df):
-    """Get columns suitable for grouping/categorical axes"""
-    cat_cols = []
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            cat_cols.append(col)
-    return cat_cols
+    if sample_percent >= 100:
+        stat = os.stat(filepath)
+        preview = read_forward(filepath, log_parser, 0, 20).rows
+        return open_store(filepath, stat.st_size, stat.st_mtime_ns), None, preview
+
+    if detect_compression(filepath):
+        # No random access: one pass keeping a uniform sample of rows
+        records, seen = reservoir_sample(log_parser.parse_file(filepath), SAMPLE_ROWS)
+        estimate = {"total_requests": seen, "total_requests_ci95": [seen, seen], "sample": {"fraction": 1.0}}
+    else:
+        sampler = BlockSampler(filepath, log_parser, keep_records=True).refine(sample_percent / 100)
+        records, estimate = sampler.records, sampler.summary()
+    # A sample is small, so its cubes live in memory for this session only
+    return CubeStore.from_records(records, log_parser.FIELD_TYPES), estimate, records[:20]
+
+def to_frame(rows, columns, numeric=()):
+    """Query results as a DataFrame; labels of numeric dimensions become numbers"""
+    frame = pd.DataFrame(rows, columns=columns)
+    for col in numeric:
+        frame[col] = pd.to_numeric(frame[col], errors='coerce')
+    return frame
 
 # Main App
 st.title("📊 Log Parser Visualizer")
@@ -63,7 +101,7 @@ st.sidebar.header("Data Selection")
 # Get available log files
 log_files = []
 if os.path.exists(LOG_DIR):
-    log_files = [f for f in os.listdir(LOG_DIR) if f.endswith('.log')]
+    log_files = [f for f in os.listdir(LOG_DIR) if is_log_filename(f)]
 
 if not log_files:
     st.error("No log files found in tests/sample_logs/")
@@ -71,26 +109,45 @@ if not log_files:
 
 selected_file = st.sidebar.selectbox("Select Log File", log_files)
 
+# Sampling gives a quick first look at a huge file; charts then show the sample
+sample_percent = 100
+if st.sidebar.checkbox("Sample large files", help="Parse a random part of the file and estimate the totals"):
+    sample_percent = st.sidebar.slider("Sample size (%)", min_value=1, max_value=100, value=5)
+
 # Load data button
 if st.sidebar.button("Load Data"):
-    st.session_state['data_loaded'] = True
-    st.session_state['logs'] = load_log_data(selected_file)
-    st.session_state['df'] = get_dataframe(st.session_state['logs'])
+    st.session_state['source'] = (selected_file, sample_percent)
+    st.session_state.pop('sample', None)
 
 # Check if data is loaded
-if 'data_loaded' not in st.session_state or not st.session_state.get('data_loaded', False):
+if 'source' not in st.session_state:
     st.info("👈 Select a log file and click 'Load Data' to begin")
     st.stop()
 
-df = st.session_state['df']
+source_file, source_percent = st.session_state['source']
+try:
+    if source_percent >= 100:
+        # Cheap on reruns: a stat, then the shared store (rebuilt if the file changed)
+        store, estimate, preview = load_log_data(source_file)
+    else:
+        if 'sample' not in st.session_state:
+            st.session_state['sample'] = load_log_data(source_file, source_percent)
+        store, estimate, preview = st.session_state['sample']
+except FormatDetectionError as e:
+    st.error(str(e))
+    st.stop()
 
-if df.empty:
+if store.total_rows == 0:
     st.warning("No data to display")
     st.stop()
 
+if store.dropped:
+    st.warning(f"Left out of the charts for having more than {MAX_DIMENSION_VALUES:,} distinct values: "
+               f"{', '.join(store.dropped)}")
+
 # Show raw data preview
 with st.expander("📋 View Raw Data"):
-    st.dataframe(df.head(20))
+    st.dataframe(pd.DataFrame(preview))
 
 # Visualization Options
 st.header("🎨 Visualization Builder")
@@ -109,11 +166,11 @@ with col1:
     chart_type = st.selectbox("Select Chart Type", chart_types)
 
 with col2:
-    x_axis_cols = ["None"] + list(df.columns)
+    x_axis_cols = ["None"] + store.dimensions
     x_axis = st.selectbox("Select X-Axis", x_axis_cols)
 
 with col3:
-    y_axis_cols = ["None"] + get_numeric_columns(df) + get_categorical_columns(df)
+    y_axis_cols = ["None"] + store.measures + [dim for dim in store.dimensions if dim not in store.measures]
     y_axis = st.selectbox("Select Y-Axis (Value)", y_axis_cols)
 
 # Aggregation option
@@ -136,33 +193,31 @@ if st.button("Generate Visualization", type="primary"):
         st.warning("Please select at least one axis")
     else:
         try:
-            # Prepare data for visualization
+            # Prepare data for visualization from the pre-aggregated cubes
             if x_axis != "None" and y_axis != "None":
                 # Group and aggregate
                 if agg_method == "Count":
-                    grouped = df.groupby(x_axis).size().reset_index(name='value')
-                elif agg_method == "Sum":
-                    grouped = df.groupby(x_axis)[y_axis].sum().reset_index(name='value')
-                elif agg_method == "Mean":
-                    grouped = df.groupby(x_axis)[y_axis].mean().reset_index(name='value')
-                elif agg_method == "Min":
-                    grouped = df.groupby(x_axis)[y_axis].min().reset_index(name='value')
-                elif agg_method == "Max":
-                    grouped = df.groupby(x_axis)[y_axis].max().reset_index(name='value')
+                    rows = store.counts(x_axis, by_count=False)
                 elif agg_method == "Unique":
-                    grouped = df.groupby(x_axis)[y_axis].nunique().reset_index(name='value')
+                    rows = store.unique(x_axis, y_axis)
+                elif y_axis in store.measures:
+                    rows = store.aggregate(x_axis, y_axis, agg_method.lower())
+                else:
+                    st.warning(f"{agg_method} needs a numeric Y-Axis: {', '.join(store.measures)}")
+                    st.stop()
+                grouped = to_frame(rows, [x_axis, 'value'])
                 
                 x_data = grouped[x_axis].astype(str)
                 y_data = grouped['value']
                 
             elif y_axis != "None":
-                # Only Y-axis selected - show distribution
-                y_data = df[y_axis]
-                x_data = range(len(y_data))
+                # Only Y-axis selected - show its distribution
+                grouped = to_frame(store.counts(y_axis, by_count=False), [y_axis, 'count'])
+                x_data = grouped[y_axis].astype(str)
+                y_data = grouped['count']
             else:
                 # Only X-axis selected - count occurrences
-                grouped = df[x_axis].value_counts().reset_index()
-                grouped.columns = [x_axis, 'count']
+                grouped = to_frame(store.counts(x_axis), [x_axis, 'count'])
                 x_data = grouped[x_axis].astype(str)
                 y_data = grouped['count']
             
@@ -190,28 +245,41 @@ if st.button("Generate Visualization", type="primary"):
                 )
             elif chart_type == "Scatter Plot":
                 import altair as alt
-                scatter_data = df[[x_axis, y_axis]].dropna()
+                # One point per combination of values, sized by how many lines have it
+                numeric = [axis for axis in (x_axis, y_axis) if axis in store.measures]
+                scatter_data = to_frame(store.pairs(x_axis, y_axis), [x_axis, y_axis, 'count'], numeric)
                 st.altair_chart(
-                    alt.Chart(scatter_data).mark_circle(size=60).encode(
+                    alt.Chart(scatter_data).mark_circle().encode(
                         x=x_axis,
                         y=y_axis,
-                        tooltip=[x_axis, y_axis]
+                        size='count',
+                        tooltip=[x_axis, y_axis, 'count']
                     ).interactive(),
                     use_container_width=True
                 )
                 
+        except KeyError as e:
+            # Pair cubes (Unique, Scatter Plot) are only kept for low-cardinality fields
+            st.warning(str(e.args[0]))
         except Exception as e:
             st.error(f"Error generating chart: {str(e)}")
 
 # Statistics Summary
 st.header("📈 Quick Statistics")
-if not df.empty:
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Total Records", len(df))
-    with col2:
-        if 'ip' in df.columns:
-            st.metric("Unique IPs", df['ip'].nunique())
-    with col3:
-        if 'status' in df.columns:
-            st.metric("Unique Status Codes", df['status'].nunique())
+col1, col2, col3 = st.columns(3)
+with col1:
+    if estimate:
+        low, high = estimate['total_requests_ci95']
+        interval = f"95% CI {low:,} to {high:,}" if high is not None else "read more of the file for an interval"
+        st.metric("Estimated Total Records", f"{estimate['total_requests']:,}",
+                  help=f"{interval}; {store.total_rows:,} rows sampled from {estimate['sample']['fraction']:.0%} of the file")
+    else:
+        st.metric("Total Records", store.total_rows)
+with col2:
+    if 'ip' in store.dimensions:
+        st.metric("Unique IPs", store.cardinality('ip'))
+    elif 'ip' in store.dropped:
+        st.metric("Unique IPs", f"> {MAX_DIMENSION_VALUES:,}", help="Too many to keep per-IP counts")
+with col3:
+    if 'status' in store.dimensions:
+        st.metric("Unique Status Codes", store.cardinality('status'))
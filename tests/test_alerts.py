@@ -0,0 +1,121 @@
+import json
+import pytest
+from src.alerts import AlertConfigError, AlertEngine, AlertRule, FileSink, SlidingWindow, WebhookSink, load_rules
+from src.stats import LogStatsCollector
+
+START = 1_000_000_000
+
+
+class ListSink:
+    def __init__(self):
+        self.alerts = []
+
+    def emit(self, alert):
+        self.alerts.append(alert)
+
+    def close(self):
+        pass
+
+
+def records(specs):
+    """(second offset, status, ip) tuples -> records with epoch times."""
+    return [{"time": START + second, "status": status, "ip": ip} for second, status, ip in specs]
+
+
+def test_sliding_window_evicts_old_seconds():
+    window = SlidingWindow(5, periods=2)
+    for second in range(20):
+        window.add(second)
+    assert window.total == 10 and window.recent == 5
+    window.add(3)  # Older than the window
+    window.add(14)  # Late, in the previous period
+    assert window.total == 11 and window.recent == 5
+    window.advance(27)
+    assert window.total == 2 and window.recent == 0
+    window.advance(100)
+    assert window.total == 0 and window.buckets == []
+
+
+def test_long_windows_use_coarse_buckets():
+    window = SlidingWindow(3600)
+    for second in range(0, 7200, 3):
+        window.add(second)
+    assert window.resolution == 60 and len(window.buckets) == 60
+    assert window.total == window.recent == 1200
+    assert not window.is_empty(7200 + 3500) and window.is_empty(7200 + 3600)
+
+
+def test_idle_keys_expire_and_resolve():
+    sink = ListSink()
+    rule = AlertRule("ip-flood", "count", window=10, threshold=2, group_by="ip")
+    engine = AlertEngine([rule], [sink])
+    flood = [(0, "200", "6.6.6.6")] * 3 + [(second, "200", f"10.0.0.{second}") for second in range(1, 9)]
+    list(engine.process_stream(records(flood + [(30, "200", "10.0.0.1")])))
+
+    assert [(alert["key"], alert["state"]) for alert in sink.alerts] == [("6.6.6.6", "firing"), ("6.6.6.6", "resolved")]
+    assert list(rule._keys) == ["10.0.0.1"]
+
+
+def test_error_rate_fires_and_resolves_through_the_collector():
+    sink = ListSink()
+    rule = AlertRule("5xx-rate", "ratio", window=60, threshold=0.05, where="status >= 500", min_events=20)
+    collector = LogStatsCollector(alerts=AlertEngine([rule], [sink]))
+
+    healthy = [(second, "200", "1.1.1.1") for second in range(60)]
+    failing = [(60 + second, "503" if second % 5 == 0 else "200", "1.1.1.1") for second in range(60)]
+    recovered = [(180 + second, "200", "1.1.1.1") for second in range(30)]
+    passed = list(collector.process_stream(records(healthy + failing + recovered)))
+
+    assert len(passed) == collector.total_requests == 150
+    assert [alert["state"] for alert in sink.alerts] == ["firing", "resolved"]
+    assert sink.alerts[0]["rule"] == "5xx-rate" and sink.alerts[0]["value"] > 0.05
+
+
+def test_per_ip_count_rule_tracks_each_key_and_bounds_memory():
+    sink = ListSink()
+    rule = AlertRule("ip-flood", "count", window=10, threshold=100, group_by="ip", max_keys=50)
+    engine = AlertEngine([rule], [sink])
+
+    flood = [(second // 20, "200", "6.6.6.6") for second in range(150)]
+    background = [(8, "200", f"10.0.0.{i}") for i in range(200)]
+    list(engine.process_stream(records(flood + background)))
+
+    assert [(alert["key"], alert["state"]) for alert in sink.alerts] == [("6.6.6.6", "firing")]
+    assert len(rule._keys) == 50
+
+
+def test_change_rule_detects_spikes_and_drops():
+    spike, drop = ListSink(), ListSink()
+    engine = AlertEngine([AlertRule("spike", "change", window=10, threshold=3, min_events=10)], [spike])
+    quiet = [(second, "200", "1.1.1.1") for second in range(20)]
+    burst = [(20 + second // 5, "200", "1.1.1.1") for second in range(50)]
+    list(engine.process_stream(records(quiet + burst)))
+    assert [alert["state"] for alert in spike.alerts] == ["firing"]
+
+    engine = AlertEngine([AlertRule("drop", "change", window=10, threshold=0.5, min_events=10)], [drop])
+    busy = [(second // 5, "200", "1.1.1.1") for second in range(100)]
+    trickle = [(20 + 3 * second, "200", "1.1.1.1") for second in range(4)]
+    list(engine.process_stream(records(busy + trickle)))
+    assert [alert["state"] for alert in drop.alerts] == ["firing"]
+
+
+def test_rules_file_and_sinks(tmp_path):
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(json.dumps({"rules": [
+        {"name": "errors", "type": "count", "where": "status >= 500", "window": 5, "threshold": 2}]}))
+    out = tmp_path / "alerts.ndjson"
+    webhook = WebhookSink("https://hooks.example.com/alerts")
+    engine = AlertEngine(load_rules(str(rules_path)), [FileSink(str(out)), webhook])
+    list(engine.process_stream(records([(0, "500", "a"), (1, "502", "b"), (2, "504", "c")])))
+    engine.close()
+
+    lines = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [(alert["rule"], alert["state"], alert["value"]) for alert in lines] == [("errors", "firing", 3)]
+    assert json.loads(webhook.sent[0])["alert"] == lines[0]
+
+    for bad in ({"name": "bad", "type": "median", "window": 5, "threshold": 1},
+                {"name": "bad", "type": "count", "window": "1m", "threshold": 1},
+                {"name": "bad", "type": "count", "window": 5, "threshold": None}):
+        rules_path.write_text(json.dumps({"rules": [bad]}))
+        with pytest.raises(AlertConfigError):
+            load_rules(str(rules_path))
@@ -0,0 +1,73 @@
+import os
+import pytest
+from src.parser import NginxLogParser
+from src.stats import LogStatsCollector
+from src.batches import DictionaryColumn, TIMESTAMP_NULL, batches_from_records
+
+SAMPLE = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+
+
+def test_parse_batches_types_and_encoding():
+    batches = list(NginxLogParser().parse_batches(SAMPLE, batch_size=8))
+    assert [b.num_rows for b in batches] == [8, 8, 4]
+
+    first = batches[0]
+    assert first.columns['status'].typecode == 'q'
+    assert first.columns['status'][0] == 200
+    assert first.columns['time'][0] == 1684138530  # 15/May/2023:08:15:30 +0000
+    assert isinstance(first.columns['ip'], DictionaryColumn)
+    assert len(first.columns['method'].values) < first.num_rows
+    assert first.column_values('ip')[0] == '192.168.1.100'
+
+
+def test_missing_fields_are_backfilled():
+    records = [{'a': 'x'}, {'a': 'y', 'size': '10', 'time': 'bad'}, {'a': None}]
+    batch = next(batches_from_records(iter(records), field_types={'size': 'int', 'time': 'timestamp'}))
+    assert batch.column_values('a') == ['x', 'y', None]
+    assert batch.column_values('size') == [0, 10, 0]
+    assert batch.column_values('time') == [TIMESTAMP_NULL] * 3
+
+
+def test_batch_stats_match_stream_stats():
+    parser = NginxLogParser()
+    from_stream, from_batches = LogStatsCollector(), LogStatsCollector()
+    list(from_stream.process_stream(parser.parse_file(SAMPLE)))
+    list(from_batches.process_batches(parser.parse_batches(SAMPLE, batch_size=7)))
+
+    assert from_batches.to_dict() == from_stream.to_dict()
+
+
+def test_to_pandas_shares_memory():
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("pandas")
+    batch = next(NginxLogParser().parse_batches(SAMPLE))
+    df = batch.to_pandas()
+
+    assert len(df) == 20
+    assert str(df['time'].dtype) == 'datetime64[s]'
+    assert np.shares_memory(df['status'].to_numpy(), np.frombuffer(batch.columns['status'], dtype=np.int64))
+    assert df['ip'].iloc[0] == '192.168.1.100'
+
+
+def test_batch_stats_without_numpy(monkeypatch):
+    import src.stats
+    monkeypatch.setattr(src.stats, "np", None)
+    test_batch_stats_match_stream_stats()
+
+
+def test_batch_rollups_match_stream_rollups():
+    parser = NginxLogParser()
+    from_stream, from_batches = LogStatsCollector(rollups=True), LogStatsCollector(rollups=True)
+    list(from_stream.process_stream(parser.parse_file(SAMPLE)))
+    list(from_batches.process_batches(parser.parse_batches(SAMPLE, batch_size=7)))
+
+    assert from_batches.rollups['minute'].rows() == from_stream.rollups['minute'].rows()
+
+
+def test_dictionary_column_keeps_equal_values_of_different_types_apart():
+    column = DictionaryColumn()
+    for value in [True, 1, 1.0, '1', 1, None, True]:
+        column.append(value)
+    assert column.values == [True, 1, 1.0, '1']
+    assert [type(value) for value in column.to_list()[:4]] == [bool, int, float, str]
+    assert column.to_list()[4:] == [1, None, True]
@@ -0,0 +1,106 @@
+import os
+import pytest
+from src.cache import ParseCache
+from src.parser import NginxLogParser
+
+LINE = '10.0.0.{n} - - [15/May/2023:08:15:30 +0000] "GET /p{n} HTTP/1.1" 200 10 "-" "curl"\n'
+
+
+def _write(path, start, stop, mode='a'):
+    with open(path, mode, encoding='utf-8') as f:
+        for n in range(start, stop):
+            f.write(LINE.format(n=n))
+
+
+def test_cache_hit_and_incremental_extension(tmp_path):
+    log_file = str(tmp_path / "access.log")
+    _write(log_file, 0, 3)
+    cache, parser = ParseCache(), NginxLogParser()
+
+    assert cache.get(log_file, parser).stats.total_requests == 3
+    cache.get(log_file, parser)
+    assert (cache.misses, cache.hits) == (1, 1)
+
+    _write(log_file, 3, 5)
+    entry = cache.get(log_file, parser)
+    assert cache.extensions == 1 and cache.misses == 1
+    assert entry.stats.total_requests == 5
+
+
+def test_failed_extension_leaves_the_cached_entry_untouched(tmp_path):
+    log_file = str(tmp_path / "access.log")
+    _write(log_file, 0, 3)
+    cache, parser = ParseCache(), NginxLogParser()
+    entry = cache.get(log_file, parser)
+    stats = entry.stats
+
+    class FailingParser(NginxLogParser):
+        def parse_line(self, line):
+            if '10.0.0.4 ' in line:
+                raise RuntimeError("boom")
+            return super().parse_line(line)
+
+    _write(log_file, 3, 6)
+    with pytest.raises(RuntimeError):
+        cache.get(log_file, FailingParser())
+    assert entry.stats is stats and stats.total_requests == 3 and entry.offset < os.path.getsize(log_file)
+    assert cache.get(log_file, parser).stats.total_requests == 6
+    assert stats.total_requests == 3
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache, parser = ParseCache(max_entries=2), NginxLogParser()
+    paths = [str(tmp_path / f"{i}.log") for i in range(3)]
+    for path in paths:
+        _write(path, 0, 1)
+        cache.get(path, parser)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.evictions == 1
+    cache.get(paths[0], parser)
+    assert cache.misses == 4
+
+
+def test_disk_tier_survives_eviction_and_restart(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    paths = [str(tmp_path / f"{i}.log") for i in range(3)]
+    for i, path in enumerate(paths):
+        _write(path, 0, i + 1)
+    parser = NginxLogParser()
+
+    cache = ParseCache(max_entries=1, cache_dir=cache_dir)
+    for path in paths:
+        cache.get(path, parser)
+    assert cache.get(paths[0], parser).stats.total_requests == 1
+    assert (cache.misses, cache.disk_hits) == (3, 1)
+
+    restarted = ParseCache(cache_dir=cache_dir)
+    _write(paths[2], 3, 5)
+    assert restarted.get(paths[1], parser).stats.ip_addresses == {"10.0.0.0": 1, "10.0.0.1": 1}
+    assert restarted.get(paths[2], parser).stats.total_requests == 5
+    assert (restarted.misses, restarted.disk_hits, restarted.extensions) == (0, 1, 1)
+
+    # Writing an entry trims the directory, keeping at least that entry
+    _write(paths[0], 1, 2)
+    ParseCache(cache_dir=cache_dir, max_disk_bytes=1).get(paths[0], parser)
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_key_locks_are_dropped_when_unused_not_on_eviction(tmp_path):
+    cache, parser = ParseCache(max_entries=1), NginxLogParser()
+    paths = [str(tmp_path / f"{i}.log") for i in range(2)]
+    for path in paths:
+        _write(path, 0, 1)
+    cache.get(paths[0], parser)
+    _write(paths[0], 1, 2)
+
+    class EvictingParser(NginxLogParser):
+        # Another request evicts this file's entry while it is being extended
+        def parse_line(self, line):
+            if cache.evictions == 0:
+                cache.get(paths[1], parser)
+            assert (os.path.abspath(paths[0]), cache._parser_key(self)) in cache._key_locks
+            return super().parse_line(line)
+
+    assert cache.get(paths[0], EvictingParser()).stats.total_requests == 2
+    assert cache.evictions == 2 and cache._key_locks == {}
@@ -0,0 +1,112 @@
+import os
+import pytest
+from benchmarks.generator import generate_file
+from src.parser import FastNginxLogParser
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+import src.cubes
+from src.cubes import CubeStore
+
+
+@pytest.fixture
+def access_log(tmp_path):
+    path = str(tmp_path / "access.log")
+    generate_file(path, num_lines=3000, seed=11, lines_per_second=2)
+    return path
+
+
+def test_cubes_match_groupby(access_log):
+    log_parser = FastNginxLogParser()
+    store = CubeStore.for_file(access_log, log_parser)
+    df = next(iter(log_parser.parse_batches(access_log, batch_size=10**6))).to_pandas()
+
+    assert store.total_rows == len(df)
+    assert dict(store.counts('status')) == {str(k): v for k, v in df['status'].value_counts().items()}
+    means = dict(store.aggregate('method', 'size', 'mean'))
+    assert means == pytest.approx(df.groupby('method', observed=True)['size'].mean().to_dict())
+    assert dict(store.aggregate('status', 'size', 'max')) == {
+        str(k): v for k, v in df.groupby('status')['size'].max().items()}
+    assert dict(store.unique('status', 'method')) == {
+        str(k): v for k, v in df.groupby('status')['method'].nunique().items()}
+    hours = df['time'].dt.strftime('%Y-%m-%d %H:00').value_counts()
+    assert dict(store.counts('time_hour')) == hours.to_dict()
+    assert sum(count for _, _, count in store.pairs('method', 'status')) == len(df)
+
+
+def test_store_is_reused_and_rebuilt_when_the_file_changes(access_log):
+    log_parser = FastNginxLogParser()
+    store = CubeStore.for_file(access_log, log_parser)
+    built_at = os.stat(store.path).st_mtime_ns
+    assert CubeStore.for_file(access_log, log_parser).meta == store.meta
+    assert os.stat(store.path).st_mtime_ns == built_at
+
+    with open(access_log, 'a') as f:
+        f.write('127.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET / HTTP/1.0" 200 2 "-" "-"\n')
+    assert CubeStore.for_file(access_log, log_parser).total_rows == store.total_rows + 1
+
+
+def test_high_cardinality_dimensions_skip_pairs_or_are_dropped(access_log, monkeypatch):
+    monkeypatch.setattr(src.cubes, "MAX_PAIR_DIMENSION_VALUES", 20)
+    monkeypatch.setattr(src.cubes, "MAX_DIMENSION_VALUES", 1000)
+    log_parser = FastNginxLogParser()
+    store = CubeStore.from_records(log_parser.parse_file(access_log), log_parser.FIELD_TYPES)
+
+    assert 'ip' in store.dimensions and not store.has_pairs('ip', 'status')
+    with pytest.raises(KeyError):
+        store.unique('ip', 'status')
+    assert store.has_pairs('method', 'status')
+    # A dropped dimension can still be a measure
+    assert store.meta['dropped'] == ['size'] and 'size' not in store.dimensions
+    assert sum(total for _, total in store.aggregate('method', 'size', 'count')) == store.total_rows
+
+
+def _contents(store):
+    dims = {dim: sorted(store.counts(dim)) for dim in store.dimensions}
+    sizes = {dim: sorted(store.aggregate(dim, 'size', 'sum')) for dim in store.dimensions}
+    pairs = {key: sorted(store.pairs(*key)) for key in sorted(tuple(key) for key in store.meta['pairs'])}
+    return store.total_rows, store.meta['dropped'], store.meta['wide'], dims, sizes, pairs
+
+
+def test_appends_are_added_to_the_store_in_place(access_log, tmp_path, monkeypatch):
+    # ip crosses both limits only once the appended lines are in
+    monkeypatch.setattr(src.cubes, "MAX_PAIR_DIMENSION_VALUES", 1000)
+    monkeypatch.setattr(src.cubes, "MAX_DIMENSION_VALUES", 1300)
+    store_dir = str(tmp_path / "stores")
+    log_parser = FastNginxLogParser()
+    store = CubeStore.for_file(access_log, log_parser, store_dir=store_dir)
+    assert os.path.dirname(store.path) == store_dir and not os.path.exists(access_log + '.cubes.sqlite')
+    assert 'ip' in store.dimensions and store.has_pairs('ip', 'status')
+
+    more = str(tmp_path / "more.log")
+    generate_file(more, num_lines=1000, seed=12, lines_per_second=2)
+    with open(more, encoding='utf-8') as f:
+        appended = f.read()
+    with open(access_log, 'a', encoding='utf-8') as f:
+        f.write(appended + appended[:40])  # The last line is still being written
+
+    def full_parse(*args, **kwargs):
+        raise AssertionError("the store was rebuilt")
+    monkeypatch.setattr(log_parser, "parse_batches", full_parse)
+    updated = CubeStore.for_file(access_log, log_parser, store_dir=store_dir)
+    assert updated.path == store.path and updated.dropped == ['ip', 'size']
+
+    expected_log = str(tmp_path / "expected.log")
+    with open(access_log, encoding='utf-8') as f:
+        complete = f.read()[:-40]
+    with open(expected_log, 'w', encoding='utf-8') as f:
+        f.write(complete)
+    expected = CubeStore.for_file(expected_log, FastNginxLogParser(), store_dir=store_dir)
+    assert _contents(updated) == _contents(expected)
+
+    with open(access_log, 'a', encoding='utf-8') as f:
+        f.write(appended[40:appended.index('\n') + 1])
+    assert CubeStore.for_file(access_log, log_parser, store_dir=store_dir).total_rows == expected.total_rows + 1
+
+
+def test_closed_store_reopens_on_use(access_log):
+    store = CubeStore.for_file(access_log, FastNginxLogParser())
+    counts = store.counts('method')
+    store.close()
+    assert store.counts('method') == counts
@@ -0,0 +1,81 @@
+import csv
+import json
+import os
+import pytest
+from src.exporters import export_to_csv, export_to_ndjson, export_to_parquet, export_to_arrow, export_in_background
+from src.parser import JsonLinesParser, NginxLogParser
+
+SAMPLE_LOG = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+
+def test_csv_export_adds_columns_that_appear_later(tmp_path):
+    out = tmp_path / "out.csv"
+    export_to_csv(iter([{'ip': '1.1.1.1'}, {'ip': '2.2.2.2', 'status': '404'}, {'status': '200'}]), str(out))
+    with open(out, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert rows == [
+        {'ip': '1.1.1.1', 'status': ''},
+        {'ip': '2.2.2.2', 'status': '404'},
+        {'ip': '', 'status': '200'},
+    ]
+
+def test_ndjson_export(tmp_path):
+    out = tmp_path / "out.ndjson"
+    records = list(NginxLogParser().parse_file(SAMPLE_LOG))
+    export_to_ndjson(iter(records), str(out))
+    with open(out, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == records
+
+def test_background_export_matches_direct_export(tmp_path):
+    records = list(NginxLogParser().parse_file(SAMPLE_LOG))
+    export_in_background(export_to_ndjson, iter(records), str(tmp_path / "bg.ndjson"), chunk_size=3, max_chunks=2)
+    export_to_ndjson(iter(records), str(tmp_path / "direct.ndjson"))
+    assert (tmp_path / "bg.ndjson").read_text() == (tmp_path / "direct.ndjson").read_text()
+
+def test_background_export_reraises_writer_errors(tmp_path):
+    def failing_export(data, filepath):
+        next(data)
+        raise OSError("disk full")
+
+    records = ({'n': i} for i in range(100000))
+    with pytest.raises(OSError, match="disk full"):
+        export_in_background(failing_export, records, str(tmp_path / "x"), chunk_size=10, max_chunks=2)
+
+def test_parquet_and_arrow_export_typed_columns(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    log_parser = NginxLogParser()
+    records = list(log_parser.parse_file(SAMPLE_LOG))
+
+    export_to_parquet(iter(records), str(tmp_path / "out.parquet"), log_parser.FIELD_TYPES, batch_size=4)
+    parquet_file = pq.ParquetFile(tmp_path / "out.parquet")
+    assert parquet_file.metadata.num_row_groups == (len(records) + 3) // 4
+    table = parquet_file.read()
+    assert table.num_rows == len(records)
+    assert table.schema.field('status').type == pyarrow.int64()
+    assert pyarrow.types.is_timestamp(table.schema.field('time').type)
+    assert table.column('status').to_pylist() == [int(r['status']) for r in records]
+    assert table.column('ip').to_pylist() == [r['ip'] for r in records]
+
+    export_to_arrow(iter(records), str(tmp_path / "out.arrows"), log_parser.FIELD_TYPES, batch_size=4)
+    with pyarrow.ipc.open_stream(tmp_path / "out.arrows") as reader:
+        assert reader.read_all().column('referrer').to_pylist() == [r['referrer'] for r in records]
+
+def test_parquet_and_arrow_export_json_lines(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    path = tmp_path / "app.jsonl"
+    path.write_text('{"level": "info", "code": 1, "ok": true, "ms": 1.5}\n'
+                    '{"level": "warn", "code": 2, "ok": 1, "ms": null}\n')
+    log_parser = JsonLinesParser()
+
+    export_to_parquet(log_parser.parse_file(str(path)), str(tmp_path / "out.parquet"), log_parser.FIELD_TYPES)
+    table = pq.read_table(tmp_path / "out.parquet")
+    assert table.column('code').to_pylist() == ['1', '2']
+    assert table.column('ok').to_pylist() == ['true', '1']
+    assert table.column('ms').to_pylist() == ['1.5', None]
+
+    export_to_arrow(log_parser.parse_file(str(path)), str(tmp_path / "out.arrows"), log_parser.FIELD_TYPES)
+    with pyarrow.ipc.open_stream(tmp_path / "out.arrows") as reader:
+        assert reader.read_all().column('level').to_pylist() == ['info', 'warn']
@@ -0,0 +1,68 @@
+import os
+import pickle
+import pytest
+from src.filters import RecordFilter, FilterSyntaxError
+from src.parser import FastNginxLogParser
+
+SAMPLE_LOG = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+
+RECORD = {'ip': '10.0.0.1', 'method': 'POST', 'url': '/login', 'status': '503', 'size': '-'}
+
+def test_filter_comparisons():
+    assert RecordFilter("status >= 500").matches(RECORD)
+    assert RecordFilter("status == 503 and method == 'POST'").matches(RECORD)
+    assert not RecordFilter("status < 500 or method == 'GET'").matches(RECORD)
+    assert RecordFilter("not method == 'GET'").matches(RECORD)
+    assert RecordFilter("method in ('PUT', 'POST')").matches(RECORD)
+    assert RecordFilter("500 <= status < 600").matches(RECORD)
+    assert RecordFilter("600 > status").matches(RECORD)
+
+def test_literal_before_in_is_a_substring_test():
+    assert RecordFilter("'PO' in method").matches(RECORD)
+    assert not RecordFilter("'PO' not in method").matches(RECORD)
+    assert not RecordFilter("'GE' in method").matches(RECORD)
+    assert RecordFilter("'PO' in method").line_may_match('"POST /login"')
+    assert not RecordFilter("'PO' in method").line_may_match('"GET /login"')
+
+def test_integer_equality_uses_the_canonical_form_like_the_line_check():
+    for value in ('+503', '5.03e2', '0503'):
+        record = dict(RECORD, status=value)
+        assert not RecordFilter("status == 503").matches(record)
+        assert RecordFilter("status >= 503").matches(record)
+    assert RecordFilter("status in (404, 503)").matches(RECORD)
+    assert RecordFilter("status == 503").matches(dict(RECORD, status=503))  # Typed records
+
+def test_filter_missing_and_non_numeric_fields_never_match():
+    assert not RecordFilter("size > 0").matches(RECORD)
+    assert not RecordFilter("referrer == '-'").matches(RECORD)
+
+def test_filter_rejects_unsupported_syntax():
+    for expression in ["status >=", "__import__('os')", "status == other", "status + 1 > 2",
+                       "status in 5000", "method not in 'GET'", "size > -'a'", "status in (-'a',)"]:
+        with pytest.raises(FilterSyntaxError):
+            RecordFilter(expression)
+
+def test_line_check_never_rejects_a_match():
+    log_parser = FastNginxLogParser()
+    with open(SAMPLE_LOG, encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    for expression in ["method == 'DELETE'", "status == 404 or ip == '10.0.0.1'", "status >= 500",
+                       "method in ('POST', 'PUT') and status != 200"]:
+        record_filter = RecordFilter(expression)
+        for line in lines:
+            record = log_parser.parse_line(line)
+            if record and record_filter.matches(record):
+                assert record_filter.line_may_match(line)
+
+def test_filter_survives_pickling():
+    record_filter = pickle.loads(pickle.dumps(RecordFilter("status == 503")))
+    assert record_filter.matches(RECORD)
+    assert record_filter.has_line_check
+
+def test_parse_file_with_filter_matches_post_filtering():
+    log_parser = FastNginxLogParser()
+    record_filter = RecordFilter("method == 'GET' and status >= 400")
+    expected = [r for r in log_parser.parse_file(SAMPLE_LOG) if record_filter.matches(r)]
+    assert list(log_parser.parse_file(SAMPLE_LOG, record_filter=record_filter)) == expected
+    assert list(log_parser.parse_file_parallel(SAMPLE_LOG, workers=2, chunk_size=256,
+                                               record_filter=record_filter)) == expected
@@ -0,0 +1,78 @@
+import os
+from src.filters import RecordFilter
+from src.follow import LogFollower
+from src.parser import NginxLogParser
+
+LINE = '10.0.0.{n} - - [15/May/2023:08:15:30 +0000] "GET /p{n} HTTP/1.1" 200 10 "-" "curl"\n'
+
+
+def _append(path, start, stop):
+    with open(path, 'a', encoding='utf-8') as f:
+        for n in range(start, stop):
+            f.write(LINE.format(n=n))
+
+
+def test_follow_resumes_from_checkpoint(tmp_path):
+    log_file, checkpoint = str(tmp_path / "access.log"), str(tmp_path / "access.ckpt")
+    _append(log_file, 0, 3)
+
+    follower = LogFollower(log_file, NginxLogParser(), checkpoint_path=checkpoint)
+    assert len(list(follower.follow(max_polls=1))) == 3
+    follower.close()
+
+    _append(log_file, 3, 5)
+    restarted = LogFollower(log_file, NginxLogParser(), checkpoint_path=checkpoint)
+    new_records = list(restarted.follow(max_polls=1))
+    restarted.close()
+
+    assert [r['ip'] for r in new_records] == ['10.0.0.3', '10.0.0.4']
+    assert restarted.stats_collector.total_requests == 5
+
+
+def test_follow_handles_partial_lines_rotation_and_truncation(tmp_path):
+    log_file = str(tmp_path / "access.log")
+    _append(log_file, 0, 2)
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(LINE.format(n=2)[:20])  # Partially written line
+
+    follower = LogFollower(log_file, NginxLogParser())
+    assert len(list(follower.poll())) == 2
+
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(LINE.format(n=2)[20:])
+    os.rename(log_file, log_file + ".1")
+    _append(log_file, 10, 12)
+    assert [r['ip'] for r in follower.poll()] == ['10.0.0.2', '10.0.0.10', '10.0.0.11']
+
+    with open(log_file, 'w', encoding='utf-8'):
+        pass
+    _append(log_file, 20, 21)
+    assert [r['ip'] for r in follower.poll()] == ['10.0.0.20']
+    assert follower.stats_collector.total_requests == 6
+    follower.close()
+
+
+def test_checkpoint_saved_mid_block_resumes_after_consumed_records(tmp_path):
+    log_file, checkpoint = str(tmp_path / "access.log"), str(tmp_path / "access.ckpt")
+    _append(log_file, 0, 100)
+
+    follower = LogFollower(log_file, NginxLogParser(), checkpoint_path=checkpoint)
+    poll = follower.poll()
+    for _ in range(10):
+        next(poll)
+    follower.save_checkpoint()  # As on Ctrl-C
+    follower.close()
+
+    restarted = LogFollower(log_file, NginxLogParser(), checkpoint_path=checkpoint)
+    assert len(list(restarted.poll())) == 90
+    assert restarted.stats_collector.total_requests == 100
+    restarted.close()
+
+
+def test_follow_applies_the_record_filter(tmp_path):
+    log_file = str(tmp_path / "access.log")
+    _append(log_file, 0, 10)
+    follower = LogFollower(log_file, NginxLogParser(), record_filter=RecordFilter("ip in ('10.0.0.3', '10.0.0.7')"))
+    assert [r['ip'] for r in follower.poll()] == ['10.0.0.3', '10.0.0.7']
+    assert follower.stats_collector.total_requests == 2
+    follower.close()
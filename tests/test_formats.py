@@ -0,0 +1,58 @@
+import gzip
+import json
+import os
+import pytest
+from src.formats import FormatDetectionError, detect_format, get_parser, parser_for_file
+from src.parser import ApacheVhostCombinedParser, FastNginxLogParser, JsonLinesParser, SyslogParser
+
+SAMPLE_LOG = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+
+SAMPLES = {
+    "apache_vhost": 'example.com:80 10.0.0.{i} - - [10/Oct/2000:13:55:{i:02d} -0700] "GET /{i} HTTP/1.1" 200 512 "-" "curl/8.0"',
+    "jsonl": '{{"ts": "2023-05-15T08:00:{i:02d}Z", "level": "info", "msg": "request {i}"}}',
+    "syslog": 'May 15 08:00:{i:02d} web1 app[{i}]: handled request {i}',
+}
+
+
+@pytest.mark.parametrize("name", sorted(SAMPLES))
+def test_detect_format(tmp_path, name):
+    path = tmp_path / f"{name}.log"
+    path.write_text("\n".join(SAMPLES[name].format(i=i) for i in range(50)) + "\n")
+    assert detect_format(str(path)) == name
+
+
+def test_detect_format_reads_compressed_files_and_tolerates_bad_lines(tmp_path):
+    path = tmp_path / "app.log.gz"
+    lines = [json.dumps({"n": i}) for i in range(20)] + ["Traceback (most recent call last):"]
+    with gzip.open(path, 'wt') as f:
+        f.write("\n".join(lines) + "\n")
+    assert detect_format(str(path)) == "jsonl"
+    assert detect_format(SAMPLE_LOG) == "nginx"
+
+
+def test_undetectable_file(tmp_path):
+    path = tmp_path / "notes.log"
+    path.write_text("just some\nfree text\n")
+    with pytest.raises(FormatDetectionError):
+        detect_format(str(path))
+
+
+def test_parser_for_file_is_cached_until_the_file_is_replaced(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text(SAMPLES["syslog"].format(i=1) + "\n")
+    first = parser_for_file(str(path))
+    assert isinstance(first, SyslogParser)
+    assert parser_for_file(str(path)) is first
+
+    replacement = tmp_path / "new.log"
+    replacement.write_text(SAMPLES["jsonl"].format(i=1) + "\n")
+    os.replace(replacement, path)
+    assert isinstance(parser_for_file(str(path)), JsonLinesParser)
+
+
+def test_get_parser():
+    assert isinstance(get_parser("nginx"), FastNginxLogParser)
+    assert get_parser("apache_vhost") is get_parser("apache_vhost")
+    assert isinstance(get_parser("apache_vhost"), ApacheVhostCombinedParser)
+    with pytest.raises(KeyError):
+        get_parser("w3c")
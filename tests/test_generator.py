@@ -0,0 +1,41 @@
+from benchmarks.compare import compare_results
+from benchmarks.generator import generate_file, generate_lines, parse_size
+from src.parser import NginxLogParser
+
+
+def test_generator_is_deterministic(tmp_path):
+    first, second = str(tmp_path / "a.log"), str(tmp_path / "b.log")
+    assert generate_file(first, num_lines=2000, seed=7) == generate_file(second, num_lines=2000, seed=7)
+    with open(first, 'rb') as a, open(second, 'rb') as b:
+        assert a.read() == b.read()
+    assert list(generate_lines(50, seed=7)) != list(generate_lines(50, seed=8))
+
+
+def test_generator_cardinality_and_malformed_rate():
+    parser = NginxLogParser()
+    lines = list(generate_lines(20000, ip_cardinality=100, url_cardinality=40, malformed_rate=0.05))
+    records = [r for r in map(parser.parse_line, lines) if r]
+
+    assert 0.93 < len(records) / len(lines) < 0.97
+    assert len({r['ip'] for r in records}) <= 100
+    assert len({r['url'] for r in records}) <= 40
+
+
+def test_generate_file_by_size(tmp_path):
+    path = str(tmp_path / "sized.log")
+    lines, written = generate_file(path, target_bytes=parse_size("64k"))
+    assert written >= 64 * 1024
+    assert written - 64 * 1024 < 1024
+    with open(path, 'rb') as f:
+        assert f.read().count(b'\n') == lines
+
+
+def test_compare_results_reports_changes():
+    old = {"results": [{"name": "parse_fast", "seconds": 2, "lines_per_sec": 100, "peak_rss_mb": 50},
+                       {"name": "export_arrow", "skipped": "pyarrow not installed"}]}
+    new = {"results": [{"name": "parse_fast", "seconds": 1, "lines_per_sec": 150, "peak_rss_mb": 40},
+                       {"name": "export_arrow", "seconds": 1, "lines_per_sec": 10, "peak_rss_mb": 90}]}
+    [row] = compare_results(old, new)
+    assert row["name"] == "parse_fast"
+    assert row["throughput_change"] == 50
+    assert row["rss_change"] == -20
@@ -0,0 +1,102 @@
+import json
+import os
+import pytest
+from src.index import LogIndex, build_index, parse_query_time
+from src.parser import JsonLinesParser, NginxLogParser, RegexLogParser
+
+SAMPLE = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+
+
+def _copy_sample(tmp_path, repeat=1):
+    with open(SAMPLE, encoding='utf-8') as f:
+        data = f.read()
+    log_file = tmp_path / "access.log"
+    log_file.write_text(data * repeat, encoding='utf-8')
+    return str(log_file)
+
+
+def test_query_matches_full_scan(tmp_path):
+    log_file = _copy_sample(tmp_path, repeat=5)
+    parser = NginxLogParser()
+    index = build_index(log_file, parser, block_bytes=1024)
+    assert len(index.blocks) > 1
+    assert os.path.exists(log_file + '.idx')
+
+    since, until = parse_query_time('2023-05-15T08:16:00'), parse_query_time('2023-05-15T08:30:00')
+    results = list(LogIndex.load(log_file).query(parser, ip='10.0.0.50', status='4xx', since=since, until=until))
+    expected = [
+        r for r in parser.parse_file(log_file)
+        if r['ip'] == '10.0.0.50' and r['status'].startswith('4')
+        and since <= parse_query_time(r['time']) <= until
+    ]
+    assert results == expected and len(expected) == 5
+
+
+def test_index_update_is_incremental(tmp_path):
+    log_file = _copy_sample(tmp_path)
+    parser = NginxLogParser()
+    index = build_index(log_file, parser)
+    first_size = index.indexed_bytes
+
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write('10.9.9.9 - - [15/May/2023:09:00:00 +0000] "DELETE /x HTTP/1.1" 503 0 "-" "-"\n')
+        f.write('10.9.9.9 - - [15/May/2023:09:00:01 +0000] "DELETE /y HTTP/1.1" 503 0')  # Incomplete
+
+    index = LogIndex.load(log_file)
+    new_bytes = index.update(parser)
+    assert 0 < new_bytes < first_size
+    assert [r['url'] for r in index.query(parser, method='DELETE')] == ['/x']
+
+
+def test_index_is_rebuilt_for_another_parser(tmp_path):
+    log_file = _copy_sample(tmp_path)
+    build_index(log_file, NginxLogParser())
+    get_only = RegexLogParser(r'^(?P<ip>\S+) .*"GET (?P<url>\S+)')
+    index = LogIndex.load(log_file)
+    assert index.update(get_only) == os.path.getsize(log_file)
+    assert index.parser == get_only.pattern.pattern
+    assert not list(index.query(get_only, method='POST'))
+
+
+def test_index_prunes_iso_timestamps(tmp_path):
+    log_file = tmp_path / "app.jsonl"
+    log_file.write_text("".join(
+        json.dumps({"time": f"2023-05-15T08:{minute:02d}:00Z", "ip": "10.0.0.1"}) + "\n" for minute in range(60)))
+    parser = JsonLinesParser()
+    index = build_index(str(log_file), parser, block_bytes=256)
+    since, until = parse_query_time('2023-05-15T08:10:00'), parse_query_time('2023-05-15T08:11:00')
+    assert len(list(index.query(parser, since=since, until=until))) == 2
+    assert sum(block.may_match(since=since, until=until) for block in index.blocks) < len(index.blocks) / 2
+    with pytest.raises(ValueError):
+        parse_query_time('yesterday')
+
+
+def test_query_endpoint_validates_and_writes_no_files():
+    pytest.importorskip("flask")
+    from src.app import LOG_DIR, app
+
+    client = app.test_client()
+    assert client.get('/api/query?filename=realistic_nginx.log&limit=x').status_code == 400
+    assert client.get('/api/query?filename=realistic_nginx.log&since=soon').status_code == 400
+    assert len(client.get('/api/query?filename=realistic_nginx.log&status=4xx&limit=3').get_json()) == 3
+    assert not os.path.exists(os.path.join(LOG_DIR, 'realistic_nginx.log.idx'))
+
+
+def test_query_keeps_carriage_returns_inside_lines(tmp_path):
+    log_file = tmp_path / "access.log"
+    log_file.write_bytes(b'10.0.0.1 - - [15/May/2023:08:00:00 +0000] "GET /a HTTP/1.1" 200 5 "-" "bot\rv2"\n' * 3)
+    parser = NginxLogParser()
+    index = build_index(str(log_file), parser)
+    assert [r['user_agent'] for r in index.query(parser, ip='10.0.0.1')] == ['bot\rv2'] * 3
+
+
+def test_query_endpoint_bounds_its_indexes_and_results(monkeypatch):
+    pytest.importorskip("flask")
+    from src import app as app_module
+
+    monkeypatch.setattr(app_module, "MAX_QUERY_INDEXES", 1)
+    monkeypatch.setattr(app_module, "MAX_QUERY_RESULTS", 2)
+    client = app_module.app.test_client()
+    for name in ("realistic_nginx.log", "test_nginx.log"):
+        assert len(client.get(f'/api/query?filename={name}&limit=50').get_json()) == 2
+    assert [os.path.basename(path) for path in app_module.query_indexes] == ["test_nginx.log"]
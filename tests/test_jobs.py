@@ -0,0 +1,85 @@
+import os
+import threading
+import pytest
+from src.cache import ParseCache
+from src.jobs import JobManager
+from src.parser import NginxLogParser
+
+SAMPLE_LOG = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+
+
+class BlockingParser(NginxLogParser):
+    """Parser that waits for a signal before parsing, so a job stays running."""
+
+    def __init__(self, release: threading.Event):
+        super().__init__()
+        self.release = release
+
+    def parse_line(self, line):
+        self.release.wait()
+        return super().parse_line(line)
+
+
+def test_job_runs_in_background_and_reports_stats():
+    manager = JobManager(ParseCache())
+    job = manager.submit(SAMPLE_LOG, NginxLogParser())
+    assert job.wait_done(timeout=10)
+
+    snapshot = manager.get(job.id).snapshot()
+    assert snapshot["status"] == "done"
+    assert snapshot["filename"] == "realistic_nginx.log"
+    assert snapshot["bytes_processed"] == snapshot["total_bytes"] == os.path.getsize(SAMPLE_LOG)
+    assert snapshot["stats"]["total_requests"] == snapshot["lines"] > 0
+    manager.shutdown()
+
+
+def test_identical_requests_share_one_job():
+    release = threading.Event()
+    cache = ParseCache()
+    manager = JobManager(cache, max_workers=4)
+    log_parser = BlockingParser(release)
+
+    first = manager.submit(SAMPLE_LOG, log_parser)
+    second = manager.submit(SAMPLE_LOG, log_parser)
+    assert first is second
+    assert not first.done
+
+    release.set()
+    assert first.wait_done(timeout=10)
+    assert cache.misses == 1
+
+    # Once finished, a new request starts a new job, which is served from the cache
+    third = manager.submit(SAMPLE_LOG, log_parser)
+    assert third is not first
+    assert third.wait_done(timeout=10)
+    assert cache.hits == 1
+    manager.shutdown()
+
+
+def test_job_reports_errors():
+    manager = JobManager(ParseCache())
+
+    class BrokenParser(NginxLogParser):
+        def parse_line(self, line):
+            raise RuntimeError("boom")
+
+    job = manager.submit(SAMPLE_LOG, BrokenParser())
+    assert job.wait_done(timeout=10)
+    assert job.snapshot()["status"] == "error"
+    assert "boom" in job.snapshot()["error"]
+    manager.shutdown()
+
+
+def test_job_events_stream_ends_with_done():
+    pytest.importorskip("flask")
+    from src.app import app
+
+    client = app.test_client()
+    response = client.post('/api/jobs?filename=realistic_nginx.log')
+    assert response.status_code == 202
+    job_id = response.get_json()["id"]
+
+    body = client.get(f'/api/jobs/{job_id}/events').get_data(as_text=True)
+    assert "event: done" in body
+    assert client.get(f'/api/jobs/{job_id}').get_json()["status"] == "done"
+    assert client.get('/api/analyze?filename=realistic_nginx.log').get_json()["total_requests"] > 0
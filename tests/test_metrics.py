@@ -0,0 +1,104 @@
+import os
+import pytest
+from src.exporters import export_to_ndjson
+from src.filters import RecordFilter
+from src.metrics import metrics
+from src.parser import FastNginxLogParser, NginxLogParser
+from src.stats import LogStatsCollector
+
+SAMPLE_LOG = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+
+
+@pytest.fixture
+def profiling():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+def _stages():
+    return {dict(key)["stage"] for key in metrics.snapshot().get("stage_seconds", {})}
+
+
+def test_profiled_parse_yields_same_records_and_counts_lines(profiling):
+    metrics.disable()
+    expected = list(NginxLogParser().parse_file(SAMPLE_LOG))
+    metrics.enable()
+
+    assert list(NginxLogParser().parse_file(SAMPLE_LOG)) == expected
+    with open(SAMPLE_LOG, encoding='utf-8') as f:
+        total_lines = sum(1 for _ in f)
+    assert metrics.get("lines_read") == total_lines
+    assert metrics.get("lines_matched") == len(expected)
+    assert metrics.get("parse_failures") == total_lines - len(expected)
+    assert metrics.get("bytes_read") == os.path.getsize(SAMPLE_LOG)
+    assert {"read", "parse.match", "parse.build"} <= _stages()
+
+
+def test_profiled_filter_counts_dropped_lines(profiling):
+    record_filter = RecordFilter("status == 404")
+    records = list(FastNginxLogParser().parse_file(SAMPLE_LOG, record_filter=record_filter))
+    assert records and all(r['status'] == '404' for r in records)
+    assert metrics.get("lines_read") == metrics.get("lines_filtered_out") + metrics.get("parse_failures") + len(records)
+    assert {"read", "parse", "filter"} <= _stages()
+
+
+def test_stats_and_export_stages(profiling, tmp_path):
+    stats = LogStatsCollector()
+    out = tmp_path / "out.ndjson"
+    export_to_ndjson(stats.process_stream(FastNginxLogParser().parse_file(SAMPLE_LOG)), str(out))
+
+    assert metrics.get("records_exported", format="ndjson") == stats.total_requests
+    assert metrics.get("bytes_written", format="ndjson") == os.path.getsize(out)
+    assert {"read", "parse", "stats", "export.ndjson"} <= _stages()
+    assert "stats" in metrics.report(wall_seconds=1.0)
+
+
+def test_report_with_overlapping_stages(profiling):
+    metrics.add_time("parse", 2.0, 10)
+    metrics.add_time("export.ndjson", 1.5, 10)  # On a writer thread, in parallel
+    report = metrics.report(wall_seconds=2.5)
+    assert "(other)" not in report and "concurrently" in report
+    assert "(other)" in metrics.report(wall_seconds=4.0)
+
+
+def test_disabled_metrics_record_nothing(tmp_path):
+    metrics.reset()
+    stats = LogStatsCollector()
+    export_to_ndjson(stats.process_stream(NginxLogParser().parse_file(SAMPLE_LOG)), str(tmp_path / "out.ndjson"))
+    assert stats.total_requests > 0
+    assert metrics.snapshot() == {}
+
+
+def test_prometheus_text_format(profiling):
+    metrics.inc("lines_read", 10)
+    metrics.add_time("parse", 0.5, 10)
+    text = metrics.to_prometheus({"jobs_active": (2, "Jobs running")})
+    assert "# TYPE logparser_lines_read_total counter\nlogparser_lines_read_total 10\n" in text
+    assert 'logparser_stage_seconds_total{stage="parse"} 0.5' in text
+    assert "# TYPE logparser_jobs_active gauge\nlogparser_jobs_active 2\n" in text
+
+
+def test_prometheus_values_are_exact(profiling):
+    metrics.inc("bytes_read", 1234567891)
+    metrics.add_time("parse", 1234.5678912, 10)
+    text = metrics.to_prometheus({"ratio": (float('inf'), "Ratio")})
+    assert "logparser_bytes_read_total 1234567891\n" in text
+    assert 'logparser_stage_seconds_total{stage="parse"} 1234.5678912\n' in text
+    assert "logparser_ratio +Inf\n" in text
+
+
+def test_metrics_endpoint(profiling):
+    pytest.importorskip("flask")
+    from src.app import app
+
+    client = app.test_client()
+    assert client.get('/api/analyze?filename=realistic_nginx.log').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'logparser_http_requests_total{endpoint="analyze_log",status="200"} 1' in body
+    assert "logparser_cache_entries" in body
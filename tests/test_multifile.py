@@ -0,0 +1,82 @@
+import os
+import pytest
+from benchmarks.generator import generate_file
+from src.multifile import analyze_files, expand_inputs, merge_by_time, stream_files
+from src.parser import FastNginxLogParser
+from src.stats import LogStatsCollector
+from src.timeutils import parse_nginx_time
+
+
+@pytest.fixture
+def rotated_logs(tmp_path):
+    """access.log plus two rotated siblings, oldest first, with overlapping time ranges."""
+    paths = []
+    for age, name in enumerate(["access.log.2.gz", "access.log.1", "access.log"]):
+        path = str(tmp_path / name)
+        generate_file(path, num_lines=300, seed=age, lines_per_second=7 + age)
+        mtime = 1_700_000_000 + age * 3600
+        os.utime(path, (mtime, mtime))
+        paths.append(path)
+    (tmp_path / "notes.txt").write_text("not a log\n")
+    return paths
+
+
+def test_expand_inputs_orders_by_mtime_and_drops_duplicates(rotated_logs, tmp_path):
+    assert expand_inputs([str(tmp_path)]) == rotated_logs
+    assert expand_inputs([str(tmp_path / "access.log*")]) == rotated_logs
+    assert expand_inputs([rotated_logs[2], str(tmp_path)]) == [rotated_logs[2]] + rotated_logs[:2]
+    with pytest.raises(FileNotFoundError):
+        expand_inputs([str(tmp_path / "missing*.log")])
+
+
+def test_analyze_files_merges_per_file_stats(rotated_logs):
+    log_parser = FastNginxLogParser()
+    result = analyze_files(rotated_logs, log_parser, workers=2)
+
+    expected = LogStatsCollector()
+    for path in rotated_logs:
+        for _ in expected.process_stream(log_parser.parse_file(path)):
+            pass
+    assert list(result.per_file) == rotated_logs
+    assert all(stats.total_requests == 300 for stats in result.per_file.values())
+    assert result.total.to_dict() == expected.to_dict()
+
+
+def test_merged_stream_is_time_ordered(rotated_logs):
+    records, per_file = stream_files(rotated_logs, FastNginxLogParser(), sort_by_time=True,
+                                     stats_factory=LogStatsCollector)
+    records = list(records)
+    times = [parse_nginx_time(record['time']) for record in records]
+    assert len(records) == 900
+    assert times == sorted(times)
+    assert [stats.total_requests for stats in per_file.values()] == [300, 300, 300]
+
+
+def test_merge_by_time_keeps_untimed_records_in_place():
+    first = iter([{'time': '10/Oct/2000:13:55:36 +0000'}, {'msg': 'no time'}, {'time': '10/Oct/2000:13:55:40 +0000'}])
+    second = iter([{'time': '10/Oct/2000:13:55:38 +0000'}])
+    merged = list(merge_by_time([first, second]))
+    assert merged == [
+        {'time': '10/Oct/2000:13:55:36 +0000'},
+        {'msg': 'no time'},
+        {'time': '10/Oct/2000:13:55:38 +0000'},
+        {'time': '10/Oct/2000:13:55:40 +0000'},
+    ]
+
+
+def test_analyze_endpoint_accepts_several_files():
+    pytest.importorskip("flask")
+    from src.app import app
+
+    client = app.test_client()
+    single = [client.get(f'/api/analyze?filename={name}').get_json()["total_requests"]
+              for name in ("realistic_nginx.log", "test_nginx.log")]
+    combined = client.get('/api/analyze?filename=realistic_nginx.log&filename=test_nginx.log').get_json()
+    assert combined["total_requests"] == sum(single)
+    assert {name: stats["total_requests"] for name, stats in combined["files"].items()} == {
+        "realistic_nginx.log": single[0], "test_nginx.log": single[1]}
+    assert client.get('/api/analyze?filename=*.log').get_json()["total_requests"] == sum(single)
+    for name in ("/etc/*", "../../*", "../../src/app.py", "../../no/such/file", "missing/../../../etc/shadow"):
+        assert client.get('/api/analyze', query_string={"filename": name}).status_code == 400
+    assert client.get('/api/analyze', query_string={"filename": "missing.log"}).status_code == 404
+    assert client.get('/api/logs', query_string={"filename": "../../README.md"}).status_code == 400
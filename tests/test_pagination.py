@@ -0,0 +1,108 @@
+import gzip
+import os
+import pytest
+import src.pagination
+from src.pagination import CursorError, decode_cursor, encode_cursor, read_backward, read_forward
+from src.parser import NginxLogParser
+
+LINE = '10.0.0.{n} - - [15/May/2023:08:15:30 +0000] "GET /p{n} HTTP/1.1" 200 10 "-" "curl"\n'
+
+
+def _write_log(path, count=23, trailer=''):
+    with open(path, 'w', encoding='utf-8') as f:
+        for n in range(count):
+            f.write(LINE.format(n=n) if n % 5 else "not a log line\n")
+        f.write(trailer)
+    return [f'10.0.0.{n}' for n in range(count) if n % 5]
+
+
+def _all_pages_forward(path, parser, limit):
+    ips, offset = [], 0
+    while True:
+        page = read_forward(path, parser, offset, limit)
+        ips += [row['ip'] for row in page.rows]
+        if page.at_end:
+            return ips
+        offset = page.end
+
+
+def test_forward_pages_cover_the_file_once(tmp_path):
+    path = str(tmp_path / "access.log")
+    expected = _write_log(path, trailer='10.0.0.99 - - [partial')
+    assert _all_pages_forward(path, NginxLogParser(), 4) == expected
+
+
+def test_backward_pages_from_the_tail(tmp_path, monkeypatch):
+    # Tiny blocks exercise lines that straddle block boundaries
+    monkeypatch.setattr(src.pagination, 'BACKWARD_BLOCK_SIZE', 7)
+    path = str(tmp_path / "access.log")
+    expected = _write_log(path, trailer='partial')
+    parser = NginxLogParser()
+
+    tail = read_backward(path, parser, None, 3)
+    assert [row['ip'] for row in tail.rows] == expected[-3:]
+    assert tail.at_end and not tail.at_start
+
+    ips, offset = [], None
+    while True:
+        page = read_backward(path, parser, offset, 4)
+        ips = [row['ip'] for row in page.rows] + ips
+        if page.at_start:
+            break
+        offset = page.start
+    assert ips == expected
+
+
+def test_forward_offset_inside_a_line_resynchronises(tmp_path):
+    path = str(tmp_path / "access.log")
+    _write_log(path, count=3)
+    page = read_forward(path, NginxLogParser(), len("not a log line\n") + 5, 10)
+    assert [row['ip'] for row in page.rows] == ['10.0.0.2']
+
+
+def test_compressed_files_page_both_ways(tmp_path):
+    plain = str(tmp_path / "access.log")
+    expected = _write_log(plain)
+    compressed = str(tmp_path / "access.log.gz")
+    with open(plain, 'rb') as src, gzip.open(compressed, 'wb') as dst:
+        dst.write(src.read())
+
+    parser = NginxLogParser()
+    assert _all_pages_forward(compressed, parser, 5) == expected
+    tail = read_backward(compressed, parser, None, 2)
+    assert [row['ip'] for row in tail.rows] == expected[-2:]
+    assert read_backward(compressed, parser, tail.start, 2).rows == read_backward(plain, parser, tail.start, 2).rows
+
+
+def test_cursor_round_trip_and_rotation(tmp_path):
+    path = str(tmp_path / "access.log")
+    _write_log(path, count=2)
+    token = encode_cursor(os.stat(path).st_ino, 123)
+    assert decode_cursor(token, path) == 123
+
+    with pytest.raises(CursorError):
+        decode_cursor("not-a-cursor", path)
+    os.rename(path, path + ".1")
+    _write_log(path, count=2)
+    with pytest.raises(CursorError):
+        decode_cursor(token, path)
+
+
+def test_logs_endpoint_pages_with_cursor_headers():
+    pytest.importorskip("flask")
+    from src.app import app
+
+    client = app.test_client()
+    first = client.get('/api/logs?filename=realistic_nginx.log&limit=3')
+    assert len(first.get_json()) == 3
+    assert 'X-Prev-Cursor' not in first.headers
+
+    second = client.get(f"/api/logs?filename=realistic_nginx.log&limit=3&cursor={first.headers['X-Next-Cursor']}")
+    everything = client.get('/api/logs?filename=realistic_nginx.log&limit=6').get_json()
+    assert first.get_json() + second.get_json() == everything
+
+    tail = client.get('/api/logs?filename=realistic_nginx.log&limit=2&tail=1')
+    assert 'X-Next-Cursor' not in tail.headers and 'X-Prev-Cursor' in tail.headers
+    not_tail = client.get('/api/logs?filename=realistic_nginx.log&limit=3&tail=0&typed=false')
+    assert not_tail.get_json() == first.get_json()
+    assert client.get('/api/logs?filename=realistic_nginx.log&cursor=bogus').status_code == 400
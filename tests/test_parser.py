@@ -1,6 +1,7 @@
 import pytest
 import os
-from src.parser import NginxLogParser, RegexLogParser
+from src.parser import (NginxLogParser, FastNginxLogParser, RegexLogParser, ApacheVhostCombinedParser, SyslogParser,
+                        JsonLinesParser, PatternError, find_chunk_boundaries)
 from src.stats import LogStatsCollector
 
 def test_nginx_parser_valid_line():
@@ -60,3 +61,95 @@ def test_stats_collector():
     assert collector.status_codes['404'] == 1
     assert collector.methods['GET'] == 2
     assert collector.methods['POST'] == 1
+
+def test_parallel_parse_matches_sequential(tmp_path):
+    sample = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+    with open(sample, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    log_file = tmp_path / "big.log"
+    log_file.write_text("\n".join(lines * 10) + "\nnot a log line\n", encoding='utf-8')
+
+    parser = NginxLogParser()
+    sequential = list(parser.parse_file(str(log_file)))
+    parallel = list(parser.parse_file_parallel(str(log_file), workers=2, chunk_size=512))
+
+    assert parallel == sequential
+
+    seq_stats, par_stats = LogStatsCollector(), LogStatsCollector()
+    list(seq_stats.process_stream(iter(sequential)))
+    list(par_stats.process_stream(iter(parallel)))
+    assert par_stats.total_requests == seq_stats.total_requests == 200
+    assert par_stats.ip_addresses == seq_stats.ip_addresses
+    assert par_stats.status_codes == seq_stats.status_codes
+
+def test_carriage_returns_split_lines_the_same_way_on_every_path(tmp_path):
+    line = '10.0.0.{n} - - [10/Oct/2000:13:55:36 -0700] "GET /p{n} HTTP/1.0" 200 2 "-" "{agent}"'
+    lines = [line.format(n=n, agent="bot\rv2" if n % 7 == 0 else "curl") for n in range(200)]
+    log_file = tmp_path / "crlf.log"
+    log_file.write_bytes("\r\n".join(lines).encode('utf-8') + b"\r\n")
+
+    parser = NginxLogParser()
+    sequential = list(parser.parse_file(str(log_file)))
+    assert len(sequential) == 200 and sequential[0]['user_agent'] == "bot\rv2"
+    assert list(parser.parse_file_parallel(str(log_file), workers=2, chunk_size=512)) == sequential
+    assert list(parser.parse_file(str(log_file), use_mmap=True)) == sequential
+
+def test_chunk_boundaries_are_newline_aligned(tmp_path):
+    log_file = tmp_path / "lines.log"
+    log_file.write_bytes(b"".join(b"line %d\n" % i for i in range(100)))
+    chunks = find_chunk_boundaries(str(log_file), chunk_size=64)
+
+    data = log_file.read_bytes()
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(data)
+    for start, end in chunks:
+        assert start == 0 or data[start - 1:start] == b"\n"
+
+def test_fast_nginx_parser_matches_regex_parser():
+    regex_parser, fast_parser = NginxLogParser(), FastNginxLogParser()
+    lines = []
+    sample_dir = os.path.join(os.path.dirname(__file__), 'sample_logs')
+    for name in sorted(os.listdir(sample_dir)):
+        with open(os.path.join(sample_dir, name), encoding='utf-8') as f:
+            lines.extend(line.strip() for line in f)
+    # Malformed or unusual lines that must take the regex fallback
+    lines += [
+        'This is not a log line',
+        '1.2.3.4 - - [t] "GET /a HTTP/1.1" 200 -',
+        '1.2.3.4 - - [a] "b] "GET /a HTTP/1.1" 200 5',
+        '1.2.3.4 - - [t] "GET /a HTTP/1.1" 200 5 "ref "quoted"" "UA "x""',
+        '1.2.3.4\t- - [t] "GET /a HTTP/1.1" 200 5',
+        '1.2.3.4 - - [t] "GET /café HTTP/1.1" 200 5 "-" "-"',
+        '1.2.3.4 - - [t] "GET /a HTTP/1.1" 2000 5',
+        '1.2.3.4 - - [t] "GET /a HTTP/1.1" 200 5 "only-referrer"',
+    ]
+
+    for line in lines:
+        assert fast_parser.parse_line(line) == regex_parser.parse_line(line), line
+
+def test_apache_vhost_combined_parser():
+    line = 'www.example.com:443 10.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET /index.html HTTP/1.1" 200 2326 "-" "curl/8.0"'
+    result = ApacheVhostCombinedParser().parse_line(line)
+    assert result['vhost'] == 'www.example.com'
+    assert result['port'] == '443'
+    assert result['ip'] == '10.0.0.1'
+    assert result['status'] == '200'
+
+def test_syslog_parser():
+    result = SyslogParser().parse_line('<34>May  5 08:00:00 web1 sshd[1234]: Accepted publickey for deploy')
+    assert result == {'priority': '34', 'time': 'May  5 08:00:00', 'host': 'web1', 'program': 'sshd',
+                      'pid': '1234', 'message': 'Accepted publickey for deploy'}
+    assert SyslogParser().parse_line('2023-05-15T08:00:00+00:00 web1 kernel: eth0: link up')['message'] == 'eth0: link up'
+
+def test_json_lines_parser():
+    parser = JsonLinesParser()
+    assert parser.parse_line('{"level": "info", "status": 200, "ctx": {"user": 1}}') == {
+        'level': 'info', 'status': 200, 'ctx': '{"user":1}'}
+    assert parser.parse_line('[1, 2]') is None
+    assert parser.parse_line('{"truncated": ') is None
+
+def test_compile_pattern_is_cached_and_checked():
+    assert RegexLogParser(r'^(?P<word>\w+)').pattern is RegexLogParser(r'^(?P<word>\w+)').pattern
+    with pytest.raises(PatternError):
+        RegexLogParser(r'^(\w+)$')
+    with pytest.raises(PatternError):
+        RegexLogParser(r'^(?P<open>\w+')
@@ -0,0 +1,42 @@
+import bz2
+import gzip
+import lzma
+import os
+import pytest
+from src.parser import NginxLogParser
+from src.readers import detect_compression, iter_lines, is_log_filename
+
+SAMPLE = os.path.join(os.path.dirname(__file__), 'sample_logs', 'realistic_nginx.log')
+
+
+@pytest.mark.parametrize("suffix, opener, expected", [
+    (".gz", gzip.open, "gzip"),
+    (".xz", lzma.open, "xz"),
+    (".bz2", bz2.open, "bz2"),
+])
+def test_compressed_input_parses_like_plain(tmp_path, suffix, opener, expected):
+    with open(SAMPLE, 'rb') as f:
+        data = f.read()
+    compressed = str(tmp_path / ("access.log.1" + suffix))
+    with opener(compressed, 'wb') as f:
+        f.write(data)
+
+    parser = NginxLogParser()
+    assert detect_compression(compressed) == expected
+    assert detect_compression(SAMPLE) is None
+    assert list(parser.parse_file(compressed)) == list(parser.parse_file(SAMPLE))
+
+
+def test_block_and_mmap_reading_preserve_lines(tmp_path):
+    log_file = tmp_path / "lines.log"
+    log_file.write_bytes(b"first\r\nsecond\n\nthird line without newline")
+    expected = ["first", "second", "", "third line without newline"]
+
+    assert list(iter_lines(str(log_file), block_size=4)) == expected
+    assert list(iter_lines(str(log_file), block_size=4, use_mmap=True)) == expected
+
+
+def test_is_log_filename():
+    assert is_log_filename("access.log")
+    assert is_log_filename("access.log.3.gz")
+    assert not is_log_filename("notes.txt")
@@ -0,0 +1,127 @@
+import json
+import pickle
+from datetime import datetime
+import pytest
+from benchmarks.generator import generate_file
+from src.exporters import export_to_csv, export_to_ndjson
+from src.parser import FastNginxLogParser, JsonLinesParser, RegexLogParser
+from src.records import LogRecord, RecordConverter, RecordFieldError, record_type
+from src.stats import LogStatsCollector
+
+
+@pytest.fixture
+def access_log(tmp_path):
+    path = str(tmp_path / "access.log")
+    generate_file(path, num_lines=500, seed=3)
+    return path
+
+
+def test_typed_records_convert_and_intern_values(access_log):
+    log_parser = FastNginxLogParser()
+    records = list(log_parser.parse_file(access_log, typed=True))
+    raw = next(log_parser.parse_file(access_log))
+    first = records[0]
+
+    assert isinstance(first, LogRecord) and not hasattr(first, '__dict__')
+    assert list(first) == list(raw)
+    assert first.status == first['status'] == int(raw['status'])
+    assert first['time'] == datetime.strptime(raw['time'], '%d/%b/%Y:%H:%M:%S %z')
+    assert first['time'].tzinfo is not None
+
+    # Equal values of an interned field are one object
+    by_method = {}
+    for record in records:
+        assert by_method.setdefault(record['method'], record['method']) is record['method']
+
+
+def test_record_mapping_interface_and_pickle():
+    Record = record_type(('ip', 'status', 'size'))
+    record = Record('10.0.0.1', 200, None)
+    assert dict(record) == {'ip': '10.0.0.1', 'status': 200, 'size': None}
+    assert record.get('url', '-') == '-' and 'url' not in record
+    with pytest.raises(KeyError):
+        record['url']
+    assert pickle.loads(pickle.dumps(record)) == record
+    with pytest.raises(ValueError):
+        record_type(('ip', 'get'))
+
+
+def test_converter_handles_missing_and_dash_values():
+    converter = RecordConverter(('status', 'size', 'time'), {'status': 'int', 'size': 'int', 'time': 'timestamp'},
+                                intern_fields=('status',))
+    record = converter.convert({'status': '304', 'size': '-', 'time': '10/Oct/2000:13:55:36 -0700'})
+    assert (record['status'], record['size']) == (304, None)
+    assert record['time'].isoformat() == '2000-10-10T13:55:36-07:00'
+    assert converter.convert({})['time'] is None
+
+
+def test_stats_and_exports_match_dict_mode(access_log, tmp_path):
+    log_parser = FastNginxLogParser()
+    for approximate in (False, True):
+        results = []
+        for typed in (False, True):
+            stats = LogStatsCollector(approximate=approximate, rollups=True)
+            for _ in stats.process_stream(log_parser.parse_file(access_log, typed=typed)):
+                pass
+            results.append(stats.to_dict())
+        assert results[0] == results[1]
+
+    export_to_csv(log_parser.parse_file(access_log, typed=True), str(tmp_path / "out.csv"))
+    export_to_ndjson(log_parser.parse_file(access_log, typed=True), str(tmp_path / "out.ndjson"))
+    rows = [json.loads(line) for line in open(tmp_path / "out.ndjson")]
+    assert len(rows) == 500 and isinstance(rows[0]['status'], int)
+    assert datetime.fromisoformat(rows[0]['time']).tzinfo is not None
+    assert len(open(tmp_path / "out.csv").readlines()) == 501
+
+
+def test_record_fast_paths_write_what_the_mapping_protocol_would(tmp_path):
+    converter = RecordConverter(('ip', 'status', 'time'), {'status': 'int', 'time': 'timestamp'})
+    records = [converter.convert(row) for row in (
+        {'ip': '1.1.1.1', 'status': '200', 'time': '10/Oct/2000:13:55:36 -0700'},
+        {'ip': '2.2.2.2', 'status': '-', 'time': '10/Oct/2000:13:55:36 -0700'},
+        {'ip': '3.3.3.3', 'status': '404'},
+        {'ip': '4.4.4.4', 'status': '500', 'time': '10/Oct/2000:13:55:37 -0700'},
+    )]
+    assert records[1].to_tuple() == ('2.2.2.2', None, records[0]['time'])
+    assert records[2].to_dict() == dict(records[2].items())
+
+    export_to_csv(iter(records + [{'ip': '5.5.5.5', 'method': 'GET'}]), str(tmp_path / "out.csv"))
+    assert open(tmp_path / "out.csv").read().splitlines() == [
+        'ip,status,time,method', '1.1.1.1,200,2000-10-10 13:55:36-07:00,', '2.2.2.2,,2000-10-10 13:55:36-07:00,',
+        '3.3.3.3,404,,', '4.4.4.4,500,2000-10-10 13:55:37-07:00,', '5.5.5.5,,,GET']
+    export_to_ndjson(iter(records), str(tmp_path / "out.ndjson"))
+    assert [json.loads(line)['time'] for line in open(tmp_path / "out.ndjson")] == [
+        '2000-10-10T13:55:36-07:00', '2000-10-10T13:55:36-07:00', None, '2000-10-10T13:55:37-07:00']
+
+
+
+@pytest.mark.parametrize("field", ["from", "class", "_self", "__x", "items", "not-a-name"])
+def test_field_names_that_cannot_be_attributes_are_rejected(field):
+    with pytest.raises(RecordFieldError, match="typed record attributes"):
+        record_type(("ip", field))
+
+
+def test_regex_group_named_after_a_keyword(tmp_path):
+    path = tmp_path / "mail.log"
+    path.write_text("alice bob\n")
+    log_parser = RegexLogParser(r"(?P<from>\S+) (?P<to>\S+)")
+    assert list(log_parser.parse_file(str(path))) == [{"from": "alice", "to": "bob"}]
+    with pytest.raises(RecordFieldError):
+        list(log_parser.parse_file(str(path), typed=True))
+    assert record_type(())().to_tuple() == ()
+
+def test_formats_without_fixed_fields_stay_dicts(tmp_path):
+    path = tmp_path / "app.jsonl"
+    path.write_text('{"level": "info", "msg": "started"}\n')
+    assert list(JsonLinesParser().parse_file(str(path), typed=True)) == [{"level": "info", "msg": "started"}]
+
+
+def test_logs_endpoint_typed_values():
+    pytest.importorskip("flask")
+    from src.app import app
+
+    client = app.test_client()
+    plain = client.get('/api/logs?filename=test_nginx.log&limit=5').get_json()
+    typed = client.get('/api/logs?filename=test_nginx.log&limit=5&typed=1').get_json()
+    assert [row['status'] for row in typed] == [int(row['status']) for row in plain]
+    assert all('T' in row['time'] for row in typed)
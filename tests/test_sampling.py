@@ -0,0 +1,73 @@
+import gzip
+import pytest
+from benchmarks.generator import generate_file
+from src.parser import FastNginxLogParser
+from src.sampling import BlockSampler, reservoir_sample
+from src.stats import LogStatsCollector
+
+
+@pytest.fixture(scope="module")
+def large_log(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("sampling") / "access.log")
+    generate_file(path, num_lines=20000, seed=5)
+    return path
+
+
+def test_full_sample_is_exact(large_log):
+    log_parser = FastNginxLogParser()
+    exact = LogStatsCollector()
+    for _ in exact.process_stream(log_parser.parse_file(large_log)):
+        pass
+
+    sampler = BlockSampler(large_log, log_parser, block_size=16 * 1024, seed=1)
+    blocks_read = [step.blocks_read for step in sampler.progressive(start_fraction=0.05)]
+    assert blocks_read == sorted(set(blocks_read)) and len(blocks_read) > 2
+    summary = sampler.summary()
+    assert summary["sample"]["exact"] and summary["total_requests_ci95"] == [20000, 20000]
+    assert {row["status"]: row["count"] for row in summary["status_codes"]} == dict(exact.status_codes)
+    assert [row["ip"] for row in summary["ip_addresses"]][:3] == [ip for ip, _ in exact.ip_addresses.most_common(3)]
+
+
+def test_partial_sample_interval_covers_the_total(large_log):
+    sampler = BlockSampler(large_log, FastNginxLogParser(), block_size=16 * 1024, seed=2).refine(0.25)
+    total = sampler.estimate()
+    assert 0 < sampler.fraction < 1 and not sampler.exact
+    assert total.low <= 20000 <= total.high
+    assert abs(total.value - 20000) < 2000
+    assert sampler.bytes_read < 0.3 * sampler.file_size
+
+
+def test_compressed_files_are_not_block_sampled(tmp_path):
+    path = tmp_path / "access.log.gz"
+    with gzip.open(path, "wt") as f:
+        f.write('127.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET / HTTP/1.0" 200 2 "-" "-"\n')
+    with pytest.raises(ValueError):
+        BlockSampler(str(path), FastNginxLogParser())
+
+
+def test_reservoir_sample_is_uniform_and_ordered():
+    sample, seen = reservoir_sample(iter(range(10000)), 100, seed=3)
+    assert seen == 10000 and len(sample) == 100 and sample == sorted(set(sample))
+    assert reservoir_sample(range(5), 10) == ([0, 1, 2, 3, 4], 5)
+
+    hits = [0] * 10
+    for seed in range(500):
+        for value in reservoir_sample(range(100), 10, seed=seed)[0]:
+            hits[value // 10] += 1
+    assert all(400 < count < 600 for count in hits)
+
+
+def test_analyze_endpoint_sample_and_refine():
+    pytest.importorskip("flask")
+    from src.app import app
+
+    client = app.test_client()
+    exact = client.get('/api/analyze?filename=realistic_nginx.log').get_json()
+    sampled = client.get('/api/analyze?filename=realistic_nginx.log&sample=0.5').get_json()
+    assert sampled["total_requests"] == exact["total_requests"] and sampled["sample"]["exact"]
+    events = client.get('/api/analyze?filename=realistic_nginx.log&sample=0.1&refine=1').get_data(as_text=True)
+    assert events.rstrip().split("\n")[-2] == "event: done"
+    for off in ("0", "false", "No"):
+        response = client.get(f'/api/analyze?filename=realistic_nginx.log&sample=0.1&refine={off}')
+        assert response.mimetype == 'application/json' and "sample" in response.get_json()
+    assert client.get('/api/analyze?filename=realistic_nginx.log&sample=0').status_code == 400
@@ -0,0 +1,120 @@
+from src.stats import LogStatsCollector
+from src.sketches import SpaceSaving, HyperLogLog, QuantileSketch
+
+
+def _collect(data):
+    collector = LogStatsCollector()
+    list(collector.process_stream(iter(data)))
+    return collector
+
+
+def test_merge_matches_single_collector():
+    data = [
+        {'ip': '1.1.1.1', 'status': '200', 'method': 'GET'},
+        {'ip': '1.1.1.1', 'status': '404', 'method': 'GET'},
+        {'ip': '2.2.2.2', 'status': '200', 'method': 'POST'},
+        {'ip': '3.3.3.3', 'status': '500', 'method': 'GET'},
+    ]
+    whole = _collect(data)
+    combined = _collect(data[:2]) + _collect(data[2:])
+
+    assert combined.total_requests == whole.total_requests
+    assert combined.ip_addresses == whole.ip_addresses
+    assert combined.status_codes == whole.status_codes
+    assert combined.methods == whole.methods
+
+
+def test_save_and_load_round_trip(tmp_path):
+    collector = _collect([
+        {'ip': '1.1.1.1', 'status': '200', 'method': 'GET'},
+        {'ip': '2.2.2.2', 'status': '301', 'method': 'HEAD'},
+    ])
+    agg_file = tmp_path / "node1.agg"
+    collector.save(str(agg_file))
+
+    loaded = LogStatsCollector.load(str(agg_file))
+    assert loaded.to_dict() == collector.to_dict()
+
+
+def test_space_saving_finds_heavy_hitters():
+    sketch = SpaceSaving(capacity=10)
+    for i in range(2000):
+        sketch.add('heavy' if i % 4 == 0 else f'noise-{i}')
+
+    top_key, top_count = sketch.most_common(1)[0]
+    assert top_key == 'heavy'
+    # Overestimate is bounded by N / capacity
+    assert 500 <= top_count <= 500 + 2000 // 10
+    assert len(sketch) == 10
+
+
+def test_hyperloglog_estimate_and_merge():
+    left, right = HyperLogLog(precision=12), HyperLogLog(precision=12)
+    for i in range(5000):
+        left.add(f'10.0.{i // 256}.{i % 256}')
+    for i in range(2500, 7500):
+        right.add(f'10.0.{i // 256}.{i % 256}')
+
+    assert abs(left.count() - 5000) / 5000 < 0.05
+    assert abs(left.merge(right).count() - 7500) / 7500 < 0.05
+
+
+def test_approximate_collector_round_trip(tmp_path):
+    data = [{'ip': f'1.1.1.{i % 3}', 'url': f'/p{i}', 'status': '200', 'method': 'GET'} for i in range(30)]
+    collector = LogStatsCollector(approximate=True, top_k=5)
+    list(collector.process_stream(iter(data)))
+
+    agg_file = tmp_path / "approx.agg"
+    collector.save(str(agg_file))
+    merged = LogStatsCollector.load(str(agg_file)) + collector
+
+    assert merged.total_requests == 60
+    assert merged.ip_addresses['1.1.1.0'] == 20
+    assert merged.distinct_urls.count() == 30
+
+
+def test_quantile_sketch_relative_error():
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in range(1, 10001):
+        sketch.add(value)
+    for q in (0.5, 0.95, 0.99):
+        expected = q * 9999 + 1
+        assert abs(sketch.quantile(q) - expected) / expected <= 0.011
+
+
+def test_non_finite_values_are_skipped():
+    sketch = QuantileSketch()
+    for value in (1.0, float('nan'), float('inf'), float('-inf'), 2.0):
+        sketch.add(value)
+    assert sketch.count == 2
+
+    data = [{'time': '15/May/2023:08:15:30 +0000', 'status': '200', 'size': '1', 'request_time': value}
+            for value in ('nan', 'inf', '-Infinity', '0.5')]
+    collector = LogStatsCollector(rollups=True)
+    list(collector.process_stream(iter(data)))
+    row = collector.rollups['minute'].rows()[0]
+    assert row['requests'] == 4 and abs(row['request_time_p50'] - 0.5) < 0.01
+
+
+def test_rollups_by_minute_and_hour():
+    data = [
+        {'time': '15/May/2023:08:15:30 +0000', 'status': '200', 'size': '100', 'request_time': '0.010'},
+        {'time': '15/May/2023:08:15:59 +0000', 'status': '500', 'size': '-'},
+        {'time': '15/May/2023:08:16:00 +0000', 'status': '404', 'size': '300'},
+    ]
+    collector = LogStatsCollector(rollups=True)
+    list(collector.process_stream(iter(data)))
+
+    minutes = collector.rollups['minute'].rows()
+    assert [row['requests'] for row in minutes] == [2, 1]
+    assert minutes[0]['bucket_start'] == '2023-05-15T08:15:00+00:00'
+    assert minutes[0]['bytes'] == 100
+    assert minutes[0]['error_rate'] == 0.5
+    assert abs(minutes[0]['request_time_p50'] - 0.010) < 0.0002
+
+    hour = collector.rollups['hour'].rows()[0]
+    assert hour['requests'] == 3
+    assert hour['status_classes'] == {'2xx': 1, '5xx': 1, '4xx': 1}
+
+    restored = LogStatsCollector.from_dict(collector.to_dict())
+    assert restored.rollups['hour'].rows() == collector.rollups['hour'].rows()